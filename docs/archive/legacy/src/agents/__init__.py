@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Shared pipeline helpers (classification cache, etc.) live in the repo's top-level scripts/ directory
+# (this package sits at docs/archive/legacy/src/agents).
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", ".."))
+SCRIPTS_DIR = os.path.join(REPO_ROOT, "scripts")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
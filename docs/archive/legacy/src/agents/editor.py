@@ -1,4 +1,6 @@
-import re
+from markdown_rewrite import rewrite_markdown, image_prefix_for_folder
+from frontmatter import merge_frontmatter
+from note_stream import iter_pieces, merge_frontmatter_stream
 
 class EditorAgent:
     """
@@ -14,39 +16,33 @@ class EditorAgent:
 
     def clean_hashtags(self, content):
         """Escapes unknown hashtags to prevent tag clutter in Obsidian."""
-        pattern = r'(?<!\w)#([a-zA-Z0-9_\uAC00-\uD7A3]+)'
-        lines = content.split('\n')
-        cleaned_lines = []
-        for line in lines:
-            # Skip headers
-            if re.match(r'^#{1,6}\s', line):
-                cleaned_lines.append(line)
-                continue
-            
-            # Escape untrusted hashtags
-            cleaned_line = re.sub(pattern, lambda m: m.group(0) if m.group(1).lower() in self.allowed_tags else f"\\#{m.group(1)}", line)
-            cleaned_lines.append(cleaned_line)
-        return '\n'.join(cleaned_lines)
+        return rewrite_markdown(content, self.allowed_tags)
+
+    def _image_prefix(self, target_folder_path):
+        # depth calculation (e.g., '01_Projects/MyProject' -> depth 1, leading to '../Files/')
+        return image_prefix_for_folder(target_folder_path)
 
     def fix_image_paths(self, content, target_folder_path):
         """Adjusts image paths relative to the current folder depth."""
-        # depth calculation (e.g., '01_Projects/MyProject' -> depth 1, leading to '../Files/')
-        depth = target_folder_path.strip('/').count('/')
-        prefix = "../" * depth
-        
-        # Matches ![alt](Files/image.png)
-        pattern = r'!\[(.*?)\]\(Files/(.*?)\)'
-        replacement = f'![\\1]({prefix}Files/\\2)'
-        return re.sub(pattern, replacement, content)
+        return rewrite_markdown(content, image_prefix=self._image_prefix(target_folder_path), escape_tags=False)
 
     def process_content(self, content, target_folder, ai_data):
-        """Wraps all cleanup logic."""
-        # 1. Base Cleanup
-        content = self.clean_hashtags(content)
-        content = self.fix_image_paths(content, target_folder)
-        
-        # 2. Add Frontmatter
+        """
+        Wraps all cleanup logic.
+        Returns the same string object when nothing changed (already processed note).
+        """
+        image_prefix = self._image_prefix(target_folder)
+        # 1. Base Cleanup of the body (hashtags + image paths in a single scan)
+        # 2. Merge Frontmatter into an existing block instead of prepending a second one
+        frontmatter = ai_data.get('yaml_frontmatter', '---\n---\n')
+        return merge_frontmatter(content, frontmatter,
+                                 lambda body: rewrite_markdown(body, self.allowed_tags, image_prefix))
+
+    def stream_content(self, source_file, target_folder, ai_data):
+        """
+        process_content for notes too large to hold in memory: reads the open source
+        file line by line and yields the cleaned note in bounded chunks.
+        """
         frontmatter = ai_data.get('yaml_frontmatter', '---\n---\n')
-        full_content = f"{frontmatter}\n\n{content}"
-        
-        return full_content
+        return merge_frontmatter_stream(iter_pieces(source_file), frontmatter, allowed_tags=self.allowed_tags,
+                                        image_prefix=self._image_prefix(target_folder))
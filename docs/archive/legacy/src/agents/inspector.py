@@ -1,4 +1,8 @@
 import os
+import time
+from markdown_rewrite import ALLOWED_TAGS, REWRITE_PATTERN, image_prefix_for_folder
+from frontmatter import split_frontmatter
+from note_stream import iter_pieces, iter_blocks, split_frontmatter_stream
 
 class InspectorAgent:
     """
@@ -6,50 +10,154 @@ class InspectorAgent:
     - Verifies that the migrated file exists.
     - Checks for content integrity (no accidental wipeouts).
     - Validates PARA folder adherence.
-    - Logs warnings for suspicious patterns (e.g., leftover raw hashtags).
+    - Logs warnings for suspicious patterns (leftover raw hashtags, broken Files/ image links).
+
+    Verification works on the bytes the caller just wrote plus one stat result,
+    so a note is not read back from disk. paranoid=True additionally re-reads
+    the file and compares it with what was written. Notes written in streaming
+    mode are scanned from disk in bounded chunks (verify_streamed).
     """
-    def __init__(self, target_root="Obsidian_Vault"):
+    def __init__(self, target_root="Obsidian_Vault", allowed_tags=ALLOWED_TAGS, paranoid=False):
         self.target_root = target_root
         self.standard_para = {'00_Inbox', '01_Projects', '02_Areas', '03_Resources', '04_Archives'}
+        self.allowed_tags = {tag.lower() for tag in allowed_tags}
+        self.paranoid = paranoid
 
     def verify_migration(self, target_path, original_filename):
-        """Perform final QA on a migrated note."""
+        """Perform final QA on a migrated note by reading it from disk."""
+        try:
+            st = os.stat(target_path)
+            with open(target_path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return self.verify_written(target_path, None, None, original_filename)
+        return self.verify_written(target_path, data, st, original_filename)
+
+    def verify_written(self, target_path, data, st, original_filename=None):
+        """
+        Perform final QA on a note from the bytes that were written (data) and the
+        os.stat result taken right after writing (st). st=None means the file is missing.
+        """
         results = {
             "exists": False,
             "valid_folder": False,
             "has_content": False,
-            "warnings": []
+            "warnings": [],
+            "timings_ms": {}
         }
-        
-        # 1. Existence Check
-        if os.path.exists(target_path):
+        timings = results["timings_ms"]
+
+        # 1. Existence / Size Check
+        started = time.perf_counter()
+        if st is not None:
             results["exists"] = True
-            file_size = os.path.getsize(target_path)
-            if file_size > 10: # Minimum size for YAML + content
+            if st.st_size > 10: # Minimum size for YAML + content
                 results["has_content"] = True
             else:
                 results["warnings"].append("File is suspiciously small (possible data loss).")
-        
+            if data is not None and st.st_size != len(data):
+                results["warnings"].append(f"Size on disk ({st.st_size}) differs from bytes written ({len(data)}).")
+        timings["size"] = _elapsed_ms(started)
+
         # 2. PARA Adherence
+        started = time.perf_counter()
         rel_path = os.path.relpath(target_path, self.target_root)
-        para_folder = rel_path.split(os.sep)[0]
+        rel_parts = rel_path.split(os.sep)
+        para_folder = rel_parts[0]
         if para_folder in self.standard_para:
             results["valid_folder"] = True
         else:
             results["warnings"].append(f"Folder '{para_folder}' is not a standard PARA category.")
+        timings["folder"] = _elapsed_ms(started)
 
-        # 3. Content Scan (Optional/Advanced)
-        if results["exists"]:
+        # 3. Content Scan: hashtags and image links in one pass
+        if data is not None:
+            started = time.perf_counter()
             try:
-                with open(target_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Check for unescaped hashtags that aren't headers
-                if "#" in content:
-                    # Very simple heuristic: if there's a hashtag in the middle of a sentence
-                    # (This is just for logging warnings)
-                    pass
+                content = data.decode('utf-8')
+            except UnicodeDecodeError as e:
+                results["warnings"].append(f"File is not valid UTF-8: {e}")
+                content = None
+            if content is not None:
+                self._scan_content(content, self._image_prefix(target_path), results)
+            timings["content_scan"] = _elapsed_ms(started)
+
+        # 4. Optional full re-read
+        if self.paranoid and results["exists"]:
+            started = time.perf_counter()
+            try:
+                with open(target_path, 'rb') as f:
+                    on_disk = f.read()
+                if data is not None and on_disk != data:
+                    results["warnings"].append("File on disk does not match the bytes written.")
             except Exception as e:
                 results["warnings"].append(f"Failed to read file for content check: {e}")
+            timings["reread"] = _elapsed_ms(started)
 
         return results
+
+    def verify_streamed(self, target_path, st, original_filename=None):
+        """
+        Perform final QA on a note that was written in streaming mode (too large to keep
+        the written bytes): the content scan re-reads the file in bounded chunks.
+        """
+        results = self.verify_written(target_path, None, st, original_filename)
+        if results["exists"]:
+            started = time.perf_counter()
+            try:
+                with open(target_path, 'r', encoding='utf-8') as f:
+                    _, _, body = split_frontmatter_stream(iter_pieces(f))
+                    self._scan_blocks(iter_blocks(body), self._image_prefix(target_path), results)
+            except UnicodeDecodeError as e:
+                results["warnings"].append(f"File is not valid UTF-8: {e}")
+            except OSError as e:
+                results["warnings"].append(f"Failed to read file for content check: {e}")
+            results["timings_ms"]["content_scan"] = _elapsed_ms(started)
+        return results
+
+    def _image_prefix(self, target_path):
+        """The Files/ prefix the Editor uses for a note at target_path (same helper, same folder)."""
+        return image_prefix_for_folder(os.path.relpath(os.path.dirname(target_path), self.target_root))
+
+    def _scan_content(self, content, expected_prefix, results):
+        """
+        Collect unescaped hashtags outside the allowed list and image links with a wrong Files/ prefix.
+        Only the body is scanned: the Editor leaves YAML frontmatter alone (color: '#ff0000' is not a tag).
+        """
+        _, body = split_frontmatter(content)
+        if '#' not in body and 'Files/' not in body:
+            return
+        self._scan_blocks([(body, 'text')], expected_prefix, results)
+
+    def _scan_blocks(self, blocks, expected_prefix, results):
+        """_scan_content over (text, kind) blocks from note_stream.iter_blocks; code blocks are skipped."""
+        leftover_tags = set()
+        broken_links = []
+        broken_count = 0
+        for text, kind in blocks:
+            if kind == 'code':
+                continue
+            if kind == 'tail':
+                text = '\t' + text  # mid-line piece: keep line-start rules (headers, fences) from applying
+            for m in REWRITE_PATTERN.finditer(text):
+                kind = m.lastgroup
+                if kind == 'tag':
+                    tag = m.group('name').lower()
+                    if tag not in self.allowed_tags:
+                        leftover_tags.add(tag)
+                elif kind == 'image' and m.group('prefix') != expected_prefix:
+                    broken_count += 1
+                    if len(broken_links) < 10:
+                        broken_links.append(m.group(0))
+
+        if leftover_tags:
+            results["leftover_tags"] = sorted(leftover_tags)
+            results["warnings"].append(f"{len(leftover_tags)} unescaped hashtag(s) outside the allowed list.")
+        if broken_links:
+            results["broken_links"] = broken_links
+            results["warnings"].append(
+                f"{broken_count} image link(s) do not resolve to Files/ (expected prefix '{expected_prefix}')."
+            )
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 3)
@@ -1,10 +1,63 @@
 import os
-import json
+import argparse
 import time
+import queue
+import threading
 from datetime import datetime
 from src.agents.librarian import LibrarianAgent
 from src.agents.editor import EditorAgent
 from src.agents.inspector import InspectorAgent
+import migration_manifest
+from classification_cache import content_hash
+from session_logger import SessionLogger
+from atomic_write import AtomicWriter
+from knn_classifier import KnnClassifier
+import note_stream
+
+# Max notes waiting between two pipeline stages (bounds memory when the LLM stage lags)
+PIPELINE_QUEUE_SIZE = 4
+
+_END = object()
+
+class StageStats:
+    """Throughput and latency counters for one pipeline stage."""
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.busy = 0.0
+        self.max_latency = 0.0
+        self.wait = 0.0
+        self.first_start = None
+        self.last_end = None
+
+    def record(self, wait, started):
+        self.wait += wait
+        if self.first_start is None:
+            self.first_start = started
+
+    def finish(self, started, ended):
+        latency = ended - started
+        self.count += 1
+        self.busy += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.last_end = ended
+
+    def as_dict(self):
+        span = (self.last_end - self.first_start) if self.count else 0.0
+        return {
+            "notes": self.count,
+            "busy_s": round(self.busy, 3),
+            "avg_latency_ms": round(1000 * self.busy / self.count, 1) if self.count else 0.0,
+            "max_latency_ms": round(1000 * self.max_latency, 1),
+            "avg_queue_wait_ms": round(1000 * self.wait / self.count, 1) if self.count else 0.0,
+            "throughput_per_s": round(self.count / span, 2) if span > 0 else 0.0,
+        }
+
+    def summary(self):
+        d = self.as_dict()
+        return (f"{self.name.capitalize()}: {d['notes']} notes, avg {d['avg_latency_ms']}ms "
+                f"(max {d['max_latency_ms']}ms, queue wait {d['avg_queue_wait_ms']}ms), "
+                f"{d['throughput_per_s']} notes/s")
 
 class LeadArchivist:
     """
@@ -13,32 +66,51 @@ class LeadArchivist:
     - Allocates notes to the Librarian (Classification) and Editor (Cleanup).
     - Manages the overall workflow and dependencies.
     - Logs activities to logs/ directory.
+    - Checkpoints per-note progress in a manifest so interrupted batches resume.
     """
-    def __init__(self, inbox_path, vault_path, log_dir="logs"):
+    def __init__(self, inbox_path, vault_path, log_dir="logs", manifest_path=None, paranoid=False, compress_log=False,
+                 knn=None, stream_threshold=note_stream.STREAM_THRESHOLD):
         self.inbox = inbox_path
+        # Notes larger than this (bytes) are cleaned and written in streaming mode
+        self.stream_threshold = stream_threshold
         self.vault = vault_path
         self.log_dir = log_dir
         os.makedirs(log_dir, exist_ok=True)
         
+        editor = EditorAgent()
+        # knn: 'tfidf' | 'embed' | None - classify by already-filed vault notes before asking the LLM
+        knn_classifier = KnnClassifier(vault_path, knn).fit() if knn else None
         self.team = {
-            "librarian": LibrarianAgent(),
-            "editor": EditorAgent(),
-            "inspector": InspectorAgent(target_root=vault_path)
+            "librarian": LibrarianAgent(knn=knn_classifier),
+            "editor": editor,
+            "inspector": InspectorAgent(target_root=vault_path, allowed_tags=editor.allowed_tags, paranoid=paranoid)
         }
         
         # Initialize session log
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.session_log_path = os.path.join(log_dir, f"migration_{timestamp}.jsonl")
+        self.logger = SessionLogger(os.path.join(log_dir, f"migration_{timestamp}.jsonl"), compress=compress_log)
+        self.session_log_path = self.logger.path
+        # Notes are replaced atomically; directory fsyncs are grouped per batch
+        self.writer = AtomicWriter()
+
+        # Manifest survives across sessions (unlike the per-session log)
+        if manifest_path is None:
+            manifest_path = os.path.join(log_dir, "lead_manifest.jsonl")
+        self.manifest = migration_manifest.MigrationManifest(manifest_path)
+        # Batch mode: classifications fetched one window ahead, consumed by the Librarian stage
+        self._prefetched = {}
+        self._batch_index = {}
+        self._batch_notes = []
+        self._batch_next = 0
 
     def _log_event(self, event_type, data):
-        """Append an event to the session log (JSONL format)."""
+        """Queue an event for the session log (JSONL, written in batches by the logger thread)."""
         event = {
             "timestamp": datetime.now().isoformat(),
             "type": event_type,
             **data
         }
-        with open(self.session_log_path, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        self.logger.log(event)
 
     def analyze_inbox(self):
         """Scan 00_Inbox and identify notes for processing."""
@@ -50,81 +122,244 @@ class LeadArchivist:
         print(f"[*] Lead: Found {len(notes)} notes in {self.inbox}")
         return sorted(notes)
 
-    def process_note(self, note_filename, dry_run=False):
-        """Coordinate specialists to process a single note."""
-        print(f"[*] Lead: Working on '{note_filename}'...")
-        
-        source_path = os.path.join(self.inbox, note_filename)
-        start_time = time.time()
-        
+    def _new_job(self, note_filename):
+        return {"filename": note_filename, "source_path": os.path.join(self.inbox, note_filename), "result": None}
+
+    def _run_stage(self, stage, job, dry_run):
+        """Run one stage on a job. Returns False once the job has a final result."""
+        if job["result"] is not None:
+            return False
         try:
-            with open(source_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            if not content.strip():
-                return False, "Empty file"
+            stage(job, dry_run)
+        except Exception as e:
+            self._log_event("ERROR", {
+                "filename": job["filename"],
+                "error": str(e)
+            })
+            job["result"] = (False, str(e))
+        return job["result"] is None
 
-            # 1. Librarian: Analyze and Classify
-            print(f"    - Librarian: Analyzing...")
-            ai_data = self.team['librarian'].analyze_note(content)
-            if not ai_data:
-                return False, "AI analysis failed"
-            
-            target_folder = self.team['librarian'].get_standardized_path(ai_data.get('suggested_folder'))
-            
-            # 2. Editor: Clean up and Format
-            print(f"    - Editor: Cleaning up (Folder: {target_folder})...")
-            final_content = self.team['editor'].process_content(content, target_folder, ai_data)
-            
-            if dry_run:
-                return True, {"target_folder": target_folder, "dry_run": True}
+    def _classify(self, job, dry_run):
+        """Stage 1 (Librarian): read the note and classify it."""
+        note_filename = job["filename"]
+        source_path = job["source_path"]
+        job["start_time"] = time.time()
 
-            # Write to Vault
-            target_dir = os.path.join(self.vault, target_folder)
-            os.makedirs(target_dir, exist_ok=True)
-            target_path = os.path.join(target_dir, note_filename)
-            
-            with open(target_path, 'w', encoding='utf-8') as f:
-                f.write(final_content)
-            
-            # 3. Inspector: Verify
-            print(f"    - Inspector: Verifying...")
-            report = self.team['inspector'].verify_migration(target_path, note_filename)
-            
-            processing_time = time.time() - start_time
-            
-            if report["exists"] and report["has_content"] and report["valid_folder"]:
-                # Success! Remove from Inbox (Archiving for now)
-                # archive_dir = os.path.join(self.inbox, "processed")
-                # os.makedirs(archive_dir, exist_ok=True)
-                # os.rename(source_path, os.path.join(archive_dir, note_filename))
-                
-                self._log_event("SUCCESS", {
-                    "filename": note_filename,
-                    "target": target_folder,
-                    "time": round(processing_time, 2),
-                    "inspector_report": report
-                })
-                return True, report
+        mtime_ns, size = migration_manifest.source_fingerprint(source_path)
+        with open(source_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        if not content.strip():
+            job["result"] = (False, "Empty file")
+            return
+
+        # Reuse a checkpointed result if the note is unchanged
+        ai_data = migration_manifest.reusable_classification(self.manifest.get(source_path), mtime_ns, size)
+        prompt_stats = {}
+        if ai_data:
+            print(f"    - Librarian: Reusing checkpointed classification for '{note_filename}'.")
+        else:
+            self._prefetch_window(note_filename)
+            ai_data = self._prefetched.pop(note_filename, None)
+            if ai_data:
+                print(f"    - Librarian: Using batched classification for '{note_filename}'.")
             else:
-                self._log_event("WARNING", {
-                    "filename": note_filename,
-                    "target": target_folder,
-                    "error": "Inspector check failed",
-                    "report": report
-                })
-                return False, report
-                
-        except Exception as e:
-            self._log_event("ERROR", {
+                print(f"    - Librarian: Analyzing '{note_filename}'...")
+                ai_data = self.team['librarian'].analyze_note(content, note_filename)
+                prompt_stats = self.team['librarian'].last_prompt_stats
+            if not ai_data:
+                job["result"] = (False, "AI analysis failed")
+                return
+            if not dry_run:
+                self.manifest.mark(source_path, migration_manifest.CLASSIFIED,
+                                   hash=content_hash(content), mtime_ns=mtime_ns, size=size,
+                                   ai_data={k: ai_data[k] for k in ('suggested_folder', 'yaml_frontmatter') if k in ai_data})
+
+        # Very large notes are not kept in the job: the Editor re-reads and streams them
+        job["streamed"] = note_stream.is_large(size, self.stream_threshold)
+        job["content"] = None if job["streamed"] else content
+        job["ai_data"] = ai_data
+        job["prompt_stats"] = prompt_stats
+        job["target_folder"] = self.team['librarian'].get_standardized_path(ai_data.get('suggested_folder'))
+
+    def _edit(self, job, dry_run):
+        """Stage 2 (Editor): clean up the note and write it to the vault."""
+        target_folder = job["target_folder"]
+        print(f"    - Editor: Cleaning up '{job['filename']}' (Folder: {target_folder})...")
+        content = job.pop("content")
+        final_content = None
+        if content is not None:
+            final_content = self.team['editor'].process_content(content, target_folder, job["ai_data"])
+
+        if dry_run:
+            job["result"] = (True, {"target_folder": target_folder, "dry_run": True})
+            return
+
+        # Write to Vault
+        target_dir = os.path.join(self.vault, target_folder)
+        os.makedirs(target_dir, exist_ok=True)
+        target_path = os.path.join(target_dir, job["filename"])
+
+        if final_content is None:
+            # Streaming mode: cleaned chunks go straight to the temp file, memory stays bounded
+            with open(job["source_path"], 'r', encoding='utf-8') as f:
+                st = self.writer.write(target_path, self.team['editor'].stream_content(f, target_folder, job["ai_data"]))
+            self.manifest.mark(job["source_path"], migration_manifest.WRITTEN, target=target_path)
+            job["target_path"] = target_path
+            job["written"] = None
+            job["stat"] = st
+            return
+
+        # Keep the written bytes and the stat result so the Inspector does not read the file back
+        data = final_content.encode('utf-8')
+        # Re-running on an already processed note leaves the file untouched
+        _, st = self.writer.write_if_changed(target_path, data)
+        self.manifest.mark(job["source_path"], migration_manifest.WRITTEN, target=target_path)
+        job["target_path"] = target_path
+        job["written"] = data
+        job["stat"] = st
+
+    def _inspect(self, job, dry_run):
+        """Stage 3 (Inspector): verify the written note and record the outcome."""
+        note_filename = job["filename"]
+        print(f"    - Inspector: Verifying '{note_filename}'...")
+        if job["streamed"]:
+            report = self.team['inspector'].verify_streamed(job["target_path"], job["stat"], note_filename)
+        else:
+            report = self.team['inspector'].verify_written(job["target_path"], job.pop("written"), job["stat"], note_filename)
+
+        processing_time = time.time() - job["start_time"]
+
+        if report["exists"] and report["has_content"] and report["valid_folder"]:
+            # Success! Remove from Inbox (Archiving for now)
+            # archive_dir = os.path.join(self.inbox, "processed")
+            # os.makedirs(archive_dir, exist_ok=True)
+            # os.rename(source_path, os.path.join(archive_dir, note_filename))
+            self.manifest.mark(job["source_path"], migration_manifest.VERIFIED)
+
+            self._log_event("SUCCESS", {
                 "filename": note_filename,
-                "error": str(e)
+                "target": job["target_folder"],
+                "time": round(processing_time, 2),
+                "prompt": job["prompt_stats"],
+                "inspector_report": report
+            })
+            job["result"] = (True, report)
+        else:
+            self._log_event("WARNING", {
+                "filename": note_filename,
+                "target": job["target_folder"],
+                "error": "Inspector check failed",
+                "report": report
             })
-            return False, str(e)
+            job["result"] = (False, report)
+
+    def _stages(self):
+        return [("librarian", self._classify), ("editor", self._edit), ("inspector", self._inspect)]
+
+    def process_note(self, note_filename, dry_run=False):
+        """Coordinate specialists to process a single note."""
+        print(f"[*] Lead: Working on '{note_filename}'...")
+        job = self._new_job(note_filename)
+        for _, stage in self._stages():
+            if not self._run_stage(stage, job, dry_run):
+                break
+        return job["result"]
+
+    def _run_pipeline(self, notes, stats, dry_run=False, queue_size=PIPELINE_QUEUE_SIZE):
+        """
+        Run the stages concurrently, one thread per stage, connected by bounded queues.
+        While the Librarian classifies note N+1, the Editor writes note N and the
+        Inspector checks note N-1. Jobs stay in input order; a job that failed early
+        passes through the remaining stages untouched.
+        Yields finished jobs; stats (one StageStats per stage) is filled as it runs.
+        """
+        stages = self._stages()
+        queues = [queue.Queue(maxsize=queue_size) for _ in stages] + [queue.Queue()]
+
+        def run(index):
+            _, stage = stages[index]
+            inbox, outbox = queues[index], queues[index + 1]
+            while True:
+                job = inbox.get()
+                if job is _END:
+                    outbox.put(_END)
+                    return
+                if job["result"] is None:
+                    started = time.time()
+                    stats[index].record(started - job["queued_at"], started)
+                    self._run_stage(stage, job, dry_run)
+                    stats[index].finish(started, time.time())
+                job["queued_at"] = time.time()
+                outbox.put(job)
+
+        def feed():
+            for note in notes:
+                job = self._new_job(note)
+                job["queued_at"] = time.time()
+                queues[0].put(job)
+            queues[0].put(_END)
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+        threads += [threading.Thread(target=run, args=(i,), daemon=True) for i in range(len(stages))]
+        for thread in threads:
+            thread.start()
+        while True:
+            job = queues[-1].get()
+            if job is _END:
+                break
+            yield job
+        for thread in threads:
+            thread.join()
 
-    def process_batch(self, limit=None):
+    def _run_serial(self, notes, total):
+        for i, note in enumerate(notes):
+            print(f"\n[{i+1}/{total}]")
+            yield {"filename": note, "result": self.process_note(note)}
+
+    def _prefetch_window(self, note_filename):
+        """
+        Batch mode: when the Librarian reaches a note that is not fetched yet, classify the
+        window of notes starting there (one window's contents in memory at a time).
+        """
+        index = self._batch_index.get(note_filename)
+        if index is None or index < self._batch_next:
+            return
+        window = self._batch_notes[index:index + self.team['librarian'].batcher.max_batch * 2]
+        self._batch_next = index + len(window)
+        self._prefetch(window)
+
+    def _prefetch(self, notes):
+        """Classify the notes that still need the Librarian, several per LLM call. Large notes are left to analyze_note."""
+        pending = []
+        for note_filename in notes:
+            source_path = os.path.join(self.inbox, note_filename)
+            mtime_ns, size = migration_manifest.source_fingerprint(source_path)
+            if migration_manifest.reusable_classification(self.manifest.get(source_path), mtime_ns, size):
+                continue
+            if note_stream.is_large(size, self.stream_threshold):
+                continue
+            with open(source_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            if content.strip():
+                pending.append((content, note_filename))
+        if not pending:
+            return
+        print(f"    - Librarian: Batch-classifying {len(pending)} notes...")
+        for (_, note_filename), ai_data in zip(pending, self.team['librarian'].analyze_notes(pending)):
+            if ai_data:
+                self._prefetched[note_filename] = ai_data
+
+    def process_batch(self, limit=None, pipeline=True, queue_size=PIPELINE_QUEUE_SIZE, batch=False):
         """Run the migration for all notes in the inbox."""
         notes = self.analyze_inbox()
+
+        # Skip notes already written/verified in a previous session without touching them
+        remaining = [n for n in notes if not self.manifest.is_done(os.path.join(self.inbox, n))]
+        if len(remaining) < len(notes):
+            print(f"[*] Lead: Resuming - {len(notes) - len(remaining)} notes already done (manifest).")
+        notes = remaining
+
         if limit:
             notes = notes[:limit]
             print(f"[*] Lead: Limit set to {limit} notes.")
@@ -132,24 +367,67 @@ class LeadArchivist:
         total = len(notes)
         success = 0
         failed = 0
-        
-        print(f"[*] Starting Batch Migration of {total} notes...")
-        
-        for i, note in enumerate(notes):
-            print(f"\n[{i+1}/{total}]")
-            ok, info = self.process_note(note)
+        batch_start = time.time()
+
+        print(f"[*] Starting Batch Migration of {total} notes{' (pipelined)' if pipeline else ''}...")
+        if batch:
+            # Classified window by window as the Librarian reaches them (see _prefetch_window)
+            self._batch_notes = notes
+            self._batch_index = {note: i for i, note in enumerate(notes)}
+            self._batch_next = 0
+
+        stage_stats = None
+        if pipeline:
+            stage_stats = [StageStats(name) for name, _ in self._stages()]
+            jobs = self._run_pipeline(notes, stage_stats, queue_size=queue_size)
+        else:
+            jobs = self._run_serial(notes, total)
+
+        for i, job in enumerate(jobs):
+            ok, info = job["result"]
             if ok:
                 success += 1
+                if pipeline:
+                    print(f"[{i+1}/{total}] Done: {job['filename']}")
             else:
                 failed += 1
-                print(f"[!] Lead: Failed {note} - {info}")
+                print(f"[!] Lead: Failed {job['filename']} - {info}")
 
+        self.writer.commit()
+        wall_time = time.time() - batch_start
         print(f"\n[+] Batch Finished!")
         print(f"    - Success: {success}")
         print(f"    - Failed: {failed}")
+        print(f"    - Time Elapsed: {wall_time:.2f}s")
+        if stage_stats:
+            for stat in stage_stats:
+                print(f"    - {stat.summary()}")
+            self._log_event("PIPELINE_STATS", {
+                "notes": total,
+                "wall_time": round(wall_time, 2),
+                "queue_size": queue_size,
+                "stages": {stat.name: stat.as_dict() for stat in stage_stats}
+            })
+        if self.team['librarian'].rules is not None:
+            self.team['librarian'].rules.report()
+        if self.team['librarian'].knn is not None:
+            self.team['librarian'].knn.report()
+        self.team['librarian'].batcher.report()
+        self.logger.flush()
         print(f"    - Log file: {self.session_log_path}")
 
 if __name__ == "__main__":
-    # Example usage
-    lead = LeadArchivist("00_Inbox", "Obsidian_Vault")
-    lead.process_batch(limit=2)
+    parser = argparse.ArgumentParser(description="Run the multi-agent inbox migration.")
+    parser.add_argument("--limit", type=int, default=2, help="Number of notes to process (0 = all)")
+    parser.add_argument("--serial", action="store_true", help="Run the stages one note at a time instead of pipelined")
+    parser.add_argument("--paranoid", action="store_true", help="Inspector re-reads every written file from disk")
+    parser.add_argument("--compress-log", action="store_true", help="Write the session log as .jsonl.gz")
+    parser.add_argument("--batch", action="store_true", help="Classify several short notes per LLM call before the pipeline starts")
+    parser.add_argument("--knn", choices=("tfidf", "embed"), help="Classify by nearest already-filed notes first (LLM only when unsure)")
+    parser.add_argument("--stream-mb", type=float, default=note_stream.STREAM_THRESHOLD / (1024 * 1024),
+                        help="Stream notes larger than this many MB instead of cleaning them in memory (0 = always)")
+    args = parser.parse_args()
+
+    lead = LeadArchivist("00_Inbox", "Obsidian_Vault", paranoid=args.paranoid, compress_log=args.compress_log,
+                         knn=args.knn, stream_threshold=int(args.stream_mb * 1024 * 1024))
+    lead.process_batch(limit=args.limit or None, pipeline=not args.serial, batch=args.batch)
@@ -1,8 +1,11 @@
 import os
-import json
-import requests
-import re
 import unicodedata
+from classification_cache import get_default_cache
+from ollama_client import get_client
+from para_normalizer import standardize_folder
+from prompt_context import ContextBuilder
+from rule_classifier import RuleClassifier
+from batch_classifier import BatchClassifier
 
 class LibrarianAgent:
     """
@@ -11,10 +14,20 @@ class LibrarianAgent:
     - Normalizes PARA folder paths across the vault.
     - Ensures consistent categorization based on Skills.
     """
-    def __init__(self, ollama_url="http://localhost:11434/api/generate", model="gemma3:12b"):
+    def __init__(self, ollama_url="http://localhost:11434/api/generate", model="gemma3:12b", use_cache=True, use_rules=True,
+                 knn=None):
         self.ollama_url = ollama_url
         self.model = model
+        self.client = get_client(ollama_url)
+        self.context = ContextBuilder()
+        self.last_prompt_stats = {}
+        self.rules = RuleClassifier() if use_rules else None
+        # Optional KnnClassifier fitted on already-filed vault notes
+        self.knn = knn
         self.prompt_template = self._load_prompt()
+        self.cache = get_default_cache() if use_cache else None
+        # Packs several short notes into one prompt for analyze_notes
+        self.batcher = BatchClassifier(self.client, model, self.prompt_template, self.context)
 
     def _load_prompt(self):
         prompt_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../prompts/summarize_note.md"))
@@ -26,72 +39,59 @@ class LibrarianAgent:
     def normalize_nfc(self, text):
         return unicodedata.normalize('NFC', text)
 
-    def analyze_note(self, content):
-        """Invoke AI to get classification data."""
-        try:
-            prompt = self.prompt_template.replace("{{note_content}}", content)
-            response = requests.post(self.ollama_url, json={
-                "model": self.model, "prompt": prompt, "format": "json", "stream": False
-            }, timeout=60)
-            
-            if response.status_code == 200:
-                return json.loads(response.json()['response'])
-        except Exception as e:
-            print(f"[!] Librarian Error: AI analysis failed - {e}")
+    def analyze_note(self, content, filename=None):
+        """
+        Invoke AI to get classification data (served from the shared cache when possible).
+        Confident cases are resolved by the rule fast-path or the k-NN classifier without any LLM call.
+        Long notes are reduced to a bounded context; token estimates land in last_prompt_stats.
+        """
+        self.last_prompt_stats = {}
+        ai_data = self._fast_path(content, filename)
+        if ai_data:
+            return ai_data
+        template_key = self.prompt_template + self.context.signature
+        prompt = self.context.build_prompt(self.prompt_template, content, filename, self.last_prompt_stats)
+        ai_data = self.client.generate_json(self.model, prompt)
+        if ai_data is None:
+            print(f"[!] Librarian Error: AI analysis failed")
+            return None
+        if self.cache is not None:
+            self.cache.put(content, self.model, template_key, ai_data)
+        return ai_data
+
+    def _fast_path(self, content, filename):
+        """Rules, then k-NN, then the shared cache. None when the LLM has to decide."""
+        if self.rules is not None:
+            ai_data = self.rules.classify(content, filename)
+            if ai_data:
+                return ai_data
+        if self.knn is not None:
+            ai_data = self.knn.classify(content, filename)
+            if ai_data:
+                return ai_data
+        if self.cache is not None:
+            return self.cache.get(content, self.model, self.prompt_template + self.context.signature)
         return None
 
+    def analyze_notes(self, notes, workers=1):
+        """
+        Batched analyze_note: notes is [(content, filename)], returns ai_data (or None) per note.
+        Fast-path hits are resolved first; the rest go to the LLM several short notes per prompt,
+        with single-note calls only for items missing from a batch response.
+        """
+        results = [None] * len(notes)
+        pending = []
+        for i, (content, filename) in enumerate(notes):
+            results[i] = self._fast_path(content, filename)
+            if not results[i]:
+                pending.append(i)
+        template_key = self.prompt_template + self.context.signature
+        for i, ai_data in zip(pending, self.batcher.classify_many([notes[i] for i in pending], workers)):
+            results[i] = ai_data
+            if ai_data and self.cache is not None:
+                self.cache.put(notes[i][0], self.model, template_key, ai_data)
+        return results
+
     def get_standardized_path(self, ai_suggested_folder):
         """Normalize the AI suggested folder into standard PARA structure."""
-        raw_folder = ai_suggested_folder or "00_Inbox"
-        
-        mapping_rules = [
-            (r'^0?0_?(?:Inbox|인박스)', '00_Inbox'),
-            (r'^0?1_?(?:Projects?|프로젝트)', '01_Projects'),
-            (r'^0?2_?(?:Areas?|영역)', '02_Areas'),
-            (r'^0?3_?(?:Resources?|자료)', '03_Resources'),
-            (r'^0?4_?(?:Archives?|보관)|99_?Archive', '04_Archives'),
-            (r'^Projects?', '01_Projects'),
-            (r'^Areas?', '02_Areas'),
-            (r'^Resources?', '03_Resources'),
-            (r'^Archives?', '04_Archives'),
-        ]
-        
-        suggested_folder = raw_folder
-        for pattern, target in mapping_rules:
-            if re.search(pattern, raw_folder, re.IGNORECASE):
-                suggested_folder = re.sub(pattern, target, raw_folder, count=1, flags=re.IGNORECASE)
-                break
-        
-        if suggested_folder == raw_folder and not re.match(r'^\d+_', raw_folder):
-            simple_keywords = [
-                ('Project', '01_Projects'),
-                ('Area', '02_Areas'),
-                ('Resource', '03_Resources'),
-                ('Archive', '04_Archives')
-            ]
-            for kw, target in simple_keywords:
-                if kw.lower() in raw_folder.lower():
-                    pattern = r'^' + kw + r's?'
-                    if re.search(pattern, raw_folder, re.IGNORECASE):
-                        suggested_folder = re.sub(pattern, target, raw_folder, count=1, flags=re.IGNORECASE)
-                    else:
-                        if not raw_folder.startswith(target):
-                            suggested_folder = target + "/" + raw_folder.lstrip("/")
-                    break
-        
-        # Deduplicate nested PARA folders (e.g., 01_Projects/01_Projects)
-        parts = suggested_folder.replace("\\", "/").split('/')
-        new_parts = []
-        for p in parts:
-            p = p.strip()
-            if not p: continue
-            if not new_parts or p.lower() != new_parts[-1].lower():
-                is_duplicate = False
-                for _, standard in mapping_rules[:5]:
-                    if p.lower() in standard.lower() and new_parts and new_parts[-1] == standard:
-                        is_duplicate = True
-                        break
-                if not is_duplicate:
-                    new_parts.append(p)
-        
-        return "/".join(new_parts)
+        return standardize_folder(ai_suggested_folder)
@@ -1,10 +1,27 @@
 import os
 import time
-import json
-import requests
-import shutil
-import re
+import argparse
+import itertools
 import unicodedata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from classification_cache import get_default_cache, content_hash
+import migration_manifest
+import near_duplicates
+import vault_index
+from ollama_client import get_client
+from prompt_context import ContextBuilder, HEAD_CHARS
+from rule_classifier import RuleClassifier
+from knn_classifier import KnnClassifier
+from batch_classifier import BatchClassifier
+from para_normalizer import standardize_folder
+from atomic_write import AtomicWriter
+from frontmatter import merge_frontmatter
+from link_index import LinkIndex, INDEX_PATH as LINK_INDEX_FILE
+from search_index import SearchIndex, INDEX_PATH as SEARCH_INDEX_FILE
+from markdown_rewrite import ALLOWED_TAGS, rewrite_markdown, image_prefix_for_depth
+from attachment_store import AttachmentStore, link_table, MODES as ATTACH_MODES
+import note_stream
 
 # Configuration
 SOURCE_ROOT = "ref_upnote/upnote_export_260213"
@@ -12,6 +29,8 @@ TARGET_ROOT = "Obsidian_Vault"
 OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "gemma3:12b"
 PROMPT_FILE = "prompts/summarize_note.md"
+MANIFEST_FILE = ".cache/ai_batch_manifest.jsonl"
+INDEX_FILE = ".cache/ai_batch_index.sqlite"
 
 # 카테고리 매핑 (Plural 일원화)
 CATEGORY_MAP = {
@@ -25,61 +44,354 @@ CATEGORY_MAP = {
     "Archive": "04_Archives"
 }
 
-# 허용된 태그
-ALLOWED_TAGS = {'raw', 'code', 'distilled', 'final', 'vp', 'family', 'reference', 'checklist', 'it', 'distill', 'unreal', 'disguise'}
-
 def normalize_nfc(text):
     return unicodedata.normalize('NFC', text)
 
-def clean_inline_hashtags(content):
-    pattern = r'(?<!\w)#([a-zA-Z0-9_\uAC00-\uD7A3]+)'
-    lines = content.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        if re.match(r'^#{1,6}\s', line):
-            cleaned_lines.append(line)
-            continue
-        cleaned_line = re.sub(pattern, lambda m: m.group(0) if m.group(1).lower() in ALLOWED_TAGS else f"\\#{m.group(1)}", line)
-        cleaned_lines.append(cleaned_line)
-    return '\n'.join(cleaned_lines)
-
-def fix_image_paths(content, target_folder):
-    # Obsidian_Vault 루트 기준 Files 폴더 위치 (항상 root에 있다고 가정)
-    # depth에 따라 ../ 개수 조절
-    depth = target_folder.count('/')
-    prefix = "../" * depth
-    pattern = r'!\[(.*?)\]\(Files/(.*?)\)'
-    replacement = f'![\\1]({prefix}Files/\\2)'
-    return re.sub(pattern, replacement, content)
-
-def get_ai_analysis(content, prompt_template):
+def is_skipped_dir(path):
+    # 첨부파일 및 중복 폴더 제외
+    return 'Files' in path or 'notebooks' in path
+
+def get_ai_analysis(content, prompt_template, cache=None, context=None, filename=None, stats=None):
+    """
+    AI 분류 결과(dict)를 돌려줍니다. 실패 시 None.
+    context(ContextBuilder)로 긴 노트는 제한된 크기의 프롬프트로 줄여 보내며,
+    stats(dict)가 주어지면 추정 토큰 수를 기록합니다. (캐시 적중 시 기록 없음)
+    """
+    context = context or ContextBuilder()
+    template_key = prompt_template + context.signature
+    # 같은 본문/모델/프롬프트로 이미 분류한 적이 있으면 AI 호출 생략
+    if cache is not None:
+        cached = cache.get(content, MODEL_NAME, template_key)
+        if cached is not None:
+            return cached
+    prompt = context.build_prompt(prompt_template, content, filename, stats)
+    ai_data = get_client(OLLAMA_URL).generate_json(MODEL_NAME, prompt)
+    if ai_data is not None and cache is not None:
+        cache.put(content, MODEL_NAME, template_key, ai_data)
+    return ai_data
+
+def quick_classification(source_path, content, filename, mtime_ns, size, manifest=None, rules=None, knn=None):
+    """AI 호출 없이 가능한 분류 (규칙 -> 체크포인트 -> k-NN 순). 없으면 None"""
+    ai_data = None
+    if rules is not None:
+        source_dir = os.path.relpath(os.path.dirname(source_path), SOURCE_ROOT)
+        ai_data = rules.classify(content, filename, normalize_nfc(source_dir))
+    if not ai_data and manifest is not None:
+        ai_data = migration_manifest.reusable_classification(manifest.get(source_path), mtime_ns, size)
+    if not ai_data and knn is not None:
+        ai_data = knn.classify(content, filename)
+    return ai_data or None
+
+def checkpoint_classification(manifest, source_path, content, mtime_ns, size, ai_data):
+    if manifest is not None:
+        manifest.mark(source_path, migration_manifest.CLASSIFIED,
+                      hash=content_hash(content), mtime_ns=mtime_ns, size=size,
+                      ai_data={k: ai_data[k] for k in ('suggested_folder', 'yaml_frontmatter') if k in ai_data})
+
+def analyze_file(source_path, prompt_template, cache=None, manifest=None, context=None, rules=None,
+                 knn=None, classification=None, image_maps=None, stream_threshold=note_stream.STREAM_THRESHOLD):
+    """
+    노트 1개를 읽고 AI 분석 및 본문 변환까지 수행합니다. (워커 스레드에서 실행)
+    파일 쓰기는 하지 않고, 결과 dict만 돌려줍니다.
+    manifest가 있으면 분류 결과를 체크포인트로 남기고, 이전 실행의 분류 결과를 재사용합니다.
+    rules(RuleClassifier)가 확실히 분류할 수 있는 노트는 AI 호출 없이 처리합니다.
+    knn(KnnClassifier)이 있으면 이미 정리된 비슷한 노트들의 폴더로 분류하고, 확신이 낮을 때만 AI 를 호출합니다.
+    classification 이 주어지면 (중복 그룹 대표나 배치 호출의 분류 결과) 분류 단계를 모두 건너뜁니다.
+    image_maps 는 Files 폴더별 첨부 링크 치환표입니다. (AttachmentStore.sync_from, 노트마다 link_table 로 고름)
+    stream_threshold 보다 큰 노트는 변환 결과를 만들지 않고 result["stream"] 만 남겨
+    write_result 에서 소스를 줄 단위로 다시 읽으며 바로 기록합니다. (분류를 위해 한 번은 읽음)
+    """
+    filename = normalize_nfc(os.path.basename(source_path))
     try:
-        prompt = prompt_template.replace("{{note_content}}", content)
-        response = requests.post(OLLAMA_URL, json={
-            "model": MODEL_NAME, "prompt": prompt, "format": "json", "stream": False
-        }, timeout=60)
-        
-        if response.status_code == 200:
-            return json.loads(response.json()['response'])
+        mtime_ns, size = migration_manifest.source_fingerprint(source_path)
+        with open(source_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        if not content.strip():
+            return {"status": "empty", "filename": filename, "source_path": source_path}
+
+        ai_data = classification
+        prompt_stats = {}
+        if not ai_data:
+            ai_data = quick_classification(source_path, content, filename, mtime_ns, size, manifest, rules, knn)
+
+        if not ai_data:
+            # AI 분석 호출
+            ai_data = get_ai_analysis(content, prompt_template, cache, context, filename, prompt_stats)
+            if not ai_data:
+                return {"status": "ai_failed", "filename": filename, "source_path": source_path}
+            checkpoint_classification(manifest, source_path, content, mtime_ns, size, ai_data)
+
+        # 카테고리 정규화
+        suggested_folder = standardize_folder(ai_data.get('suggested_folder', '00_Inbox'))
+
+        # 내용 변환 (본문의 태그 정제 + 이미지 경로를 한 번에) + 기존 YAML 에 병합
+        # Obsidian_Vault 루트 기준 Files 폴더 위치 (항상 root에 있다고 가정)
+        found_tags = set()
+        frontmatter = ai_data.get('yaml_frontmatter', '---\n---\n')
+        image_map = link_table(image_maps, source_path) if image_maps else None  # 이 노트가 가리키는 Files 폴더의 표
+        rewrite_options = dict(allowed_tags=ALLOWED_TAGS, image_prefix=image_prefix_for_depth(suggested_folder.count('/')),
+                               found_tags=found_tags, image_map=image_map)
+        final_content = None
+        stream = None
+        if note_stream.is_large(size, stream_threshold):
+            stream = (frontmatter, rewrite_options)
+        else:
+            final_content = merge_frontmatter(content, frontmatter,
+                                              lambda body: rewrite_markdown(body, **rewrite_options))
+        return {
+            "status": "ready",
+            "filename": filename,
+            "source_path": source_path,
+            "suggested_folder": suggested_folder,
+            "content": final_content,
+            "stream": stream,
+            "hash": content_hash(content),
+            "tags": found_tags,
+            "prompt_stats": prompt_stats,
+            "classification": {k: ai_data[k] for k in ('suggested_folder', 'yaml_frontmatter') if k in ai_data},
+        }
     except Exception as e:
-        print(f"[!] AI Analysis Error: {e}")
-    return None
+        return {"status": "error", "filename": filename, "source_path": source_path, "error": e}
+
+def write_result(result, writer, overwrite=False):
+    """
+    분석 결과를 Vault에 기록합니다. (writer: AtomicWriter, 임시 파일 + rename)
+    ('success' | 'skipped' | 'exists', target_path) 를 돌려줍니다.
+    내용이 같으면 'skipped', 다른 내용의 파일이 이미 있으면 덮어쓰지 않고 'exists' 입니다.
+    overwrite=True 이면 (증분 모드에서 소스가 바뀐 경우) 기존 파일을 덮어씁니다.
+    """
+    # 최종 경로 설정
+    target_dir = os.path.join(TARGET_ROOT, result["suggested_folder"])
+    os.makedirs(target_dir, exist_ok=True)
+    target_path = os.path.join(target_dir, result["filename"])
+
+    # 중복 체크 (선택 사항: 원하시면 덮어쓰기 or 스킵)
+    if not overwrite and os.path.exists(target_path):
+        return ("skipped" if same_content(target_path, result) else "exists"), target_path
+
+    if result.get("stream") is not None:
+        # 큰 노트: frontmatter 병합 + 본문 변환 결과를 조각 단위로 바로 임시 파일에 (내용 비교 없이 기록)
+        frontmatter, options = result["stream"]
+        head = note_stream.HeadSample()
+        with open(result["source_path"], 'r', encoding='utf-8') as f:
+            pieces = note_stream.iter_pieces(f)
+            writer.write(target_path, head.tee(note_stream.merge_frontmatter_stream(pieces, frontmatter, **options)))
+        result["content"] = head.text  # 색인에는 앞부분만
+        return "success", target_path
+
+    # 덮어쓰기여도 내용이 같으면 (이미 처리된 노트를 다시 분류한 경우) 쓰지 않음
+    changed, _ = writer.write_if_changed(target_path, result["content"])
+    return ("success" if changed else "skipped"), target_path
+
+def same_content(target_path, result):
+    """대상 파일이 이번에 쓸 내용과 같은지 (스트리밍 결과는 비교하지 않고 다르다고 봄)"""
+    if result.get("stream") is not None:
+        return False
+    data = result["content"].encode('utf-8')
+    try:
+        if os.path.getsize(target_path) != len(data):
+            return False
+        with open(target_path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+def iter_analyzed(all_files, prompt_template, workers=1, batcher=None, **options):
+    """
+    analyze_file 결과를 입력 순서대로 yield 합니다.
+    workers > 1 이면 최대 workers*2 개의 작업을 미리 걸어두어
+    AI 요청이 항상 N개씩 떠 있도록 합니다.
+    batcher(BatchClassifier)가 있으면 iter_batched 로 여러 노트를 한 번에 분류합니다.
+    options는 analyze_file에 그대로 전달됩니다. (cache, manifest, context, rules, knn, image_maps, stream_threshold)
+    """
+    if batcher is not None:
+        yield from iter_batched(all_files, prompt_template, batcher, workers, **options)
+        return
+    if workers <= 1:
+        for source_path in all_files:
+            yield analyze_file(source_path, prompt_template, **options)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        files = iter(all_files)
+        pending = deque(
+            pool.submit(analyze_file, path, prompt_template, **options)
+            for path in itertools.islice(files, workers * 2)
+        )
+        while pending:
+            result = pending.popleft().result()
+            next_path = next(files, None)
+            if next_path is not None:
+                pending.append(pool.submit(analyze_file, next_path, prompt_template, **options))
+            yield result
+
+def iter_batched(all_files, prompt_template, batcher, workers=1, cache=None, manifest=None, context=None,
+                 rules=None, knn=None, image_maps=None, stream_threshold=note_stream.STREAM_THRESHOLD):
+    """
+    배치 모드: 파일을 구간(window) 단위로 읽어 규칙/체크포인트/k-NN/캐시로 분류되지 않은 노트만 모아
+    batcher 로 여러 개씩 한 프롬프트에 분류한 뒤, analyze_file(classification=...) 로 마무리합니다.
+    결과는 입력 순서대로 yield 합니다.
+    """
+    context = context or ContextBuilder()
+    template_key = prompt_template + context.signature
+    window = batcher.max_batch * max(1, workers) * 2
+    options = dict(cache=cache, manifest=manifest, context=context, rules=rules, knn=knn, image_maps=image_maps,
+                   stream_threshold=stream_threshold)
+    for start in range(0, len(all_files), window):
+        chunk = all_files[start:start + window]
+        classifications = {}
+        pending = []  # (경로, 본문, 파일명, mtime_ns, size)
+        for source_path in chunk:
+            filename = normalize_nfc(os.path.basename(source_path))
+            try:
+                mtime_ns, size = migration_manifest.source_fingerprint(source_path)
+                with open(source_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue  # analyze_file 이 오류로 보고
+            if not content.strip():
+                continue
+            ai_data = quick_classification(source_path, content, filename, mtime_ns, size, manifest, rules, knn)
+            if not ai_data and cache is not None:
+                ai_data = cache.get(content, MODEL_NAME, template_key)
+            if ai_data:
+                classifications[source_path] = ai_data
+            else:
+                pending.append((source_path, content, filename, mtime_ns, size))
+
+        failed = set()
+        results = batcher.classify_many([(content, filename) for _, content, filename, _, _ in pending], workers)
+        for (source_path, content, _, mtime_ns, size), ai_data in zip(pending, results):
+            if not ai_data:
+                failed.add(source_path)
+                continue
+            classifications[source_path] = ai_data
+            if cache is not None:
+                cache.put(content, MODEL_NAME, template_key, ai_data)
+            checkpoint_classification(manifest, source_path, content, mtime_ns, size, ai_data)
+
+        for source_path in chunk:
+            if source_path in failed:
+                yield {"status": "ai_failed", "filename": normalize_nfc(os.path.basename(source_path)),
+                       "source_path": source_path}
+            else:
+                yield analyze_file(source_path, prompt_template, classification=classifications.get(source_path),
+                                   **options)
+
+def iter_deduplicated(all_files, duplicates, prompt_template, workers=1, batcher=None, **options):
+    """
+    중복 그룹의 대표 노트만 분류하고, 구성원은 대표 바로 뒤에 대표의 분류 결과를 재사용해 yield 합니다.
+    duplicates: {경로: (대표 경로, 유사도, 완전 중복 여부)} (near_duplicates.group_duplicates)
+    완전 중복(내용이 바이트 단위로 같은 노트)은 status 'duplicate' 로 (Vault 에 다시 쓰지 않음),
+    대표의 분류가 실패하면 구성원은 각자 분류합니다.
+    """
+    members = {}
+    for path, (rep, _, _) in duplicates.items():
+        members.setdefault(rep, []).append(path)
+    representatives = [path for path in all_files if path not in duplicates]
+    for result in iter_analyzed(representatives, prompt_template, workers, batcher=batcher, **options):
+        yield result
+        for path in members.get(result["source_path"], ()):
+            rep, score, exact = duplicates[path]
+            if result["status"] != "ready":
+                yield analyze_file(path, prompt_template, **options)
+            elif exact:
+                yield {"status": "duplicate", "filename": normalize_nfc(os.path.basename(path)),
+                       "source_path": path, "duplicate_of": rep, "similarity": score}
+            else:
+                # 대표의 위치와 분류 항목만 재사용 (요약 등 대표 노트에만 맞는 항목은 빼고)
+                classification = dict(result["classification"])
+                classification["yaml_frontmatter"] = near_duplicates.classification_frontmatter(
+                    classification.get("yaml_frontmatter", ""))
+                member = analyze_file(path, prompt_template, classification=classification, **options)
+                member["duplicate_of"] = rep
+                member["similarity"] = score
+                yield member
+
+def read_notes(paths):
+    """(경로, 본문) 을 yield. 읽지 못하는 파일은 건너뜀 (분석 단계에서 오류로 보고됨)"""
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                yield path, f.read()
+        except (OSError, UnicodeDecodeError):
+            continue
 
-def migrate_batch(limit=None):
+def migrate_batch(limit=None, workers=1, use_cache=True, manifest_path=MANIFEST_FILE, rescan=True, incremental=False,
+                  head_chars=HEAD_CHARS, use_rules=True, sync=True, link_index=True, search_index=True, dedup=True, knn=None, batch=False,
+                  attachments=True, attach_mode="clone", stream_threshold=note_stream.STREAM_THRESHOLD):
     print(f"[*] AI Batch Migration Started: {SOURCE_ROOT} -> {TARGET_ROOT}")
     if limit:
         print(f"[*] PILOT MODE: Limited to {limit} files.")
+    if workers > 1:
+        print(f"[*] Concurrent mode: {workers} workers.")
     
     with open(PROMPT_FILE, 'r', encoding='utf-8') as f:
         prompt_template = f.read()
 
-    # 모든 마크다운 파일 수집
-    all_files = []
-    for root, dirs, files in os.walk(SOURCE_ROOT):
-        if 'Files' in root or 'notebooks' in root: continue # 첨부파일 및 중복 폴더 제외
-        for file in files:
-            if file.endswith(".md"):
-                all_files.append(os.path.join(root, file))
+    cache = get_default_cache() if use_cache else None
+    # 워커 수만큼 동시 요청을 허용하는 공유 클라이언트 준비
+    get_client(OLLAMA_URL, max_concurrency=workers)
+    context = ContextBuilder(head_chars=head_chars)
+    rules = RuleClassifier() if use_rules else None
+    # 이미 정리된 Vault 노트로 k-NN 분류 (knn: 'tfidf' | 'embed' | None)
+    knn_classifier = KnnClassifier(TARGET_ROOT, knn, url=OLLAMA_URL).fit() if knn else None
+    # 짧은 노트 여러 개를 한 프롬프트로 분류 (템플릿 토큰을 노트마다 다시 보내지 않음)
+    batcher = BatchClassifier(get_client(OLLAMA_URL), MODEL_NAME, prompt_template, context) if batch else None
+    manifest = migration_manifest.MigrationManifest(manifest_path) if manifest_path else None
+    index = vault_index.VaultIndex(INDEX_FILE) if incremental else None
+    # 폴더 fsync 는 COMMIT_EVERY 건마다, 그리고 마지막에 한 번 (group commit)
+    writer = AtomicWriter(sync=sync)
+    # 새로 쓴 노트의 태그/링크를 바로 색인 (Vault 전체 재탐색 없이 조회 가능)
+    links = LinkIndex(LINK_INDEX_FILE, TARGET_ROOT) if link_index else None
+    search = SearchIndex(SEARCH_INDEX_FILE, TARGET_ROOT) if search_index else None
+    # 첨부파일: 같은 내용은 Files/ 에 한 번만 (하드 링크/reflink), 노트 링크는 대표 이름으로 치환
+    store = AttachmentStore(TARGET_ROOT, mode=attach_mode, sync=sync) if attachments else None
+    image_maps = store.sync_from(SOURCE_ROOT) if store is not None else {}
+    source_stats = {}
+    changed_known = set()  # 이전에 처리했지만 내용이 바뀐 소스 (덮어쓰기 대상)
+
+    if manifest is not None and len(manifest) and not rescan and not incremental:
+        # 이전 실행의 파일 목록을 그대로 사용 (트리 탐색 생략, 이후 추가된 소스는 보지 않음)
+        all_files = manifest.paths()
+        print(f"[*] Resuming from manifest: {manifest_path} {manifest.counts()}")
+        print(f"[!] Source tree not rescanned: notes added since the first run are ignored")
+    else:
+        # 모든 마크다운 파일 수집 (scandir의 stat 결과를 증분 비교에 그대로 사용)
+        all_files = []
+        for path, st in vault_index.scan_markdown(SOURCE_ROOT, skip_dir=is_skipped_dir):
+            source_stats[path] = st
+            if index is not None and not index.is_changed(path, st):
+                continue
+            all_files.append(path)
+        if manifest is not None:
+            # limit 적용 전 전체 목록을 등록해야 이후 실행에서 나머지를 이어갈 수 있음
+            known = len(manifest)
+            added = manifest.add_pending(all_files)
+            if known:
+                print(f"[*] Resuming from manifest: {manifest_path} {manifest.counts()} ({added} new source files)")
+        if index is not None:
+            removed = index.prune(source_stats)
+            changed_known = {path for path in all_files if index.is_known(path)}
+            print(f"[*] Incremental: {len(all_files)} changed / {len(source_stats)} scanned "
+                  f"({len(removed)} removed since last scan)")
+            if manifest is not None:
+                # 바뀐 파일은 이전 실행에서 완료됐더라도 다시 처리
+                for path in all_files:
+                    if manifest.is_done(path):
+                        manifest.mark(path, migration_manifest.PENDING)
+
+    # 이미 기록/검수가 끝난 노트는 파일을 열지 않고 건너뜀
+    # (기록한 대상 파일이 사라졌거나 크기/mtime 이 바뀌었으면 다시 처리)
+    resumed_count = 0
+    if manifest is not None:
+        remaining = [path for path in all_files if not manifest.is_done(path, verify_target=True)]
+        stale = sum(1 for path in remaining if manifest.is_done(path))
+        if stale:
+            print(f"[!] {stale} previously written notes are missing or changed in the vault, checking again")
+        resumed_count = len(all_files) - len(remaining)
+        all_files = remaining
 
     if limit:
         all_files = all_files[:limit]
@@ -87,125 +399,168 @@ def migrate_batch(limit=None):
     total = len(all_files)
     print(f"[*] Total files to process: {total}")
 
+    # 같은/거의 같은 노트는 한 번만 분류 (UpNote export 의 중복 노트)
+    duplicates = {}
+    if dedup and total > 1:
+        dedup_start = time.time()
+        duplicates = near_duplicates.group_duplicates(read_notes(all_files))
+        identical = sum(1 for _, _, exact in duplicates.values() if exact)
+        print(f"[*] Duplicates: {identical} identical, {len(duplicates) - identical} near-duplicate notes "
+              f"({time.time() - dedup_start:.2f}s)")
+
     success_count = 0
     skip_count = 0
+    duplicate_count = 0
+    conflict_count = 0
+    reused_count = 0
+    targets = {}  # 소스 경로 -> 기록한 대상 경로 (완전 중복을 대표의 노트로 연결)
+    prompt_tokens = 0
+    note_tokens = 0
     start_time = time.time()
 
-    for i, source_path in enumerate(all_files):
-        filename = normalize_nfc(os.path.basename(source_path))
+    # 쓰기는 메인 스레드에서 입력 순서대로 수행 (같은 대상 경로는 먼저 나온 파일이 우선)
+    for i, result in enumerate(iter_deduplicated(all_files, duplicates, prompt_template, workers, batcher,
+                                                 cache=cache, manifest=manifest, context=context, rules=rules,
+                                                 knn=knn_classifier, image_maps=image_maps,
+                                                 stream_threshold=stream_threshold)):
+        filename = result["filename"]
         print(f"[{i+1}/{total}] Processing: {filename}...", end="\r")
 
-        # 분석 및 마이그레이션 로직
-        try:
-            with open(source_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            if not content.strip(): continue
-
-            # AI 분석 호출
-            ai_data = get_ai_analysis(content, prompt_template)
-            if not ai_data:
-                print(f"\n[!] AI failed for: {filename}")
+        status = result["status"]
+        source_path = result["source_path"]
+        if status == "empty":
+            if index is not None:
+                index.update(source_path, source_stats[source_path])
+            continue
+        if status == "duplicate":
+            rep_target = targets.get(result["duplicate_of"])
+            if rep_target is None:
+                # 대표가 기록되지 않음 (충돌/오류): 완료로 남기지 않고 다음 실행에서 다시 처리
+                print(f"\n[!] Duplicate of {result['duplicate_of']} was not written, {filename} left pending")
                 continue
+            duplicate_count += 1
+            print(f"\n[=] Duplicate: {filename} is identical to {result['duplicate_of']}, not written")
+            if manifest is not None:
+                manifest.mark(source_path, migration_manifest.WRITTEN, **migration_manifest.target_fields(rep_target))
+            if index is not None:
+                index.update(source_path, source_stats[source_path])
+            continue
+        if status == "ai_failed":
+            print(f"\n[!] AI failed for: {filename}")
+            continue
+        if status == "error":
+            print(f"\n[!] Error during processing {filename}: {result['error']}")
+            continue
+
+        usage = result["prompt_stats"]
+        if usage:
+            prompt_tokens += usage["prompt_tokens"]
+            note_tokens += usage["note_tokens"]
+            if usage["truncated"]:
+                print(f"\n[*] Prompt for {filename}: ~{usage['prompt_tokens']} tokens "
+                      f"(full note ~{usage['note_tokens']} tokens)")
 
-            # 카테고리 정규화
-            raw_folder = ai_data.get('suggested_folder', '00_Inbox')
-            
-            # 우선순위: 명시적 번호가 있는 경우 -> 키워드만 있는 경우
-            # (?i) : case-insensitive, (?:...) : non-capturing group
-            mapping_rules = [
-                (r'^0?0_?(?:Inbox|인박스)', '00_Inbox'),
-                (r'^0?1_?(?:Projects?|프로젝트)', '01_Projects'),
-                (r'^0?2_?(?:Areas?|영역)', '02_Areas'),
-                (r'^0?3_?(?:Resources?|자료)', '03_Resources'),
-                (r'^0?4_?(?:Archives?|보관)|99_?Archive', '04_Archives'),
-                # 번호 없이 키워드만 시작하는 경우
-                (r'^Projects?', '01_Projects'),
-                (r'^Areas?', '02_Areas'),
-                (r'^Resources?', '03_Resources'),
-                (r'^Archives?', '04_Archives'),
-            ]
-            
-            suggested_folder = raw_folder
-            for pattern, target in mapping_rules:
-                if re.search(pattern, raw_folder, re.IGNORECASE):
-                    # 매칭된 부분을 표준 이름으로 교체
-                    # 주의: sub는 매칭된 '부분'만 바꿈. 
-                    # 경로 전체를 보존하면서 앞부분만 바꾸기 위해 sub 사용
-                    suggested_folder = re.sub(pattern, target, raw_folder, count=1, flags=re.IGNORECASE)
-                    break
-            
-            # 만약 매칭되는 게 전혀 없다면 (단순 키워드가 중간에 있거나 앞에 번호가 없는 경우)
-            if suggested_folder == raw_folder and not re.match(r'^\d+_', raw_folder):
-                simple_keywords = [
-                    ('Project', '01_Projects'),
-                    ('Area', '02_Areas'),
-                    ('Resource', '03_Resources'),
-                    ('Archive', '04_Archives')
-                ]
-                for kw, target in simple_keywords:
-                    # 키워드가 포함되어 있으면
-                    if kw.lower() in raw_folder.lower():
-                        # 이미 타겟 이름으로 시작하는지 확인 (예: 'Projects/...' -> '01_Projects/...')
-                        pattern = r'^' + kw + r's?'
-                        if re.search(pattern, raw_folder, re.IGNORECASE):
-                            suggested_folder = re.sub(pattern, target, raw_folder, count=1, flags=re.IGNORECASE)
-                        else:
-                            # 중간에 키워드가 있는 경우 그냥 앞에 붙임 (단, 중복 방지)
-                            if not raw_folder.startswith(target):
-                                suggested_folder = target + "/" + raw_folder.lstrip("/")
-                        break
-            
-            # 최종 보정: "02_Areas/02_Areas" 같은 형태가 생겼다면 하나로 병합
-            # (AI가 가끔 카테고리명을 중복해서 뱉는 경우 방지)
-            parts = suggested_folder.split('/')
-            new_parts = []
-            for p in parts:
-                if not new_parts or p.lower() != new_parts[-1].lower():
-                    # PARA 폴더명끼리의 중복도 체크 (01_Projects vs Projects)
-                    is_duplicate = False
-                    for _, standard in mapping_rules[:5]:
-                        if p.lower() in standard.lower() and new_parts and new_parts[-1] == standard:
-                            is_duplicate = True
-                            break
-                    if not is_duplicate:
-                        new_parts.append(p)
-            suggested_folder = "/".join(new_parts)
-            
-            # 최종 경로 설정
-            target_dir = os.path.join(TARGET_ROOT, suggested_folder)
-            os.makedirs(target_dir, exist_ok=True)
-            target_path = os.path.join(target_dir, filename)
-
-            # 중복 체크 (선택 사항: 원하시면 덮어쓰기 or 스킵)
-            if os.path.exists(target_path):
+        try:
+            outcome, target_path = write_result(result, writer, overwrite=source_path in changed_known)
+            if outcome == "exists":
+                previous = manifest.get(source_path) if manifest is not None else None
+                if not previous or previous.get("target") != target_path:
+                    # 다른 노트가 같은 이름으로 이미 있음: 덮어쓰지도, 완료로 기록하지도 않음
+                    print(f"\n[!] Not written, {target_path} already exists with different content ({filename})")
+                    conflict_count += 1
+                    continue
+                # 이전에 이 소스로 기록한 파일이 Vault 에서 수정됨: 수정본을 유지
+                print(f"\n[~] Kept vault edits: {target_path}")
+                outcome = "skipped"
+            targets[source_path] = target_path
+            if "duplicate_of" in result:
+                reused_count += 1
+            if manifest is not None:
+                # 대상 파일의 크기/mtime 을 함께 남겨 다음 실행에서 파일을 열지 않고 확인
+                manifest.mark(source_path, migration_manifest.WRITTEN, **migration_manifest.target_fields(target_path))
+            if index is not None:
+                index.update(source_path, source_stats[source_path], content_hash=result["hash"],
+                             tags=result["tags"], para_folder=result["suggested_folder"].split('/')[0],
+                             target=target_path)
+            if outcome == "skipped":
                 # print(f"\n[-] Skipping (Already exists): {filename}")
                 skip_count += 1
                 continue
-
-            # 내용 변환 (태그 정제 + 이미지 경로 + YAML)
-            cleaned_content = clean_inline_hashtags(content)
-            final_content = fix_image_paths(cleaned_content, suggested_folder)
-            
-            frontmatter = ai_data.get('yaml_frontmatter', '---\n---\n')
-            full_content = f"{frontmatter}\n\n{final_content}"
-
-            with open(target_path, 'w', encoding='utf-8') as f:
-                f.write(full_content)
-            
+            if links is not None:
+                links.update_note(target_path, result["content"])
+            if search is not None:
+                search.update_note(target_path, result["content"])
             success_count += 1
-            
         except Exception as e:
             print(f"\n[!] Error during processing {filename}: {e}")
 
+    writer.commit()
+    if links is not None:
+        links.close()
+    if search is not None:
+        search.close()
+    if manifest is not None:
+        manifest.close()
+    if index is not None:
+        index.close()
+
     elapsed = time.time() - start_time
     print(f"\n\n[+] Migration Finished!")
     print(f"    - Total: {total}")
     print(f"    - Success: {success_count}")
     print(f"    - Skipped: {skip_count}")
+    if conflict_count:
+        print(f"    - Name conflicts (not written): {conflict_count}")
+    if duplicates:
+        print(f"    - Identical duplicates (not written): {duplicate_count}")
+        print(f"    - Near-duplicates (classification reused): {reused_count}")
+    if resumed_count:
+        print(f"    - Already done (manifest): {resumed_count}")
     print(f"    - Time Elapsed: {elapsed:.2f}s (Avg: {elapsed/max(1, success_count):.2f}s/file)")
+    if prompt_tokens:
+        print(f"    - Prompt tokens (est.): {prompt_tokens} sent / {note_tokens} in full notes")
+    if rules is not None:
+        rules.report()
+    if knn_classifier is not None:
+        knn_classifier.report()
+    if batcher is not None:
+        batcher.report()
+    if cache is not None:
+        stats = cache.stats()
+        print(f"    - Cache: {stats['hits']} hits / {stats['misses']} misses")
+    if store is not None:
+        store.report()
+        store.close()
 
 if __name__ == "__main__":
-    # PILOT TEST: 10개만 먼저 진행해 봅니다.
-    # 전체 마이그레이션 시에는 None으로 변경하거나 인자를 제거하세요.
-    migrate_batch(limit=10)
+    parser = argparse.ArgumentParser(description="UpNote export -> Obsidian_Vault AI 마이그레이션")
+    # PILOT TEST: 기본값은 10개만 먼저 진행합니다.
+    # 전체 마이그레이션 시에는 --limit 0 을 주세요.
+    parser.add_argument("--limit", type=int, default=10, help="처리할 최대 파일 수 (0 = 전체)")
+    parser.add_argument("--workers", type=int, default=1, help="동시에 보낼 AI 분석 요청 수")
+    parser.add_argument("--no-cache", action="store_true", help="분류 캐시를 사용하지 않고 항상 AI 호출")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="재개용 체크포인트 파일 경로")
+    parser.add_argument("--no-manifest", action="store_true", help="체크포인트 없이 처음부터 실행")
+    parser.add_argument("--no-rescan", action="store_true", help="체크포인트의 파일 목록만 사용 (소스 트리 탐색 생략, 새로 추가된 노트는 무시)")
+    parser.add_argument("--head-chars", type=int, default=HEAD_CHARS, help="긴 노트에서 프롬프트에 넣을 앞부분 글자 수")
+    parser.add_argument("--no-rules", action="store_true", help="규칙 기반 빠른 분류를 끄고 모든 노트를 AI 로 분류")
+    parser.add_argument("--incremental", action="store_true", help="지난 실행 이후 바뀐 파일만 처리 (vault 색인 사용)")
+    parser.add_argument("--no-fsync", action="store_true", help="fsync 생략 (원자적 교체만 보장, 전원 차단 시 유실 가능)")
+    parser.add_argument("--no-link-index", action="store_true", help="태그/링크 색인을 갱신하지 않음")
+    parser.add_argument("--no-search-index", action="store_true", help="전문 검색 색인을 갱신하지 않음")
+    parser.add_argument("--no-dedup", action="store_true", help="중복/거의 같은 노트도 각각 분류하고 기록")
+    parser.add_argument("--batch", action="store_true", help="짧은 노트 여러 개를 한 번의 AI 호출로 분류")
+    parser.add_argument("--knn", choices=("tfidf", "embed"), help="이미 정리된 노트 기반 k-NN 으로 먼저 분류 (확신이 낮을 때만 AI)")
+    parser.add_argument("--no-attachments", action="store_true", help="Files/ 첨부파일을 복사하지 않음 (링크 치환도 생략)")
+    parser.add_argument("--attach-mode", choices=ATTACH_MODES, default="clone",
+                        help="첨부 배치 방식: link = 하드 링크, clone = reflink/커널 복사")
+    parser.add_argument("--stream-mb", type=float, default=note_stream.STREAM_THRESHOLD / (1024 * 1024),
+                        help="이보다 큰 노트(MB)는 변환 결과를 메모리에 만들지 않고 스트리밍으로 기록 (0 = 항상 스트리밍)")
+    args = parser.parse_args()
+    migrate_batch(limit=args.limit or None, workers=max(1, args.workers), use_cache=not args.no_cache,
+                  manifest_path=None if args.no_manifest else args.manifest, rescan=not args.no_rescan,
+                  incremental=args.incremental, head_chars=args.head_chars,
+                  use_rules=not args.no_rules, sync=not args.no_fsync, link_index=not args.no_link_index,
+                  search_index=not args.no_search_index, dedup=not args.no_dedup,
+                  knn=args.knn, batch=args.batch, attachments=not args.no_attachments,
+                  attach_mode=args.attach_mode, stream_threshold=int(args.stream_mb * 1024 * 1024))
@@ -1,11 +1,21 @@
 import os
 import time
-import json
-import requests
-import shutil
-import re
+import queue
+import argparse
+import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
+from classification_cache import get_default_cache
+from markdown_rewrite import clean_inline_hashtags
+from frontmatter import merge_frontmatter
+from ollama_client import get_client
+from para_normalizer import standardize_folder
+from atomic_write import atomic_write, fsync_dir
+from link_index import get_default_index
+import search_index
+import near_duplicates
+import note_stream
+from prompt_context import ContextBuilder
 
 # Configuration
 WATCH_DIR = "Obsidian_Vault/00_Inbox"
@@ -13,33 +23,124 @@ VAULT_ROOT = "Obsidian_Vault"
 OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "gemma3:12b"
 PROMPT_FILE = "prompts/summarize_note.md"
-
-# 허용된 태그 리스트
-ALLOWED_TAGS = {'raw', 'code', 'distilled', 'final', 'vp', 'family', 'reference', 'checklist', 'it', 'distill', 'unreal', 'disguise'}
-
-def clean_inline_hashtags(content):
-    pattern = r'(?<!\w)#([a-zA-Z0-9_\uAC00-\uD7A3]+)'
-    lines = content.split('\n')
-    cleaned_lines = []
-    for line in lines:
-        if re.match(r'^#{1,6}\s', line):
-            cleaned_lines.append(line)
-            continue
-        cleaned_line = re.sub(pattern, lambda m: m.group(0) if m.group(1).lower() in ALLOWED_TAGS else f"\\#{m.group(1)}", line)
-        cleaned_lines.append(cleaned_line)
-    return '\n'.join(cleaned_lines)
+WORKERS = 2             # 동시에 처리할 노트 수
+SETTLE_SECONDS = 1.0    # 크기/수정시각이 이 시간 동안 변하지 않으면 쓰기 완료로 판단
+POLL_INTERVAL = 0.25    # 대기 중인 파일 상태 확인 주기
 
 class NoteHandler(FileSystemEventHandler):
+    """
+    watchdog 이벤트를 받아 내부 큐에 넣고, 워커 스레드가 처리합니다.
+    - 같은 경로의 중복 이벤트(created/modified/moved)는 하나로 합침
+    - 고정 sleep 대신 파일 크기/mtime 이 SETTLE_SECONDS 동안 안정되면 처리
+    - observer 스레드는 큐에 넣기만 하므로 대량 유입 시에도 막히지 않음
+    """
+    def __init__(self, workers=WORKERS, settle_seconds=SETTLE_SECONDS):
+        super().__init__()
+        self.workers = workers
+        self.settle_seconds = settle_seconds
+        self._pending = {}       # path -> (마지막 (size, mtime_ns), 안정 시작 시각)
+        self._in_flight = set()  # 워커가 처리 중인 경로
+        self._written = {}       # Inbox 에서 제자리로 고쳐 쓴 경로 -> (size, mtime_ns) (자기 쓰기 이벤트 무시용)
+        self._lock = threading.Lock()
+        self._move_lock = threading.Lock()
+        self._ready = queue.Queue()
+        self._stop = threading.Event()
+        self._threads = []
+        self._prompt_template = None
+        self._prompt_mtime = None
+        self.context = ContextBuilder()
+
+    # --- watchdog 이벤트 (observer 스레드) ---
+
     def on_created(self, event):
-        if not event.is_directory and event.src_path.endswith(".md"):
-            self.process_note(event.src_path)
+        if not event.is_directory:
+            self._enqueue(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self._enqueue(event.src_path)
+
+    def on_moved(self, event):
+        # 다른 곳에서 Inbox 로 옮겨진 경우만 (처리 후 밖으로 옮긴 파일, Inbox 안에서의 이름 변경/임시 파일 교체는 무시)
+        inbox = os.path.abspath(WATCH_DIR)
+        if (not event.is_directory and os.path.dirname(os.path.abspath(event.dest_path)) == inbox
+                and os.path.dirname(os.path.abspath(event.src_path)) != inbox):
+            self._enqueue(event.dest_path)
+
+    def _enqueue(self, path):
+        if not path.endswith(".md"):
+            return
+        with self._lock:
+            # 이미 대기 중이면 안정 판정만 다시 시작 (중복 이벤트 합치기)
+            self._pending[path] = (None, time.monotonic())
+
+    # --- 디바운스 / 워커 ---
+
+    def start(self):
+        self._threads.append(threading.Thread(target=self._dispatch_loop, name="noteguard-dispatch", daemon=True))
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._worker_loop, name=f"noteguard-worker-{i}", daemon=True))
+        for t in self._threads:
+            t.start()
+
+    def stop(self):
+        self._stop.set()
+        for _ in range(self.workers):
+            self._ready.put(None)
+        for t in self._threads:
+            t.join()
+
+    def _dispatch_loop(self):
+        """대기 중인 파일을 주기적으로 stat 하여, 쓰기가 끝난 파일만 워커 큐로 넘깁니다."""
+        while not self._stop.wait(POLL_INTERVAL):
+            now = time.monotonic()
+            with self._lock:
+                for path, (last_sig, stable_since) in list(self._pending.items()):
+                    if path in self._in_flight:
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        # 이미 처리되어 옮겨졌거나 삭제됨
+                        del self._pending[path]
+                        continue
+                    sig = (st.st_size, st.st_mtime_ns)
+                    if self._written.get(os.path.abspath(path)) == sig:
+                        # 워커가 제자리로 고쳐 쓴 결과 그대로 (다시 분류하지 않음)
+                        del self._pending[path]
+                        continue
+                    if sig != last_sig:
+                        self._pending[path] = (sig, now)
+                    elif now - stable_since >= self.settle_seconds:
+                        del self._pending[path]
+                        self._in_flight.add(path)
+                        self._ready.put(path)
+
+    def _worker_loop(self):
+        while True:
+            path = self._ready.get()
+            if path is None:
+                return
+            try:
+                self.process_note(path)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(path)
+
+    def _load_prompt(self):
+        """프롬프트 템플릿은 파일이 바뀌었을 때만 다시 읽음"""
+        mtime = os.stat(PROMPT_FILE).st_mtime_ns
+        if mtime != self._prompt_mtime:
+            with open(PROMPT_FILE, 'r', encoding='utf-8') as f:
+                self._prompt_template = f.read()
+            self._prompt_mtime = mtime
+        return self._prompt_template
 
     def process_note(self, file_path):
         # AI 분석 파일은 다시 처리하지 않음 (이동 후 처리 방지)
         if VAULT_ROOT not in file_path: return
         
         print(f"[*] Processing note: {file_path}")
-        time.sleep(1.5)  # 파일 쓰기 완료 대기
         
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -47,87 +148,124 @@ class NoteHandler(FileSystemEventHandler):
             
             if not content.strip(): return
 
-            # 프롬프트 템플릿 읽기
-            with open(PROMPT_FILE, 'r', encoding='utf-8') as f:
-                prompt_template = f.read()
-            
-            prompt = prompt_template.replace("{{note_content}}", content)
+            # Vault 에 내용이 똑같은 노트가 이미 있으면 _1 사본을 만들지 않고 Inbox 에 그대로 둠 (지우지 않음),
+            # 거의 같은 노트가 있으면 그 노트의 위치/분류 항목을 재사용 (AI 호출 생략)
+            duplicates = near_duplicates.get_default_index(VAULT_ROOT)
+            match = duplicates.find(content, exclude_dir=WATCH_DIR)
+            ai_data = None
+            if match is not None:
+                dup_path, score, exact = match
+                if exact:
+                    print(f"[=] Duplicate: {os.path.basename(file_path)} is identical to {dup_path}, left in Inbox")
+                    return
+                print(f"    - Near-duplicate of {dup_path} ({score:.2f}), reusing its classification")
+                ai_data = near_duplicates.classification_of(dup_path, VAULT_ROOT)
 
-            # Ollama 호출
-            response = requests.post(OLLAMA_URL, json={
-                "model": MODEL_NAME, "prompt": prompt, "format": "json", "stream": False
-            })
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_data = json.loads(result['response'])
-                
-                # 1. 태그 정제 및 YAML 삽입
-                cleaned_content = clean_inline_hashtags(content)
-                new_frontmatter = ai_data.get('yaml_frontmatter', '---\n---\n')
-                
-                # 기존 Frontmatter가 있는지 확인 (매우 단순한 체크)
-                if cleaned_content.startswith('---'):
-                    # 기존 것 교체하거나 유지 (여기선 일단 상단에 추가)
-                    final_content = f"{new_frontmatter}\n{cleaned_content}"
-                else:
-                    final_content = f"{new_frontmatter}\n\n{cleaned_content}"
+            if ai_data is None:
+                # 프롬프트 템플릿 읽기
+                prompt_template = self._load_prompt()
 
-                # 2. 파일 저장 (임시 저장 후 이동)
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(final_content)
+                template_key = prompt_template + self.context.signature
 
-                # 3. 자동 이동
-                suggested_subfolder = ai_data.get('suggested_folder', '00_Inbox')
-                
-                # 카테고리 이름 일원화 (복수형)
-                folder_mapping = {
-                    "01_Project": "01_Projects",
-                    "02_Area": "02_Areas",
-                    "03_Resource": "03_Resources",
-                    "99_Archive": "04_Archives"
-                }
-                for old, new in folder_mapping.items():
-                    if old in suggested_subfolder:
-                        suggested_subfolder = suggested_subfolder.replace(old, new)
-                        break
-
-                target_dir = os.path.join(VAULT_ROOT, suggested_subfolder)
-                
-                if not os.path.exists(target_dir):
-                    os.makedirs(target_dir)
-                
-                target_path = os.path.join(target_dir, os.path.basename(file_path))
-                
-                # 중복 방지
+                # 캐시 조회 후 없을 때만 Ollama 호출 (긴 노트는 제한된 크기의 프롬프트로)
+                cache = get_default_cache()
+                ai_data = cache.get(content, MODEL_NAME, template_key)
+                if ai_data is None:
+                    usage = {}
+                    prompt = self.context.build_prompt(prompt_template, content, os.path.basename(file_path), usage)
+                    print(f"    - Prompt: ~{usage['prompt_tokens']} tokens (full note ~{usage['note_tokens']} tokens)")
+                    ai_data = get_client(OLLAMA_URL).generate_json(MODEL_NAME, prompt)
+                    if ai_data is None:
+                        return
+                    cache.put(content, MODEL_NAME, template_key, ai_data)
+
+            # 1. 본문 태그 정제 및 YAML 병합 (기존 Frontmatter 가 있으면 두 번째 블록을 붙이지 않고 키를 병합)
+            #    아주 큰 노트는 변환 결과를 메모리에 만들지 않고 기록할 때 원본을 다시 읽으며 스트리밍으로
+            new_frontmatter = ai_data.get('yaml_frontmatter', '---\n---\n')
+            streamed = note_stream.is_large(os.path.getsize(file_path))
+            final_content = None if streamed else merge_frontmatter(content, new_frontmatter, clean_inline_hashtags)
+
+            # 2. 자동 이동 (원본을 고쳐 쓰지 않고 Vault 의 최종 위치에 바로 원자적으로 기록한 뒤 원본 삭제)
+            # 카테고리 이름 일원화 (ai_batch_migrate, LibrarianAgent 와 같은 정규화)
+            suggested_subfolder = standardize_folder(ai_data.get('suggested_folder', '00_Inbox'))
+
+            target_dir = os.path.join(VAULT_ROOT, suggested_subfolder)
+            # 분류 결과가 Inbox 자체면 이름을 바꾸지 않고 제자리에서 고쳐 씀 (_1 사본이 다시 감시되는 것 방지)
+            in_place = os.path.abspath(target_dir) == os.path.abspath(WATCH_DIR)
+            
+            if not os.path.exists(target_dir):
+                os.makedirs(target_dir)
+            
+            target_path = os.path.join(target_dir, os.path.basename(file_path))
+            
+            # 중복 방지 (워커끼리 같은 이름을 고르지 않도록 잠금)
+            with self._move_lock:
                 base, ext = os.path.splitext(target_path)
                 counter = 1
-                while os.path.exists(target_path):
+                while not in_place and os.path.exists(target_path):
                     target_path = f"{base}_{counter}{ext}"
                     counter += 1
                 
-                shutil.move(file_path, target_path)
-                print(f"[+] Success: {os.path.basename(file_path)} moved to {suggested_subfolder}")
-                
+                if streamed:
+                    head = note_stream.HeadSample()
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        chunks = note_stream.merge_frontmatter_stream(note_stream.iter_pieces(f), new_frontmatter)
+                        st = atomic_write(target_path, head.tee(chunks))
+                    final_content = head.text  # 색인에는 앞부분만
+                else:
+                    st = atomic_write(target_path, final_content)
+            # 새 파일이 디스크에 반영된 뒤에 원본을 지움 (중간에 죽어도 노트가 사라지지 않음)
+            fsync_dir(target_dir)
+            if in_place:
+                with self._lock:
+                    self._written[os.path.abspath(target_path)] = (st.st_size, st.st_mtime_ns)
             else:
-                print(f"[!] Ollama Error: {response.status_code}")
+                os.remove(file_path)
+
+            # 태그/링크, 전문 검색 색인 갱신 (Inbox 의 원본 항목은 제거)
+            links = get_default_index(VAULT_ROOT)
+            links.remove_note(file_path)
+            links.update_note(target_path, final_content, st)
+            links.commit()
+            search = search_index.get_default_index(VAULT_ROOT)
+            search.remove_note(file_path)
+            search.update_note(target_path, final_content, st)
+            search.commit()
+            duplicates.update_note(target_path, final_content, st)
+            duplicates.commit()
+            print(f"[+] Success: {os.path.basename(file_path)} moved to {suggested_subfolder}")
 
         except Exception as e:
             print(f"[!] Critical Error: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="00_Inbox 감시 후 AI 분류/이동")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="동시에 처리할 노트 수")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS, help="쓰기 완료 판단 대기 시간(초)")
+    args = parser.parse_args()
+
     if not os.path.exists(WATCH_DIR):
         os.makedirs(WATCH_DIR)
         
-    event_handler = NoteHandler()
+    # 중복 감지용 서명 색인을 Vault 와 맞춤 (바뀐 노트만 다시 읽음, 분류 전인 Inbox 와 숨김 폴더 제외)
+    inbox = os.path.abspath(WATCH_DIR)
+    updated, removed = near_duplicates.get_default_index(VAULT_ROOT).sync(
+        skip_dir=lambda path: os.path.basename(path).startswith('.') or os.path.abspath(path) == inbox)
+    if updated or removed:
+        print(f"[*] Duplicate index: {updated} notes updated, {removed} removed")
+
+    event_handler = NoteHandler(workers=max(1, args.workers), settle_seconds=args.settle)
+    get_client(OLLAMA_URL, max_concurrency=event_handler.workers)
+    event_handler.start()
     observer = Observer()
     observer.schedule(event_handler, WATCH_DIR, recursive=False)
     observer.start()
     
-    print(f"[*] AI Note Guard started. Watching {WATCH_DIR}...")
+    print(f"[*] AI Note Guard started. Watching {WATCH_DIR}... ({event_handler.workers} workers)")
     try:
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
         observer.stop()
     observer.join()
+    event_handler.stop()
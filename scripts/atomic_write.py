@@ -0,0 +1,143 @@
+import os
+import stat
+import uuid
+import threading
+
+# 디렉터리 fsync 를 묶어서 수행할 쓰기 횟수 (배치 경계가 따로 없을 때)
+COMMIT_EVERY = 200
+
+_OPEN_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+# 임시 이름에 넣을 원래 이름 글자 수 (한글은 UTF-8 로 3바이트: 64자 * 3 + 접두/접미 < NAME_MAX 255바이트)
+TMP_NAME_CHARS = 64
+
+def temp_path(path):
+    """
+    path 와 같은 폴더의 임시 파일 경로: .<이름 앞 TMP_NAME_CHARS 자>.<12hex>.tmp
+    ('.md' 로 끝나지 않는 숨김 이름이라 스캐너/감시자가 임시 파일을 노트로 보지 않음,
+     긴 이름도 잘라서 넣어 NAME_MAX 를 넘지 않음)
+    """
+    target_dir, name = os.path.split(path)
+    return os.path.join(target_dir, f".{name[:TMP_NAME_CHARS]}.{uuid.uuid4().hex[:12]}.tmp")
+
+def atomic_write(path, data, sync=True):
+    """
+    같은 폴더의 임시 파일에 쓴 뒤 rename 으로 교체합니다.
+    중간에 죽어도 대상 파일은 이전 내용 그대로이거나 새 내용 전체이며, 잘린 노트가 남지 않습니다.
+    sync=True 이면 rename 전에 파일 내용을 fsync 합니다. (폴더 항목의 fsync 는 AtomicWriter.commit 에서 묶어서)
+    data 는 str(UTF-8 로 인코딩) 또는 bytes, 또는 그 조각들의 iterable (스트리밍 모드: 조각마다 바로 기록).
+    기록된 파일의 os.stat 결과를 돌려줍니다.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    # 0o666 으로 만들어 umask 가 그대로 적용되므로 일반 open('w') 과 같은 권한 (기존 파일을 덮어쓰면 그 권한을 유지)
+    tmp_path = temp_path(path)
+    fd = os.open(tmp_path, _OPEN_FLAGS, 0o666)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                f.write(data)
+            else:
+                for chunk in data:
+                    f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            f.flush()
+            try:
+                os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+            except FileNotFoundError:
+                pass  # 새 파일
+            if sync:
+                os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return st
+
+def write_if_changed(path, data, sync=True):
+    """
+    대상 파일 내용이 data 와 같으면 쓰지 않습니다. (크기가 같을 때만 읽어서 비교)
+    (바뀌어서 썼는지 여부, os.stat 결과) 를 돌려줍니다.
+    """
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    try:
+        st = os.stat(path)
+        if st.st_size == len(data):
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    return False, st
+    except OSError:
+        pass
+    return True, atomic_write(path, data, sync=sync)
+
+def fsync_dir(path):
+    """폴더 항목(rename 결과)을 디스크에 반영합니다. 지원하지 않는 플랫폼에서는 무시."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class AtomicWriter:
+    """
+    atomic_write 로 쓰고, 바뀐 폴더를 모아 두었다가 commit() 에서 폴더당 한 번만 fsync 합니다.
+    (파일마다 폴더 fsync 를 하는 대신 배치 경계에서 group commit)
+    commit() 은 commit_every 번 쓸 때마다 자동으로도 호출되며, with 블록을 나갈 때도 호출됩니다.
+    sync=False 이면 fsync 없이 임시 파일 + rename 의 원자성만 보장합니다.
+    여러 스레드에서 같이 써도 안전합니다.
+    """
+    def __init__(self, sync=True, commit_every=COMMIT_EVERY):
+        self.sync = sync
+        self.commit_every = commit_every
+        self.files = 0
+        self.dir_syncs = 0
+        self._dirty_dirs = set()
+        self._since_commit = 0
+        self._lock = threading.Lock()
+
+    def write(self, path, data):
+        st = atomic_write(path, data, sync=self.sync)
+        self.mark_written(path)
+        return st
+
+    def write_if_changed(self, path, data):
+        """내용이 같으면 쓰지 않음. (바뀌어서 썼는지 여부, os.stat 결과)"""
+        changed, st = write_if_changed(path, data, sync=self.sync)
+        if changed:
+            self.mark_written(path)
+        return changed, st
+
+    def mark_written(self, path):
+        """다른 프로세스(워커)에서 atomic_write 로 쓴 파일을 commit 대상에 추가합니다."""
+        with self._lock:
+            self.files += 1
+            self._dirty_dirs.add(os.path.dirname(os.path.abspath(path)))
+            self._since_commit += 1
+            due = self._since_commit >= self.commit_every
+        if due:
+            self.commit()
+
+    def commit(self):
+        with self._lock:
+            dirs, self._dirty_dirs = self._dirty_dirs, set()
+            self._since_commit = 0
+        if not self.sync:
+            return
+        for path in sorted(dirs):
+            fsync_dir(path)
+        with self._lock:
+            self.dir_syncs += len(dirs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.commit()
@@ -0,0 +1,356 @@
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from atomic_write import AtomicWriter, temp_path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Configuration
+ATTACH_DIR = "Files"
+SOURCE_ROOT = "ref_upnote/upnote_organized"
+TARGET_ROOT = "Obsidian_Vault"
+INDEX_PATH = ".cache/attachment_index.sqlite"
+HASH_CHUNK = 1024 * 1024
+WORKERS = min(16, (os.cpu_count() or 1) * 2)   # 해시/복사는 I/O 위주라 스레드로 충분
+
+# 배치 방식: link = 하드 링크 우선 (디스크 0, 소스와 inode 공유),
+#            clone = reflink(CoW) -> copy_file_range -> 일반 복사 (Vault 쪽을 고쳐도 소스는 그대로)
+MODES = ("clone", "link")
+FICLONE = 0x40049409  # linux/fs.h: _IOW(0x94, 9, int)
+
+def normalize_name(rel_name):
+    """Files 기준 상대 이름 -> NFC + '/' 구분자 (노트 링크와 같은 형태)"""
+    return unicodedata.normalize('NFC', rel_name.replace(os.sep, '/'))
+
+def scan_attachments(root, attach_dir=ATTACH_DIR):
+    """
+    root 아래의 모든 Files 폴더에서 (경로, Files 기준 상대 이름, stat, Files 폴더가 있는 폴더)를 yield 합니다.
+    숨김 파일(.DS_Store 등)과 심볼릭 링크는 건너뜁니다.
+    """
+    stack = [(root, None, None)]
+    while stack:
+        current, rel_base, files_root = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    if rel_base is not None:
+                        stack.append((entry.path, f"{rel_base}{entry.name}/", files_root))
+                    elif entry.name == attach_dir:
+                        stack.append((entry.path, "", os.path.abspath(current)))
+                    else:
+                        stack.append((entry.path, None, None))
+                elif rel_base is not None and entry.is_file(follow_symlinks=False):
+                    yield entry.path, normalize_name(rel_base + entry.name), entry.stat(), files_root
+
+def link_table(links, note_path):
+    """
+    노트에 쓸 링크 치환표 (AttachmentStore.sync_from 의 Files 폴더별 치환표 중에서).
+    노트 폴더부터 위로 올라가며 가장 가까운 Files 폴더의 것을 고릅니다. 없으면 빈 표.
+    """
+    folder = os.path.dirname(os.path.abspath(note_path))
+    while True:
+        table = links.get(folder)
+        if table is not None:
+            return table
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return {}
+        folder = parent
+
+def file_digest(path):
+    """파일 내용 해시 (blake2b-160, HASH_CHUNK 단위로 읽어 메모리 사용량 고정)"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _clone_into(src_fd, dst_fd, size):
+    """reflink -> copy_file_range -> 일반 복사 순으로 시도하고 사용한 방법을 돌려줍니다."""
+    if fcntl is not None:
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return "reflink"
+        except OSError:
+            pass  # 다른 파일시스템이거나 reflink 미지원 (ext4 등)
+    if hasattr(os, 'copy_file_range'):
+        try:
+            remaining = size
+            while remaining > 0:
+                copied = os.copy_file_range(src_fd, dst_fd, remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+            if remaining == 0:
+                return "copy_range"
+        except OSError:
+            pass  # 커널/파일시스템 미지원 -> 처음부터 일반 복사
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        os.ftruncate(dst_fd, 0)
+    with open(src_fd, 'rb', closefd=False) as src, open(dst_fd, 'wb', closefd=False) as dst:
+        shutil.copyfileobj(src, dst, HASH_CHUNK)
+    return "copy"
+
+def place_file(src, dst, mode="clone", sync=True):
+    """
+    src 를 dst 에 둡니다. (같은 폴더의 임시 이름에 만든 뒤 rename - 잘린 첨부가 남지 않음)
+    mode='link' 이면 하드 링크를 먼저 시도하고 (다른 파일시스템이면 clone 으로),
+    clone 은 reflink -> copy_file_range -> 일반 복사 순입니다. 복사한 경우 mtime 을 소스와 맞춥니다.
+    사용한 방법('hardlink' | 'reflink' | 'copy_range' | 'copy')을 돌려줍니다.
+    """
+    tmp_path = temp_path(dst)
+    if mode == "link":
+        try:
+            os.link(src, tmp_path)
+            os.replace(tmp_path, dst)
+            return "hardlink"
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+    try:
+        st = os.stat(src)
+        src_fd = os.open(src, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            dst_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            try:
+                method = _clone_into(src_fd, dst_fd, st.st_size)
+                if sync:
+                    os.fsync(dst_fd)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return method
+
+def _suffixed(name, digest, length=8):
+    """같은 이름에 다른 내용이 이미 있을 때의 대표 이름: image.png -> image-1a2b3c4d.png"""
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-{digest[:length]}{ext}"
+
+class AttachmentStore:
+    """
+    첨부파일(Files/) 내용 해시 기반 저장소.
+    같은 내용의 첨부는 Vault 의 Files/ 에 한 번만 두고, 나머지 이름은 대표 이름을 가리키도록
+    노트 링크 치환표(Files 폴더마다 {원래 이름: 대표 이름})를 만듭니다. 해시 계산과 배치는 스레드 풀에서 병렬로.
+    SQLite 색인:
+      sources - 소스 경로별 size/mtime_ns/해시 (바뀌지 않은 파일은 다음 실행에서 다시 읽지 않음)
+      blobs   - 해시 -> Vault 안의 대표 이름 (한 번 정한 이름은 바뀌지 않아 기존 노트 링크가 유지됨)
+    """
+    def __init__(self, target_root=TARGET_ROOT, path=INDEX_PATH, mode="clone", sync=True, workers=WORKERS):
+        if mode not in MODES:
+            raise ValueError(f"unknown attachment mode: {mode}")
+        self.target_root = target_root
+        self.files_dir = os.path.join(target_root, ATTACH_DIR)
+        self.path = path
+        self.mode = mode
+        self.sync = sync
+        self.workers = max(1, workers)
+        self.links = {}
+        self.stats = Counter()
+        self.methods = Counter()
+        self._lock = threading.Lock()
+
+        index_dir = os.path.dirname(path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                digest TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL
+            );
+        """)
+        self._conn.commit()
+        self._sources = {
+            path: (size, mtime_ns, digest)
+            for path, size, mtime_ns, digest in self._conn.execute("SELECT path, size, mtime_ns, digest FROM sources")
+        }
+        self._names = dict(self._conn.execute("SELECT digest, name FROM blobs"))
+        self._taken = {name: digest for digest, name in self._names.items()}
+
+    def _digests(self, entries):
+        """경로 -> 해시. size/mtime_ns 가 그대로인 파일은 색인의 해시를 재사용합니다."""
+        digests = {}
+        stale = []
+        for path, _, st, _ in entries:
+            known = self._sources.get(path)
+            if known is not None and known[:2] == (st.st_size, st.st_mtime_ns):
+                digests[path] = known[2]
+            else:
+                stale.append((path, st))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for (path, st), digest in zip(stale, pool.map(lambda item: file_digest(item[0]), stale)):
+                digests[path] = digest
+                self._sources[path] = (st.st_size, st.st_mtime_ns, digest)
+        if stale:
+            self._conn.executemany("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)",
+                                   [(path, st.st_size, st.st_mtime_ns, digests[path]) for path, st in stale])
+            self._conn.commit()
+        self.stats["hashed"] += len(stale)
+        return digests
+
+    def _vault_path(self, name):
+        return os.path.join(self.files_dir, *name.split('/'))
+
+    def _is_free(self, name, digest):
+        """Vault 에서 name 을 digest 의 대표 이름으로 쓸 수 있는지 (다른 내용이 등록됐거나 Vault 에 이미 있으면 안 됨)"""
+        if name in self._taken:
+            return False
+        path = self._vault_path(name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return True
+        # 색인에 없는 파일 (Vault 에 직접 넣은 첨부 등): 내용이 같을 때만 그 파일을 그대로 사용
+        return self._digests([(path, name, st, None)])[path] == digest
+
+    def _canonical(self, digest, rel_name, size):
+        """해시의 대표 이름. 처음 보는 내용이면 이름을 정해 blobs 에 등록합니다."""
+        name = self._names.get(digest)
+        if name is None:
+            # 원래 이름 -> 해시 8자리 -> 전체 해시 순으로 비어 있는 이름
+            candidates = (rel_name, _suffixed(rel_name, digest), _suffixed(rel_name, digest, None))
+            name = next((candidate for candidate in candidates if self._is_free(candidate, digest)), candidates[-1])
+            self._names[digest] = name
+            self._taken[name] = digest
+            self._conn.execute("INSERT INTO blobs VALUES (?, ?, ?)", (digest, name, size))
+        return name
+
+    def _place(self, item, writer):
+        src, name = item
+        dst = self._vault_path(name)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        method = place_file(src, dst, self.mode, self.sync)
+        writer.mark_written(dst)
+        with self._lock:
+            self.methods[method] += 1
+
+    def sync_from(self, source_root=SOURCE_ROOT):
+        """
+        source_root 아래 모든 Files 폴더를 Vault 의 Files/ 로 옮기고 링크 치환표를 돌려줍니다.
+        치환표는 Files 폴더마다 따로입니다: {Files 폴더가 있는 폴더(절대 경로): {원래 이름: 대표 이름}}
+        (폴더마다 같은 이름에 다른 내용이 있을 수 있음, 노트에 쓸 표는 link_table 로 고름.
+         원래 이름 == 대표 이름인 항목은 치환표에 넣지 않음)
+        이미 Vault 에 같은 내용(해시)으로 있는 대표 파일은 다시 쓰지 않고,
+        Vault 에서 내용이 바뀐 대표 파일(직접 고친 첨부)은 덮어쓰지 않습니다.
+        """
+        start = time.time()
+        # 같은 내용이면 가장 짧은 이름이 대표가 되도록 (image.png 와 image (1).png -> image.png)
+        entries = sorted(scan_attachments(source_root), key=lambda entry: (len(entry[1]), entry[1], entry[0]))
+        digests = self._digests(entries)
+
+        tables = {}
+        seen = {}  # 원래 이름 -> 처음 본 대표 이름 (폴더마다 다른 내용인 이름 세기용)
+        placements = {}  # 해시 -> (소스 경로, 대표 이름): 이번 실행에서 Vault 에 둘 파일
+        for path, rel_name, st, files_root in entries:
+            digest = digests[path]
+            name = self._canonical(digest, rel_name, st.st_size)
+            self.stats["files"] += 1
+            self.stats["bytes"] += st.st_size
+            if digest not in placements:
+                placements[digest] = (path, name)
+                self.stats["unique"] += 1
+                self.stats["unique_bytes"] += st.st_size
+            table = tables.setdefault(files_root, {})
+            if rel_name != name:
+                table[rel_name] = name
+            if seen.setdefault(rel_name, name) != name:
+                # 다른 Files 폴더에 같은 이름, 다른 내용 -> 각 폴더의 노트는 자기 폴더의 내용으로 연결
+                self.stats["conflicts"] += 1
+        self._conn.commit()
+
+        missing = []
+        existing = []  # Vault 에 이미 있는 대표 파일: (Vault 경로, 대표 이름, stat, 해시)
+        for digest, (path, name) in placements.items():
+            try:
+                existing.append((self._vault_path(name), name, os.stat(self._vault_path(name)), digest))
+            except OSError:
+                missing.append((path, name))
+        # 크기만으로는 같은 파일인지 알 수 없으므로 해시로 비교 (바뀌지 않은 파일은 색인의 해시 재사용)
+        vault_digests = self._digests(existing)
+        for vault_path, name, _, digest in existing:
+            if vault_digests[vault_path] == digest:
+                self.stats["present"] += 1
+            else:
+                self.stats["kept"] += 1
+                print(f"[~] Kept vault edits: {vault_path}")
+
+        writer = AtomicWriter(sync=self.sync)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for _ in pool.map(lambda item: self._place(item, writer), missing):
+                pass
+        writer.commit()
+
+        self.links = tables
+        self.stats["elapsed"] += time.time() - start
+        return self.links
+
+    def report(self):
+        stats = self.stats
+        if not stats["files"]:
+            return
+        saved = stats["bytes"] - stats["unique_bytes"]
+        redirected = sum(len(table) for table in self.links.values())
+        placed = ", ".join(f"{method} {count}" for method, count in self.methods.most_common()) or "none"
+        print(f"    - Attachments: {stats['files']} files -> {stats['unique']} unique "
+              f"({saved / 1024 / 1024:.1f}MB of duplicates not stored, {redirected} links redirected)")
+        print(f"        hashed: {stats['hashed']}, already in vault: {stats['present']}, placed: {placed}, "
+              f"{stats['elapsed']:.2f}s")
+        if stats["kept"]:
+            print(f"        [~] {stats['kept']} attachments changed in the vault were not overwritten")
+        if stats["conflicts"]:
+            print(f"        [~] {stats['conflicts']} names reused with different content across Files folders (linked per folder)")
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="첨부파일(Files/)을 내용 해시로 중복 제거해 Vault 로 복사")
+    parser.add_argument("--source", default=SOURCE_ROOT, help="Files 폴더를 찾을 소스 루트")
+    parser.add_argument("--target", default=TARGET_ROOT, help="Vault 루트 (첨부는 <target>/Files 에)")
+    parser.add_argument("--mode", choices=MODES, default="clone", help="link = 하드 링크, clone = reflink/커널 복사")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="해시/복사 스레드 수")
+    parser.add_argument("--no-fsync", action="store_true", help="fsync 생략")
+    args = parser.parse_args()
+    store = AttachmentStore(args.target, mode=args.mode, sync=not args.no_fsync, workers=args.workers)
+    print(f"[*] Attachments: {args.source} -> {store.files_dir} ({args.mode})")
+    store.sync_from(args.source)
+    store.report()
+    store.close()
@@ -0,0 +1,173 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from prompt_context import ContextBuilder, estimate_tokens
+
+# Configuration
+BATCH_TOKEN_BUDGET = 3000   # 한 프롬프트에 넣을 노트 본문 추정 토큰 합 (템플릿 제외)
+MAX_BATCH = 8               # 한 번에 묶을 최대 노트 수 (응답 JSON 이 길어질수록 깨질 확률이 커짐)
+SHORT_NOTE_TOKENS = 600     # 이보다 긴 노트는 묶지 않고 단독 호출
+
+NOTE_MARKER = "=== NOTE {id} ==="
+
+BATCH_INSTRUCTIONS = """## Batch Mode
+The content below contains {count} separate notes. Each note starts with a line `=== NOTE <id> ===`.
+Analyze every note independently, exactly as described above.
+Return only a valid JSON object of the form {{"results": [...]}} with exactly one object per note,
+in the same order. Each object must contain an "id" field (the note id as a number)
+and the keys described in the output format above.
+
+"""
+
+def build_batch_prompt(prompt_template, notes):
+    """
+    여러 노트를 한 프롬프트로 묶습니다. notes: [(id, 프롬프트에 넣을 본문), ...]
+    템플릿의 {{note_content}} 자리에 배치 안내 + 노트 블록들을 넣습니다.
+    """
+    blocks = [BATCH_INSTRUCTIONS.format(count=len(notes))]
+    for note_id, text in notes:
+        blocks.append(f"{NOTE_MARKER.format(id=note_id)}\n{text}\n")
+    return prompt_template.replace("{{note_content}}", "\n".join(blocks))
+
+def parse_batch_response(data, ids):
+    """
+    배치 응답을 검증해 {id: ai_data} 로 돌려줍니다.
+    id 가 없거나 모르는 id, 중복 id, suggested_folder 가 없는 항목은 버립니다. (호출자가 단독 호출로 재시도)
+    id 가 하나도 없지만 개수가 맞으면 순서대로 대응시킵니다.
+    """
+    if not isinstance(data, dict):
+        return {}
+    items = data.get("results")
+    if not isinstance(items, list):
+        return {}
+    wanted = set(ids)
+    results = {}
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        note_id = item.get("id")
+        if note_id is None and len(items) == len(ids):
+            note_id = ids[position]
+        try:
+            note_id = int(note_id)
+        except (TypeError, ValueError):
+            continue
+        folder = item.get("suggested_folder")
+        if note_id not in wanted or note_id in results or not isinstance(folder, str) or not folder.strip():
+            continue
+        if not isinstance(item.get("yaml_frontmatter", ""), str):
+            continue
+        results[note_id] = {k: v for k, v in item.items() if k != "id"}
+    return results
+
+def plan_batches(sizes, budget=BATCH_TOKEN_BUDGET, max_batch=MAX_BATCH, short_tokens=SHORT_NOTE_TOKENS):
+    """
+    노트별 추정 토큰 수 목록을 배치(번호 목록)로 나눕니다. 입력 순서를 유지하며 앞에서부터 채웁니다.
+    short_tokens 보다 긴 노트는 혼자 한 배치입니다.
+    """
+    batches = []
+    current = []
+    used = 0
+    for i, tokens in enumerate(sizes):
+        if tokens > short_tokens:
+            batches.append([i])
+            continue
+        if current and (used + tokens > budget or len(current) >= max_batch):
+            batches.append(current)
+            current = []
+            used = 0
+        current.append(i)
+        used += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+class BatchClassifier:
+    """
+    짧은 노트 여러 개를 한 번의 LLM 호출로 분류합니다. (프롬프트 템플릿 토큰을 노트마다 다시 평가하지 않도록)
+    응답에서 빠졌거나 형식이 잘못된 노트만 단독 호출로 다시 분류하고,
+    호출 수/절약한 호출 수/노트당 시간을 report() 로 출력합니다. (여러 스레드에서 호출해도 안전)
+    """
+    def __init__(self, client, model, prompt_template, context=None, budget=BATCH_TOKEN_BUDGET,
+                 max_batch=MAX_BATCH, short_tokens=SHORT_NOTE_TOKENS):
+        self.client = client
+        self.model = model
+        self.prompt_template = prompt_template
+        self.context = context or ContextBuilder()
+        self.budget = budget
+        self.max_batch = max_batch
+        self.short_tokens = short_tokens
+        self.stats = {"notes": 0, "calls": 0, "batch_calls": 0, "batched_notes": 0,
+                      "fallback_calls": 0, "failed": 0, "elapsed": 0.0}
+        self._lock = threading.Lock()
+
+    def _count(self, **deltas):
+        with self._lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _single(self, text):
+        prompt = self.prompt_template.replace("{{note_content}}", text)
+        return self.client.generate_json(self.model, prompt)
+
+    def _run_batch(self, texts, batch):
+        """배치 1개 처리. 반환: {번호: ai_data 또는 None}"""
+        if len(batch) == 1:
+            i = batch[0]
+            self._count(calls=1)
+            return {i: self._single(texts[i])}
+
+        ids = list(range(1, len(batch) + 1))
+        prompt = build_batch_prompt(self.prompt_template, [(note_id, texts[i]) for note_id, i in zip(ids, batch)])
+        data = self.client.generate_json(self.model, prompt)
+        parsed = parse_batch_response(data, ids)
+        self._count(calls=1, batch_calls=1, batched_notes=len(parsed))
+
+        results = {}
+        for note_id, i in zip(ids, batch):
+            if note_id in parsed:
+                results[i] = parsed[note_id]
+            else:
+                # 응답에서 빠졌거나 깨진 항목만 단독 호출로
+                self._count(calls=1, fallback_calls=1)
+                results[i] = self._single(texts[i])
+        return results
+
+    def classify_many(self, notes, workers=1):
+        """
+        notes: [(content, filename), ...] -> 같은 순서의 ai_data 목록 (실패한 노트는 None)
+        workers > 1 이면 배치 여러 개를 동시에 보냅니다.
+        """
+        if not notes:
+            return []
+        start = time.time()
+        texts = [self.context.build(content, filename) for content, filename in notes]
+        batches = plan_batches([estimate_tokens(text) for text in texts], self.budget, self.max_batch, self.short_tokens)
+
+        results = [None] * len(notes)
+        if workers <= 1:
+            outcomes = (self._run_batch(texts, batch) for batch in batches)
+            for outcome in outcomes:
+                for i, ai_data in outcome.items():
+                    results[i] = ai_data
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                for outcome in pool.map(lambda batch: self._run_batch(texts, batch), batches):
+                    for i, ai_data in outcome.items():
+                        results[i] = ai_data
+        self._count(notes=len(notes), failed=sum(1 for ai_data in results if not ai_data),
+                    elapsed=time.time() - start)
+        return results
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+        if not stats["notes"]:
+            return
+        saved = stats["notes"] - stats["calls"]
+        template_tokens = estimate_tokens(self.prompt_template)
+        print(f"    - Batched LLM: {stats['calls']} calls for {stats['notes']} notes "
+              f"({saved} calls saved, ~{max(0, saved) * template_tokens} template tokens not re-sent)")
+        print(f"        batch calls: {stats['batch_calls']} ({stats['batched_notes']} notes answered in batches), "
+              f"single-note fallbacks: {stats['fallback_calls']}, failed: {stats['failed']}")
+        print(f"        wall-clock: {stats['elapsed'] / stats['notes']:.2f}s per note")
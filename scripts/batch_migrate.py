@@ -1,107 +1,210 @@
 import os
-import re
-import shutil
+import argparse
 import unicodedata
+from markdown_rewrite import rewrite_markdown, image_prefix_for_depth
+from classification_cache import content_hash, ContentHasher
+import vault_index
+from atomic_write import AtomicWriter, atomic_write
+from link_index import LinkIndex, INDEX_PATH as LINK_INDEX_FILE, extract_note, normalize_path
+from search_index import SearchIndex, INDEX_PATH as SEARCH_INDEX_FILE
+import note_stream
+from attachment_store import AttachmentStore, link_table, MODES as ATTACH_MODES
+from concurrent.futures import ProcessPoolExecutor
 
 # Configuration
 SOURCE_DIR = "ref_upnote/upnote_organized"
 TARGET_ROOT = "Obsidian_Vault"
-ALLOWED_TAGS = {
-    'raw', 'code', 'distilled', 'final', 'vp', 'family', 
-    'reference', 'checklist', 'it', 'distill', 'unreal', 'disguise'
-}
+INDEX_FILE = ".cache/batch_migrate_index.sqlite"
+
+# 첨부 링크 치환표 (워커 프로세스마다 initializer 로 한 번만 전달)
+_IMAGE_MAPS = {}
 
 def normalize_nfc(text):
     """맥의 NFD(자소분리)를 NFC(표준)로 변환합니다."""
     return unicodedata.normalize('NFC', text)
 
-def clean_inline_hashtags(content):
-    """문장 내 해시태그 정제 (허용 리스트 외 이스케이프)"""
-    pattern = r'(?<!\w)#([a-zA-Z0-9_\uAC00-\uD7A3]+)'
-    lines = content.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        if re.match(r'^#{1,6}\s', line): # 헤더 보호
-            cleaned_lines.append(line)
-            continue
-        
-        cleaned_line = re.sub(pattern, lambda m: m.group(0) if m.group(1).lower() in ALLOWED_TAGS else f"\\#{m.group(1)}", line)
-        cleaned_lines.append(cleaned_line)
-    return '\n'.join(cleaned_lines)
+def is_skipped_dir(path):
+    # 'Files' 폴더는 첨부파일 단계(AttachmentStore)에서 따로 처리
+    return 'Files' in path
+
+def plan_target(source_path):
+    """소스 경로로부터 (대상 폴더, 대상 경로, 폴더 깊이, PARA 폴더)를 계산합니다. (파일 I/O 없음)"""
+    root, file = os.path.split(source_path)
+
+    # 상대 경로 계산 (폴더 계층 구조 유지용)
+    rel_path = os.path.relpath(root, SOURCE_DIR)
+
+    # 자소 분리 해결 (NFC 변환)
+    target_subfolder = normalize_nfc(rel_path)
+    target_filename = normalize_nfc(file)
 
-def fix_image_paths(content, current_depth):
+    target_dir = os.path.join(TARGET_ROOT, target_subfolder)
+    if target_subfolder == ".":
+        target_dir = TARGET_ROOT
+    target_path = os.path.join(target_dir, target_filename)
+
+    # 현재 폴더 깊이 계산 (상대 경로 내 구분자 개수)
+    depth = 0 if rel_path == "." else rel_path.count(os.path.sep) + 1
+    para_folder = target_subfolder.split(os.sep)[0] if target_subfolder != "." else ""
+    return target_dir, target_path, depth, para_folder
+
+def migrate_file(task):
     """
-    이미지 경로를 폴더 깊이에 맞게 자동 조정합니다.
-    Files/image.png -> ../Files/image.png (depth 1)
-                   -> ../../Files/image.png (depth 2)
+    파일 1개 변환 (프로세스 풀 워커에서 실행).
+    task: (source_path, target_path, depth, collect_tags, sync, index_links, index_text, stream_threshold)
+    반환: (source_path, error, content_hash, tags, indexed) - 성공 시 error는 None
+      indexed: (태그/링크 추출 결과 또는 None, 기록된 파일의 stat, 검색 색인용 본문 또는 None)
+               - 색인 쓰기는 메인 프로세스에서
+    stream_threshold 보다 큰 노트는 통째로 읽지 않고 줄 단위로 변환하며 바로 임시 파일에 씁니다.
+    (색인에는 앞부분만)
     """
-    # depth 만큼 ../ 추가
-    prefix = "../" * current_depth
-    # ![caption](Files/...) 패턴 찾기
-    pattern = r'!\[(.*?)\]\(Files/(.*?)\)'
-    replacement = f'![\\1]({prefix}Files/\\2)'
-    
-    return re.sub(pattern, replacement, content)
+    source_path, target_path, depth, collect_tags, sync, index_links, index_text, stream_threshold = task
+    try:
+        # 정제 및 변환 (해시태그 + 이미지 경로를 한 번의 스캔으로)
+        # Files/image.png -> ../Files/image.png (depth 1)
+        #                -> ../../Files/image.png (depth 2)
+        found_tags = set() if collect_tags else None
+        options = dict(image_prefix=image_prefix_for_depth(depth), found_tags=found_tags,
+                       image_map=link_table(_IMAGE_MAPS, source_path))
+
+        if note_stream.is_large(os.path.getsize(source_path), stream_threshold):
+            hasher = ContentHasher()
+            head = note_stream.HeadSample()
+            with open(source_path, 'r', encoding='utf-8') as f:
+                pieces = note_stream.observe(note_stream.iter_pieces(f), hasher.update)
+                st = atomic_write(target_path, head.tee(note_stream.rewrite_stream(pieces, **options)), sync=sync)
+            cleaned = head.text
+            digest = hasher.hexdigest() if collect_tags else None
+        else:
+            with open(source_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            cleaned = rewrite_markdown(content, **options)
+            # 파일 저장 (임시 파일 + rename, 폴더 fsync 는 메인 프로세스에서 묶어서)
+            st = atomic_write(target_path, cleaned, sync=sync)
+            digest = content_hash(content) if collect_tags else None
+
+        extracted = None
+        if index_links:
+            extracted = extract_note(cleaned, normalize_path(os.path.relpath(target_path, TARGET_ROOT)))
+        indexed = (extracted, st, cleaned if index_text else None)
+        return source_path, None, digest, found_tags, indexed
+    except Exception as e:
+        return source_path, str(e), None, None, None
+
+def _init_worker(image_maps):
+    global _IMAGE_MAPS
+    _IMAGE_MAPS = image_maps
 
-def migrate():
+def iter_migrated(tasks, jobs=1, image_maps=None):
+    """
+    migrate_file 결과를 yield. jobs > 1 이면 프로세스 풀에 청크 단위로 분배합니다.
+    image_maps: Files 폴더별 첨부 링크 치환표 (AttachmentStore.sync_from)
+    """
+    _init_worker(image_maps or {})
+    if jobs <= 1:
+        for task in tasks:
+            yield migrate_file(task)
+        return
+
+    # 워커당 여러 청크가 돌아가도록 나눠 부하를 고르게 분산
+    chunksize = max(1, min(256, len(tasks) // (jobs * 8)))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(image_maps or {},)) as pool:
+        yield from pool.map(migrate_file, tasks, chunksize=chunksize)
+
+def migrate(incremental=False, jobs=1, sync=True, link_index=True, search_index=True, attachments=True,
+            attach_mode="clone", stream_threshold=note_stream.STREAM_THRESHOLD):
     print(f"[*] Starting Batch Migration: {SOURCE_DIR} -> {TARGET_ROOT}")
+    if jobs > 1:
+        print(f"[*] Parallel mode: {jobs} processes.")
     
     # 1. 대상 루트 폴더가 없으면 생성
     if not os.path.exists(TARGET_ROOT):
         os.makedirs(TARGET_ROOT)
 
+    # 첨부파일: 같은 내용은 Files/ 에 한 번만 (하드 링크/reflink), 노트 링크는 대표 이름으로 치환
+    store = None
+    image_maps = {}
+    if attachments:
+        store = AttachmentStore(TARGET_ROOT, mode=attach_mode, sync=sync, workers=max(jobs * 2, 4))
+        image_maps = store.sync_from(SOURCE_DIR)
+
+    # 증분 모드: 지난 실행 이후 inode/size/mtime 이 바뀐 파일만 처리
+    index = vault_index.VaultIndex(INDEX_FILE) if incremental else None
+    source_stats = {}
+    plans = {}
+    tasks = []
+    unchanged = 0
+    for source_path, st in vault_index.scan_markdown(SOURCE_DIR, skip_dir=is_skipped_dir):
+        source_stats[source_path] = st
+        if index is not None and not index.is_changed(source_path, st):
+            unchanged += 1
+            continue
+        plans[source_path] = plan_target(source_path)
+        _, target_path, depth, _ = plans[source_path]
+        tasks.append((source_path, target_path, depth, index is not None, sync, link_index, search_index,
+                      stream_threshold))
+
+    # 2. 대상 폴더는 파일마다가 아니라 한 번에 생성
+    for target_dir in {plan[0] for plan in plans.values()}:
+        os.makedirs(target_dir, exist_ok=True)
+
+    writer = AtomicWriter(sync=sync)
+    links = LinkIndex(LINK_INDEX_FILE, TARGET_ROOT) if link_index else None
+    search = SearchIndex(SEARCH_INDEX_FILE, TARGET_ROOT) if search_index else None
     count = 0
-    for root, dirs, files in os.walk(SOURCE_DIR):
-        # 'Files' 폴더 자체는 이미 복사했으므로 건너뜀
-        if 'Files' in root:
+    errors = []
+    for source_path, error, digest, found_tags, indexed in iter_migrated(tasks, jobs, image_maps):
+        if error is not None:
+            errors.append((source_path, error))
+            print(f"[!] Error processing {os.path.basename(source_path)}: {error}")
             continue
-            
-        for file in files:
-            if not file.endswith('.md'):
-                continue
-            
-            source_path = os.path.join(root, file)
-            
-            # 상대 경로 계산 (폴더 계층 구조 유지용)
-            rel_path = os.path.relpath(root, SOURCE_DIR)
-            
-            # 자소 분리 해결 (NFC 변환)
-            target_subfolder = normalize_nfc(rel_path)
-            target_filename = normalize_nfc(file)
-            
-            target_dir = os.path.join(TARGET_ROOT, target_subfolder)
-            if target_subfolder == ".": 
-                target_dir = TARGET_ROOT
-
-            if not os.path.exists(target_dir):
-                os.makedirs(target_dir, exist_ok=True)
-            
-            target_path = os.path.join(target_dir, target_filename)
-            
-            # 현재 폴더 깊이 계산 (상대 경로 내 구분자 개수)
-            depth = 0 if rel_path == "." else rel_path.count(os.path.sep) + 1
-            
-            try:
-                with open(source_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # 정제 및 변환
-                content = clean_inline_hashtags(content)
-                content = fix_image_paths(content, depth)
-                
-                # 파일 저장
-                with open(target_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                count += 1
-                if count % 20 == 0:
-                    print(f"[*] Processed {count} files...")
-                    
-            except Exception as e:
-                print(f"[!] Error processing {file}: {e}")
 
+        _, target_path, _, para_folder = plans[source_path]
+        writer.mark_written(target_path)
+        extracted, st, text = indexed
+        if links is not None:
+            links.update_note(target_path, st=st, extracted=extracted)
+        if search is not None:
+            search.update_note(target_path, text, st)
+        if index is not None:
+            index.update(source_path, source_stats[source_path], content_hash=digest, tags=found_tags,
+                         para_folder=para_folder, target=target_path)
+
+        count += 1
+        if count % 20 == 0:
+            print(f"[*] Processed {count} files...")
+
+    writer.commit()
+    if links is not None:
+        links.close()
+    if search is not None:
+        search.close()
+    if index is not None:
+        removed = index.prune(source_stats)
+        index.close()
+        print(f"[*] Incremental: {unchanged} unchanged files skipped, {len(removed)} removed since last scan.")
+
+    if errors:
+        print(f"[!] {len(errors)} files failed.")
     print(f"[+] Migration Complete! Total {count} files processed.")
+    if store is not None:
+        store.report()
+        store.close()
 
 if __name__ == "__main__":
-    migrate()
+    parser = argparse.ArgumentParser(description="UpNote 정리본 -> Obsidian_Vault 일괄 마이그레이션")
+    parser.add_argument("--incremental", action="store_true", help="지난 실행 이후 바뀐 파일만 처리 (vault 색인 사용)")
+    parser.add_argument("--jobs", type=int, default=1, help="병렬 처리 프로세스 수 (0 = CPU 코어 수)")
+    parser.add_argument("--no-fsync", action="store_true", help="fsync 생략 (원자적 교체만 보장, 전원 차단 시 유실 가능)")
+    parser.add_argument("--no-link-index", action="store_true", help="태그/링크 색인을 갱신하지 않음")
+    parser.add_argument("--no-search-index", action="store_true", help="전문 검색 색인을 갱신하지 않음")
+    parser.add_argument("--no-attachments", action="store_true", help="Files/ 첨부파일을 복사하지 않음 (링크 치환도 생략)")
+    parser.add_argument("--attach-mode", choices=ATTACH_MODES, default="clone",
+                        help="첨부 배치 방식: link = 하드 링크, clone = reflink/커널 복사")
+    parser.add_argument("--stream-mb", type=float, default=note_stream.STREAM_THRESHOLD / (1024 * 1024),
+                        help="이보다 큰 노트(MB)는 메모리에 올리지 않고 스트리밍으로 변환 (0 = 항상 스트리밍)")
+    args = parser.parse_args()
+    migrate(incremental=args.incremental, jobs=args.jobs if args.jobs > 0 else (os.cpu_count() or 1),
+            sync=not args.no_fsync, link_index=not args.no_link_index,
+            search_index=not args.no_search_index, attachments=not args.no_attachments,
+            attach_mode=args.attach_mode, stream_threshold=int(args.stream_mb * 1024 * 1024))
@@ -0,0 +1,84 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+from atomic_write import AtomicWriter, atomic_write, fsync_dir
+
+# --- 비교 기준: 제자리 덮어쓰기 + 파일마다 fsync ---
+
+def naive_fsync_write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    # 새로 만든 파일은 폴더 항목까지 fsync 해야 전원 차단 후에도 남음
+    fsync_dir(os.path.dirname(path))
+
+def make_targets(root, files, folders):
+    paths = []
+    for i in range(files):
+        folder = os.path.join(root, f"folder_{i % folders:02d}")
+        os.makedirs(folder, exist_ok=True)
+        paths.append(os.path.join(folder, f"note_{i:05d}.md"))
+    return paths
+
+def run_case(name, write_batch, paths, data):
+    start = time.perf_counter()
+    write_batch(paths, data)
+    elapsed = time.perf_counter() - start
+    rate = len(paths) / elapsed
+    print(f"{name:<28} | {elapsed:>8.2f}s | {rate:>10.0f} files/s")
+    return rate
+
+def run(files, folders, size_kb, root):
+    data = (("본문 내용 #태그 ![img](Files/a.png)\n" * 64).encode('utf-8') * size_kb)[:size_kb * 1024]
+    print(f"[*] {files} files x {size_kb}KB in {folders} folders under {root}")
+    print(f"{'mode':<28} | {'time':>9} | {'throughput':>16}")
+
+    def naive(paths, data):
+        for path in paths:
+            naive_fsync_write(path, data)
+
+    def atomic_per_file(paths, data):
+        for path in paths:
+            atomic_write(path, data)
+            fsync_dir(os.path.dirname(path))
+
+    def atomic_group(paths, data):
+        with AtomicWriter() as writer:
+            for path in paths:
+                writer.write(path, data)
+
+    def atomic_no_fsync(paths, data):
+        with AtomicWriter(sync=False) as writer:
+            for path in paths:
+                writer.write(path, data)
+
+    cases = [
+        ("naive (in place + fsync)", naive),
+        ("atomic + per-file dir fsync", atomic_per_file),
+        ("atomic + group commit", atomic_group),
+        ("atomic, no fsync", atomic_no_fsync),
+    ]
+    rates = {}
+    for name, write_batch in cases:
+        case_root = os.path.join(root, name.split()[0] + str(len(rates)))
+        paths = make_targets(case_root, files, folders)
+        rates[name] = run_case(name, write_batch, paths, data)
+        shutil.rmtree(case_root)
+    baseline = rates[cases[0][0]]
+    print(f"[+] group commit vs naive: {rates['atomic + group commit'] / baseline:.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="원자적 쓰기(임시 파일 + rename) 처리량 벤치마크")
+    parser.add_argument("--files", type=int, default=2000, help="쓸 노트 수")
+    parser.add_argument("--folders", type=int, default=20, help="노트를 나눠 담을 폴더 수")
+    parser.add_argument("--size-kb", type=int, default=4, help="노트 1개 크기 (KB)")
+    parser.add_argument("--dir", default=None, help="벤치마크 폴더 (Vault 와 같은 디스크를 권장, 기본: 임시 폴더)")
+    args = parser.parse_args()
+    root = tempfile.mkdtemp(prefix="bench_atomic_", dir=args.dir)
+    try:
+        run(args.files, args.folders, args.size_kb, root)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,77 @@
+import re
+import time
+import random
+import argparse
+from markdown_rewrite import ALLOWED_TAGS, rewrite_markdown
+
+# --- 비교 기준: 엔진 도입 전의 줄 단위 구현 (각 스크립트에 복사되어 있던 것) ---
+
+def legacy_clean_inline_hashtags(content):
+    pattern = r'(?<!\w)#([a-zA-Z0-9_가-힣]+)'
+    lines = content.split('\n')
+    cleaned_lines = []
+    for line in lines:
+        if re.match(r'^#{1,6}\s', line):
+            cleaned_lines.append(line)
+            continue
+        cleaned_line = re.sub(pattern, lambda m: m.group(0) if m.group(1).lower() in ALLOWED_TAGS else f"\\#{m.group(1)}", line)
+        cleaned_lines.append(cleaned_line)
+    return '\n'.join(cleaned_lines)
+
+def legacy_fix_image_paths(content, depth):
+    prefix = "../" * depth
+    pattern = r'!\[(.*?)\]\(Files/(.*?)\)'
+    replacement = f'![\\1]({prefix}Files/\\2)'
+    return re.sub(pattern, replacement, content)
+
+# --- 합성 노트 ---
+
+SAMPLE_LINES = [
+    "# 회의록 {n}",
+    "오늘 회의에서 #프로젝트{n} 관련 논의를 했습니다. #raw",
+    "- 참고: [문서](https://example.com/docs#section{n})",
+    "![스크린샷](Files/image_{n}.png)",
+    "일반 텍스트 줄입니다. 해시태그 없이 길게 이어지는 문장 {n} " * 2,
+    "`#inline` 코드와 #태그{n} 가 섞인 줄",
+    "```python",
+    "# 코드 블록 안의 주석 #{n}",
+    "print('hello')",
+    "```",
+    "",
+]
+
+def make_note(size_bytes, seed=0):
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    n = 0
+    while total < size_bytes:
+        line = rng.choice(SAMPLE_LINES).format(n=n)
+        parts.append(line)
+        total += len(line.encode('utf-8')) + 1
+        n += 1
+    return '\n'.join(parts)
+
+def measure(func, content, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def run(sizes_kb, repeat):
+    print(f"{'size':>8} | {'legacy MB/s':>12} | {'engine MB/s':>12} | speedup")
+    for size_kb in sizes_kb:
+        content = make_note(size_kb * 1024)
+        mb = len(content.encode('utf-8')) / (1024 * 1024)
+        legacy = measure(lambda c: legacy_fix_image_paths(legacy_clean_inline_hashtags(c), 2), content, repeat)
+        engine = measure(lambda c: rewrite_markdown(c, ALLOWED_TAGS, "../../"), content, repeat)
+        print(f"{size_kb:>6}KB | {mb / legacy:>12.1f} | {mb / engine:>12.1f} | {legacy / engine:.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="해시태그/이미지 경로 재작성 마이크로 벤치마크")
+    parser.add_argument("--sizes", default="16,256,4096", help="노트 크기 목록 (KB, 쉼표 구분)")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run([int(s) for s in args.sizes.split(',')], args.repeat)
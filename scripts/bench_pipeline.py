@@ -0,0 +1,520 @@
+import os
+import re
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import unicodedata
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Configuration
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SCRIPTS_DIR = os.path.join(REPO_ROOT, "scripts")
+LEGACY_DIR = os.path.join(REPO_ROOT, "docs", "archive", "legacy")  # src.agents 패키지가 있는 곳 (PYTHONPATH 로 그대로 실행)
+RESULTS_FILE = ".cache/bench_results.jsonl"
+FAKE_HOST = "127.0.0.1"
+FAKE_PORT = 11434          # 스크립트들의 OLLAMA_URL 이 고정이라 같은 포트를 씀 (실제 Ollama 는 꺼 둘 것)
+EMBED_DIM = 64
+STEP_TIMEOUT = 1800
+
+# 마이그레이션 스크립트들이 보는 작업 폴더 기준 경로
+ORGANIZED_DIR = "ref_upnote/upnote_organized"     # batch_migrate.SOURCE_DIR
+EXPORT_DIR = "ref_upnote/upnote_export_260213"    # ai_batch_migrate.SOURCE_ROOT
+INBOX_DIR = "00_Inbox"                            # legacy lead 의 Inbox
+VAULT_DIR = "Obsidian_Vault"
+
+# 저장소에 프롬프트 파일이 없을 때 쓰는 템플릿 (가짜 서버는 내용을 보지 않고 주제어만 찾음)
+BENCH_PROMPT = """Analyze the note below and answer with a JSON object containing
+"suggested_folder" (PARA folder) and "yaml_frontmatter" (YAML block with title and tags).
+
+{{note_content}}
+"""
+
+# 주제어 -> 가짜 Ollama 가 돌려줄 폴더 (노트 본문 첫 줄에 하나씩 들어감)
+TOPICS = {
+    "DS15": "01_Projects/DS15",
+    "회의록": "01_Projects/Meetings",
+    "가족여행": "02_Areas/Family",
+    "건강검진": "02_Areas/Health",
+    "언리얼": "03_Resources/Unreal",
+    "파이썬": "03_Resources/Python",
+    "레시피": "03_Resources/Cooking",
+    "지난프로젝트": "04_Archives/Old",
+}
+NOTEBOOKS = ["", "01_Projects", "02_Areas/가족", "03_Resources/개발", "03_Resources/개발/언리얼", "04_Archives"]
+WORDS = ["오늘", "정리", "메모", "작업", "확인", "다음", "문서", "결과", "설정", "버그", "배포", "테스트",
+         "note", "update", "build", "render", "shader", "config", "release", "draft"]
+TAGS = ["raw", "code", "reference", "작업", "아이디어", "todo", "버그", "회고", "it", "unreal"]
+
+# --- 합성 UpNote export ---
+
+def _sentence(rng, config, images):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 16))]
+    if rng.random() < config["tag_density"]:
+        words.insert(rng.randrange(len(words) + 1), f"#{rng.choice(TAGS)}")
+    if images and rng.random() < config["image_density"]:
+        words.append(f"![이미지](Files/{rng.choice(images)})")
+    return " ".join(words)
+
+def _note_body(rng, config, topic, size_bytes, images):
+    lines = [f"# {topic} {rng.choice(WORDS)}", "", f"주제: {topic}", ""]
+    total = sum(len(line.encode('utf-8')) + 1 for line in lines)
+    while total < size_bytes:
+        roll = rng.random()
+        if roll < 0.03:
+            block = ["```python", f"# {rng.choice(WORDS)} #{rng.choice(TAGS)}", "print('hello')", "```"]
+        elif roll < 0.08:
+            block = [f"## {rng.choice(WORDS)} {rng.choice(WORDS)}"]
+        elif roll < 0.12:
+            block = [f"- 링크: [[{rng.choice(WORDS)} {rng.randint(1, 50)}]] https://example.com/docs#{rng.choice(WORDS)}"]
+        else:
+            block = [_sentence(rng, config, images)]
+        lines.extend(block)
+        total += sum(len(line.encode('utf-8')) + 1 for line in block)
+    return "\n".join(lines) + "\n"
+
+def _note_size(rng, config):
+    """로그정규 분포 (중앙값 size_kb, 긴 꼬리), max_kb 에서 자름"""
+    kb = config["size_kb"] * math.exp(rng.gauss(0, config["size_sigma"]))
+    return int(min(kb, config["max_kb"]) * 1024)
+
+def _title(rng, config, topic, i):
+    if rng.random() < config["korean_ratio"]:
+        name = f"{topic} {rng.choice(['메모', '정리', '기록', '회의'])} {i:05d}"
+    else:
+        name = f"note {i:05d} {rng.choice(WORDS)}"
+    if rng.random() < config["nfd_ratio"]:
+        name = unicodedata.normalize('NFD', name)  # 맥에서 내보낸 자소 분리 파일명
+    return name
+
+def make_vault(root, config):
+    """
+    root 아래에 UpNote export 형태의 합성 노트를 만듭니다. (config: DEFAULT_CONFIG 와 같은 키)
+      ref_upnote/upnote_organized/<노트북>/<제목>.md  + Files/ (batch_migrate 용)
+      ref_upnote/upnote_export_260213/...               (ai_batch_migrate 용 사본)
+    반환: 생성 통계 dict
+    """
+    rng = random.Random(config["seed"])
+    source = os.path.join(root, ORGANIZED_DIR)
+    files_dir = os.path.join(source, "Files")
+    os.makedirs(files_dir, exist_ok=True)
+
+    # 첨부: 고유 이미지 + 같은 내용의 다른 이름 사본 (UpNote 의 image (1).png)
+    images = []
+    for i in range(config["images"]):
+        data = rng.randbytes(rng.randint(8, 64) * 1024)
+        name = f"image_{i:04d}.png"
+        with open(os.path.join(files_dir, name), 'wb') as f:
+            f.write(data)
+        images.append(name)
+        if rng.random() < config["dup_ratio"]:
+            copy = f"image_{i:04d} (1).png"
+            with open(os.path.join(files_dir, copy), 'wb') as f:
+                f.write(data)
+            images.append(copy)
+
+    notes = []
+    total_bytes = 0
+    topics = list(TOPICS)
+    for i in range(config["notes"]):
+        kind = "unique"
+        if notes and rng.random() < config["dup_ratio"]:
+            kind, (_, body) = "duplicate", rng.choice(notes)
+        elif notes and rng.random() < config["near_dup_ratio"]:
+            _, body = rng.choice(notes)
+            kind, body = "near_duplicate", body + f"\n추가 메모 {i}\n"
+        else:
+            topic = rng.choice(topics)
+            body = _note_body(rng, config, topic, _note_size(rng, config), images)
+        topic = body.split("주제: ", 1)[1].split("\n", 1)[0] if "주제: " in body else rng.choice(topics)
+        folder = os.path.join(source, rng.choice(NOTEBOOKS))
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, _title(rng, config, topic, i) + ".md")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(body)
+        notes.append((path, body))
+        total_bytes += len(body.encode('utf-8'))
+        config.setdefault("_kinds", {}).setdefault(kind, 0)
+        config["_kinds"][kind] += 1
+
+    shutil.copytree(source, os.path.join(root, EXPORT_DIR))
+    kinds = config.pop("_kinds", {})
+    return {"notes": len(notes), "bytes": total_bytes, "attachments": len(images), **kinds}
+
+def reset_inbox(root):
+    """legacy lead 용 Inbox: 합성 노트를 평평하게 복사 (같은 이름은 번호를 붙여)"""
+    inbox = os.path.join(root, INBOX_DIR)
+    shutil.rmtree(inbox, ignore_errors=True)
+    os.makedirs(inbox)
+    source = os.path.join(root, ORGANIZED_DIR)
+    count = 0
+    for current, dirs, files in os.walk(source):
+        dirs[:] = [d for d in dirs if d != "Files"]
+        for name in files:
+            if name.endswith('.md'):
+                shutil.copyfile(os.path.join(current, name), os.path.join(inbox, f"{count:05d}_{name}"))
+                count += 1
+    return count
+
+# --- 가짜 Ollama ---
+
+def _folder_for(text):
+    for topic, folder in TOPICS.items():
+        if topic in text:
+            return folder
+    return "03_Resources/Misc"
+
+def _answer(text):
+    folder = _folder_for(text)
+    tag = folder.rsplit('/', 1)[-1].lower()
+    return {"suggested_folder": folder, "yaml_frontmatter": f"---\ntags: [{tag}]\ncreated: 2026-01-01\n---"}
+
+def _embedding(text):
+    """단어 해시 기반 결정적 벡터 (비슷한 글이면 비슷한 벡터)"""
+    vector = [0.0] * EMBED_DIM
+    for word in re.findall(r"\w+", text.lower()):
+        vector[hashlib.blake2b(word.encode('utf-8'), digest_size=2).digest()[0] % EMBED_DIM] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+class _QuietServer(ThreadingHTTPServer):
+    # 클라이언트가 done 을 받은 뒤 연결을 끊는 것은 정상 (traceback 을 찍지 않음)
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+class FakeOllama:
+    """
+    /api/generate (단일/배치 프롬프트, stream 포함) 와 /api/embed 를 흉내 내는 로컬 서버.
+    요청마다 latency(+jitter) 초를 기다린 뒤 주제어로 정한 폴더를 돌려주고 호출 수를 셉니다.
+    """
+    def __init__(self, latency=0.05, jitter=0.0, host=FAKE_HOST, port=FAKE_PORT):
+        self.latency = latency
+        self.jitter = jitter
+        self.counts = {"generate": 0, "batch": 0, "embed": 0}
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+                fake._wait()
+                if self.path.endswith("/api/embed"):
+                    fake._count("embed")
+                    texts = body.get("input") or []
+                    self._send_json({"embeddings": [_embedding(text) for text in texts]})
+                    return
+                prompt = body.get("prompt", "")
+                blocks = re.split(r"=== NOTE (\d+) ===", prompt)
+                if len(blocks) > 1:
+                    fake._count("batch")
+                    results = [{"id": int(blocks[i]), **_answer(blocks[i + 1])} for i in range(1, len(blocks), 2)]
+                    response = json.dumps({"results": results}, ensure_ascii=False)
+                else:
+                    fake._count("generate")
+                    response = json.dumps(_answer(prompt), ensure_ascii=False)
+                try:
+                    if body.get("stream"):
+                        self._send_stream(response)
+                    else:
+                        self._send_json({"response": response, "done": True})
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 클라이언트가 done 을 받은 뒤 바로 끊음
+
+            def _send_json(self, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, response):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                parts = [response[i:i + 32] for i in range(0, len(response), 32)]
+                for part, done in [(part, False) for part in parts] + [("", True)]:
+                    line = (json.dumps({"response": part, "done": done}, ensure_ascii=False) + "\n").encode('utf-8')
+                    self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+        self.server = _QuietServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _wait(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+# --- 실행 단계 ---
+
+def prepare_workspace(root):
+    """작업 폴더에 프롬프트를 준비합니다. (스크립트와 legacy 에이전트는 저장소 위치에서 그대로 실행)"""
+    prompt_dir = os.path.join(root, "prompts")
+    os.makedirs(prompt_dir, exist_ok=True)
+    prompt_src = os.path.join(REPO_ROOT, "prompts", "summarize_note.md")
+    if os.path.exists(prompt_src):
+        shutil.copyfile(prompt_src, os.path.join(prompt_dir, "summarize_note.md"))
+    else:
+        with open(os.path.join(prompt_dir, "summarize_note.md"), 'w', encoding='utf-8') as f:
+            f.write(BENCH_PROMPT)
+
+def reset_outputs(root):
+    """이전 단계의 Vault, 색인/캐시/체크포인트, 로그를 지움 (각 단계를 같은 조건에서 시작)"""
+    for name in (VAULT_DIR, ".cache", "logs"):
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+def build_steps(args):
+    """(이름, 명령, 시작 전 초기화 여부, 처리 노트 수 기준) 목록"""
+    py = sys.executable
+    script = lambda name: os.path.join(SCRIPTS_DIR, name)
+    fsync = [] if args.fsync else ["--no-fsync"]
+    jobs = ["--jobs", str(args.jobs)]
+    ai = ["--limit", "0", "--workers", str(args.workers)] + fsync
+    return [
+        ("batch_migrate", [py, script("batch_migrate.py"), "--incremental"] + jobs + fsync, True),
+        ("batch_migrate_noop", [py, script("batch_migrate.py"), "--incremental"] + jobs + fsync, False),
+        ("clean_tags", [py, script("clean_tags_advanced.py"), VAULT_DIR] + jobs + fsync, False),
+        ("ai_batch", [py, script("ai_batch_migrate.py")] + ai, True),
+        ("ai_batch_resume", [py, script("ai_batch_migrate.py")] + ai, False),
+        ("ai_batch_batched", [py, script("ai_batch_migrate.py"), "--batch"] + ai, True),
+        ("ai_batch_knn", [py, script("ai_batch_migrate.py"), "--knn", "tfidf"] + ai, "keep_vault"),
+        ("lead", [py, "-m", "src.agents.lead", "--limit", "0"], True),
+    ]
+
+def run_command(command, cwd, log_path, timeout):
+    """명령을 실행하고 (종료 코드, 경과 초, 최대 RSS MB 또는 None) 를 돌려줍니다. 출력은 log_path 로."""
+    # legacy 에이전트는 복사/링크 없이 docs/archive/legacy 에서 import (경로 문제를 그대로 드러내도록)
+    pythonpath = os.pathsep.join(filter(None, [LEGACY_DIR, os.environ.get("PYTHONPATH")]))
+    env = dict(os.environ, PYTHONIOENCODING="utf-8", PYTHONPATH=pythonpath)
+    with open(log_path, 'wb') as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(command, cwd=cwd, stdout=log, stderr=subprocess.STDOUT, env=env)
+        if hasattr(os, 'wait4'):
+            deadline = start + timeout
+            while True:
+                pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+                if pid:
+                    break
+                if time.perf_counter() > deadline:
+                    proc.kill()
+                    _, status, usage = os.wait4(proc.pid, 0)
+                    break
+                time.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss: Linux 는 KB, macOS 는 바이트
+            scale = 1 if sys.platform == "darwin" else 1024
+            return proc.returncode, elapsed, round(usage.ru_maxrss * scale / (1024 * 1024), 1)
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        return proc.returncode, time.perf_counter() - start, None
+
+def _tail(path, lines=8):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return "".join(f.readlines()[-lines:])
+
+def run_steps(root, steps, fake, notes, timeout):
+    results = {}
+    log_dir = os.path.join(root, "bench_logs")
+    os.makedirs(log_dir, exist_ok=True)
+    for name, command, reset in steps:
+        if reset:
+            if reset is True:
+                reset_outputs(root)
+            else:
+                # 이전 단계가 만든 Vault 를 k-NN 학습 자료로 두고 체크포인트/캐시만 지움
+                shutil.rmtree(os.path.join(root, ".cache"), ignore_errors=True)
+        if name == "lead":
+            reset_inbox(root)
+        before = fake.snapshot() if fake is not None else {}
+        code, elapsed, rss = run_command(command, root, os.path.join(log_dir, f"{name}.log"), timeout)
+        after = fake.snapshot() if fake is not None else {}
+        calls = {key: after[key] - before.get(key, 0) for key in after}
+        results[name] = {
+            "seconds": round(elapsed, 3),
+            "notes_per_s": round(notes / elapsed, 1) if elapsed > 0 else None,
+            "max_rss_mb": rss,
+            "llm_calls": calls.get("generate", 0) + calls.get("batch", 0),
+            "batch_calls": calls.get("batch", 0),
+            "embed_calls": calls.get("embed", 0),
+            "returncode": code,
+        }
+        status = "ok" if code == 0 else f"FAILED ({code})"
+        print(f"{name:<20} | {elapsed:>8.2f}s | {results[name]['notes_per_s'] or 0:>9.1f} notes/s | "
+              f"{rss if rss is not None else '-':>7} MB | {results[name]['llm_calls']:>6} LLM | {status}")
+        if code != 0:
+            print(_tail(os.path.join(log_dir, f"{name}.log")))
+    return results
+
+# --- 결과 기록 ---
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                text=True, timeout=30).stdout.strip() or None
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                                    capture_output=True, text=True, timeout=60).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+
+def previous_record(path, config):
+    """같은 설정으로 기록된 마지막 결과 (없으면 None)"""
+    if not os.path.exists(path):
+        return None
+    found = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("config") == config:
+                found = record
+    return found
+
+def compare(record, previous):
+    if previous is None:
+        return
+    print(f"\n[=] vs {previous.get('commit') or '?'} ({previous.get('timestamp')}):")
+    for name, result in record["steps"].items():
+        old = previous.get("steps", {}).get(name)
+        if not old or not old.get("seconds") or result["returncode"] != 0:
+            continue
+        change = (result["seconds"] - old["seconds"]) / old["seconds"] * 100
+        marker = "[!]" if change > 10 else "   "
+        print(f"    {marker} {name:<20} {old['seconds']:>8.2f}s -> {result['seconds']:>8.2f}s ({change:+.1f}%)")
+
+DEFAULT_CONFIG = {
+    "notes": 500,
+    "size_kb": 3.0,
+    "size_sigma": 1.0,
+    "max_kb": 512,
+    "korean_ratio": 0.7,
+    "nfd_ratio": 0.3,
+    "tag_density": 0.3,
+    "image_density": 0.1,
+    "images": 50,
+    "dup_ratio": 0.1,
+    "near_dup_ratio": 0.05,
+    "seed": 1,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="합성 UpNote export 로 마이그레이션 파이프라인 전체를 측정 (가짜 Ollama 사용)")
+    parser.add_argument("--notes", type=int, default=DEFAULT_CONFIG["notes"], help="생성할 노트 수")
+    parser.add_argument("--size-kb", type=float, default=DEFAULT_CONFIG["size_kb"], help="노트 크기 중앙값 (KB, 로그정규 분포)")
+    parser.add_argument("--size-sigma", type=float, default=DEFAULT_CONFIG["size_sigma"], help="노트 크기 분포의 폭 (0 = 모두 같은 크기)")
+    parser.add_argument("--max-kb", type=float, default=DEFAULT_CONFIG["max_kb"], help="노트 크기 상한 (KB)")
+    parser.add_argument("--korean-ratio", type=float, default=DEFAULT_CONFIG["korean_ratio"], help="한글 제목 비율")
+    parser.add_argument("--nfd-ratio", type=float, default=DEFAULT_CONFIG["nfd_ratio"], help="NFD(자소 분리) 파일명 비율")
+    parser.add_argument("--tag-density", type=float, default=DEFAULT_CONFIG["tag_density"], help="해시태그가 들어가는 줄 비율")
+    parser.add_argument("--image-density", type=float, default=DEFAULT_CONFIG["image_density"], help="이미지 링크가 들어가는 줄 비율")
+    parser.add_argument("--images", type=int, default=DEFAULT_CONFIG["images"], help="고유 첨부 이미지 수")
+    parser.add_argument("--dup-ratio", type=float, default=DEFAULT_CONFIG["dup_ratio"], help="완전 중복 노트/첨부 비율")
+    parser.add_argument("--near-dup-ratio", type=float, default=DEFAULT_CONFIG["near_dup_ratio"], help="거의 같은 노트 비율")
+    parser.add_argument("--seed", type=int, default=DEFAULT_CONFIG["seed"], help="난수 시드 (같은 시드 = 같은 Vault)")
+    parser.add_argument("--latency", type=float, default=0.05, help="가짜 Ollama 응답 지연 (초)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="응답 지연의 +- 흔들림 (초)")
+    parser.add_argument("--jobs", type=int, default=4, help="batch_migrate / clean_tags 프로세스 수")
+    parser.add_argument("--workers", type=int, default=4, help="AI 경로의 동시 요청 수")
+    parser.add_argument("--fsync", action="store_true", help="fsync 포함해서 측정 (기본은 --no-fsync, 디스크 편차 제거)")
+    parser.add_argument("--steps", help="실행할 단계 (쉼표 구분, 기본 전체): "
+                        "batch_migrate,batch_migrate_noop,clean_tags,ai_batch,ai_batch_resume,ai_batch_batched,ai_batch_knn,lead")
+    parser.add_argument("--output", default=RESULTS_FILE, help="결과를 한 줄(JSON)씩 덧붙일 파일")
+    parser.add_argument("--dir", default=None, help="작업 폴더를 만들 위치 (기본: 임시 폴더)")
+    parser.add_argument("--keep", action="store_true", help="끝난 뒤 작업 폴더를 지우지 않음")
+    parser.add_argument("--timeout", type=int, default=STEP_TIMEOUT, help="단계별 제한 시간 (초)")
+    args = parser.parse_args()
+
+    config = {key: getattr(args, key) for key in DEFAULT_CONFIG}
+    steps = build_steps(args)
+    if args.steps:
+        wanted = [name.strip() for name in args.steps.split(',') if name.strip()]
+        unknown = set(wanted) - {name for name, _, _ in steps}
+        if unknown:
+            parser.error(f"unknown steps: {', '.join(sorted(unknown))}")
+        steps = [step for step in steps if step[0] in wanted]
+
+    root = tempfile.mkdtemp(prefix="bench_pipeline_", dir=args.dir)
+    fake = None
+    try:
+        started = time.perf_counter()
+        generated = make_vault(root, dict(config))
+        print(f"[*] Synthetic export: {generated} in {time.perf_counter() - started:.1f}s -> {root}")
+        prepare_workspace(root)
+
+        if any(name.startswith(("ai_", "lead")) for name, _, _ in steps):
+            try:
+                fake = FakeOllama(args.latency, args.jitter).start()
+            except OSError as e:
+                print(f"[!] Cannot start fake Ollama on {FAKE_HOST}:{FAKE_PORT} ({e}); is a real Ollama running? "
+                      f"AI steps skipped.")
+                steps = [step for step in steps if not step[0].startswith(("ai_", "lead"))]
+
+        print(f"{'step':<20} | {'time':>9} | {'throughput':>15} | {'max RSS':>10} | {'calls':>10} |")
+        results = run_steps(root, steps, fake, generated["notes"], args.timeout)
+
+        commit, dirty = git_revision()
+        record = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "dirty": dirty,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {**config, "latency": args.latency, "jitter": args.jitter, "jobs": args.jobs,
+                       "workers": args.workers, "fsync": args.fsync},
+            "generated": generated,
+            "steps": results,
+        }
+        previous = previous_record(args.output, record["config"])
+        output_dir = os.path.dirname(args.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"[+] Results appended to {args.output}")
+        compare(record, previous)
+    finally:
+        if fake is not None:
+            fake.stop()
+        if args.keep:
+            print(f"[*] Workspace kept: {root}")
+        else:
+            shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+
+# Configuration
+CACHE_PATH = ".cache/classification_cache.sqlite"
+MAX_CACHE_BYTES = 64 * 1024 * 1024  # 저장된 결과(JSON) 기준 최대 용량
+
+# 캐시에 보관할 AI 응답 필드
+CACHED_FIELDS = ('suggested_folder', 'yaml_frontmatter')
+
+def _sha256(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def content_hash(content):
+    """NFC 정규화 후의 본문 해시 (맥 NFD 파일도 같은 키가 되도록)"""
+    return _sha256(unicodedata.normalize('NFC', content))
+
+class ContentHasher:
+    """content_hash 를 조각 단위로 계산합니다. (스트리밍 모드, 줄 경계에서 나뉜 조각이면 같은 값)"""
+    def __init__(self):
+        self._h = hashlib.sha256()
+
+    def update(self, text):
+        self._h.update(unicodedata.normalize('NFC', text).encode('utf-8'))
+
+    def hexdigest(self):
+        return self._h.hexdigest()
+
+def prompt_hash(prompt_template):
+    return _sha256(prompt_template)[:16]
+
+class ClassificationCache:
+    """
+    AI 분류 결과(suggested_folder, yaml_frontmatter)를 디스크에 보관하는 캐시.
+    키: (본문 해시, 모델명, 프롬프트 템플릿 해시)
+    용량이 MAX_CACHE_BYTES를 넘으면 가장 오래 사용되지 않은 항목부터 지웁니다.
+    여러 스레드에서 동시에 써도 안전합니다.
+    """
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS classification (
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                result TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, model, prompt_hash)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON classification(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM classification").fetchone()[0]
+
+    def _key(self, content, model, prompt_template):
+        return (content_hash(content), model, prompt_hash(prompt_template))
+
+    def get(self, content, model, prompt_template):
+        """캐시된 AI 분석 결과(dict)를 돌려줍니다. 없으면 None."""
+        key = self._key(content, model, prompt_template)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM classification WHERE content_hash=? AND model=? AND prompt_hash=?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE classification SET last_used=? WHERE content_hash=? AND model=? AND prompt_hash=?",
+                (time.time(), *key)
+            )
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, content, model, prompt_template, ai_data):
+        """AI 분석 결과 중 분류에 필요한 필드만 저장합니다."""
+        if not ai_data or 'suggested_folder' not in ai_data:
+            return
+        result = json.dumps({k: ai_data[k] for k in CACHED_FIELDS if k in ai_data}, ensure_ascii=False)
+        size = len(result.encode('utf-8'))
+        key = self._key(content, model, prompt_template)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM classification WHERE content_hash=? AND model=? AND prompt_hash=?", key
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO classification VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, result, size, time.time())
+            )
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """최대 용량의 90% 아래로 내려갈 때까지 오래된 항목부터 삭제 (lock 보유 상태에서 호출)"""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT rowid, size FROM classification ORDER BY last_used ASC"
+        )
+        doomed = []
+        for rowid, size in rows:
+            if self._total_bytes <= target:
+                break
+            doomed.append((rowid,))
+            self._total_bytes -= size
+        self._conn.executemany("DELETE FROM classification WHERE rowid=?", doomed)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "bytes": self._total_bytes}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_default_cache():
+    """모든 마이그레이션 진입점이 공유하는 기본 캐시 인스턴스"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ClassificationCache()
+        return _default_cache
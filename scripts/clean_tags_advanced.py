@@ -1,70 +1,207 @@
 import os
-import re
+import time
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from markdown_rewrite import clean_inline_hashtags
+from frontmatter import split_frontmatter
+from atomic_write import AtomicWriter, atomic_write
+import note_stream
+import vault_index
 
-# 허용된 태그 리스트 (Obsidian에서 태그로 유지할 것들)
-ALLOWED_TAGS = {
-    'raw', 'code', 'distilled', 'final', 'vp', 'family', 
-    'reference', 'checklist', 'it', 'distill', 'unreal', 'disguise'
-}
+# Configuration
+VAULT_ROOT = "Obsidian_Vault"
+DIFF_SAMPLE_LINES = 3   # --dry-run 에서 파일당 보여줄 변경 줄 수
 
-def clean_inline_hashtags(content):
+# 태그 이름이 될 수 있는 첫 바이트 (영문/숫자/_ 와 UTF-8 멀티바이트 문자의 시작 바이트)
+_ASCII_WORD = frozenset(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_")
+_TAG_START = _ASCII_WORD | frozenset(range(0xC0, 0x100))
+# '#' 바로 앞에 오면 태그가 아닌 바이트 (이미 이스케이프된 \#tag, &#123;, 단어 중간의 a#b)
+_NOT_TAG_BEFORE = _ASCII_WORD | frozenset(b"\\&")
+
+def clean_note(content):
     """
-    문장 내의 해시태그를 정제합니다. 
-    허용 리스트에 없는 해시태그는 \# 형태로 이스케이프 처리합니다.
-    URL이나 코드 블록 내의 해시태그는 무시해야 하지만, 
-    여기서는 가장 시급한 일반 텍스트 내 해시태그 위주로 처리합니다.
+    본문만 clean_inline_hashtags 로 정제합니다. (YAML frontmatter 의 '#' 는 태그가 아님: color: "#ff0000", tags: [#foo])
+    바뀐 것이 없으면 content 를 그대로 돌려줍니다.
     """
-    
-    # 1. 태그 패턴 찾기: # 뒤에 한글, 영어, 숫자가 붙는 경우
-    # [^#] 혹은 줄 시작(^) 뒤에 오는 #을 찾음
-    # (?<!\w) 는 앞에 글자가 없을 때 (단어 경계)
-    pattern = r'(?<!\w)#([a-zA-Z0-9_\uAC00-\uD7A3]+)'
-    
-    def replacer(match):
-        tag_content = match.group(1).lower()
-        full_match = match.group(0)
-        
-        # 허용된 태그인 경우 그대로 유지
-        if tag_content in ALLOWED_TAGS:
-            return full_match
-        
-        # Markdown 헤더 (# 제목) 인 경우 체크 (정규표현식 상으로는 걸리지 않겠지만 안전장치)
-        # 만약 match 시작이 줄 시작이고 뒤에 공백이 있으면 헤더임
-        
-        # 그 외의 모든 '오염된' 태그는 이스케이프 처리
-        return f"\\#{match.group(1)}"
-
-    # 2. Markdown 헤더(줄 시작 # )를 임시로 보호하거나 정규표현식에서 제외
-    # 여기서는 간단하게 문장 중간 및 단어 앞의 #만 처리하도록 pattern 개선
-    
-    lines = content.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        # Markdown 헤더(# , ## )는 건드리지 않음
-        if re.match(r'^#{1,6}\s', line):
-            cleaned_lines.append(line)
-            continue
-        
-        # 줄 중간의 해시태그들 처리
-        cleaned_line = re.sub(pattern, replacer, line)
-        cleaned_lines.append(cleaned_line)
-        
-    return '\n'.join(cleaned_lines)
-
-def process_file(file_path):
+    _, body = split_frontmatter(content)
+    cleaned = clean_inline_hashtags(body)
+    if cleaned == body:
+        return content
+    return content[:len(content) - len(body)] + cleaned
+
+def process_file(file_path, writer=None, stream_threshold=note_stream.STREAM_THRESHOLD):
+    if note_stream.is_large(os.path.getsize(file_path), stream_threshold):
+        changed, _ = _clean_streamed(file_path, dry_run=False, sync=True)
+        if changed and writer is not None:
+            writer.mark_written(file_path)
+        return changed
+
     with open(file_path, 'r', encoding='utf-8') as f:
         content = f.read()
-    
-    cleaned = clean_inline_hashtags(content)
-    
+
+    cleaned = clean_note(content)
+
     if content != cleaned:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(cleaned)
+        # 임시 파일 + rename 으로 교체 (writer: AtomicWriter 를 주면 폴더 fsync 를 묶어서)
+        if writer is not None:
+            writer.write(file_path, cleaned)
+        else:
+            atomic_write(file_path, cleaned)
         return True
     return False
 
-if __name__ == "__main__":
+def may_have_inline_tags(data):
+    """
+    정규식을 돌리기 전 바이트 단위 사전 검사.
+    헤더 줄(# 제목) 밖에 태그가 될 수 있는 '#' 가 하나도 없으면 False (바꿀 것이 없음이 확실).
+    이미 이스케이프된 \\#tag 만 남은 (정제가 끝난) 노트도 여기서 걸러집니다.
+    True 는 '정규식으로 확인해 봐야 함' 을 뜻합니다. (코드 블록/URL 안의 # 는 여기서 가리지 않음)
+    """
+    pos = data.find(b'#')
+    while pos != -1:
+        line_start = data.rfind(b'\n', 0, pos) + 1
+        line_end = data.find(b'\n', pos)
+        if line_end == -1:
+            line_end = len(data)
+        line = data[line_start:line_end]
+        marks = len(line) - len(line.lstrip(b'#'))
+        if not (1 <= marks <= 6 and line[marks:marks + 1] in (b' ', b'\t')):
+            # 헤더가 아닌 줄: 이 줄의 '#' 중 뒤에 태그 문자가 오는 것이 있는지
+            i = pos
+            while i != -1:
+                if (i + 1 < line_end and data[i + 1] in _TAG_START
+                        and (i == line_start or data[i - 1] not in _NOT_TAG_BEFORE)):
+                    return True
+                i = data.find(b'#', i + 1, line_end)
+        pos = data.find(b'#', line_end)
+    return False
+
+def _clean_streamed(path, dry_run, sync):
+    """
+    큰 파일을 메모리에 올리지 않고 정제합니다. (chunk 단위 두 번 읽기, frontmatter 는 그대로)
+    1차로 바뀔 줄만 세고, 바뀌는 것이 있으면 2차로 변환 결과를 바로 임시 파일에 써서 교체합니다.
+    반환: (바뀌었는지 여부, (바뀐 줄 수, 이스케이프한 태그 수, 변경 줄 샘플))
+    """
+    lines = 0
+    escaped = 0
+    sample = []
+    with open(path, 'r', encoding='utf-8') as f:
+        _, _, body = note_stream.split_frontmatter_stream(note_stream.iter_pieces(f))
+        for text, kind in note_stream.iter_blocks(body):
+            if kind == 'code':
+                continue
+            cleaned = clean_inline_hashtags(text if kind == 'text' else '\t' + text)
+            if kind == 'tail':
+                cleaned = cleaned[1:]
+            if cleaned == text:
+                continue
+            changed = [(old, new) for old, new in zip(text.split('\n'), cleaned.split('\n')) if old != new]
+            lines += len(changed)
+            escaped += cleaned.count('\\#') - text.count('\\#')
+            sample.extend(changed[:DIFF_SAMPLE_LINES - len(sample)])
+    if not lines:
+        return False, None
+    if not dry_run:
+        with open(path, 'r', encoding='utf-8') as f:
+            _, head, body = note_stream.split_frontmatter_stream(note_stream.iter_pieces(f))
+            atomic_write(path, itertools.chain([head], note_stream.rewrite_stream(body)), sync=sync)
+    return True, (lines, escaped, sample)
+
+def clean_file(task):
+    """
+    파일 1개 정제 (프로세스 풀 워커에서 실행).
+    task: (path, dry_run, sync, stream_threshold)
+    반환: (path, status, size, summary, error)
+      status: 'skipped'(사전 검사 통과) | 'unchanged' | 'changed'
+      summary: 변경 시 (바뀐 줄 수, 이스케이프한 태그 수, 변경 줄 샘플)
+    stream_threshold 보다 큰 파일은 사전 검사 없이 스트리밍으로 정제합니다.
+    """
+    path, dry_run, sync, stream_threshold = task
+    try:
+        size = os.path.getsize(path)
+        if note_stream.is_large(size, stream_threshold):
+            changed, summary = _clean_streamed(path, dry_run, sync)
+            return path, 'changed' if changed else 'unchanged', size, summary, None
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not may_have_inline_tags(data):
+            return path, 'skipped', len(data), None, None
+
+        content = data.decode('utf-8')
+        cleaned = clean_note(content)
+        if cleaned == content:
+            return path, 'unchanged', len(data), None, None
+
+        # 이스케이프만 하므로 줄 수는 그대로 -> 줄 단위로 비교
+        changed = [(old, new) for old, new in zip(content.split('\n'), cleaned.split('\n')) if old != new]
+        escaped = cleaned.count('\\#') - content.count('\\#')
+        summary = (len(changed), escaped, changed[:DIFF_SAMPLE_LINES])
+        if not dry_run:
+            atomic_write(path, cleaned, sync=sync)
+        return path, 'changed', len(data), summary, None
+    except Exception as e:
+        return path, 'error', 0, None, str(e)
+
+def iter_cleaned(tasks, jobs=1):
+    """clean_file 결과를 yield. jobs > 1 이면 프로세스 풀에 청크 단위로 분배합니다."""
+    if jobs <= 1:
+        for task in tasks:
+            yield clean_file(task)
+        return
+
+    chunksize = max(1, min(256, len(tasks) // (jobs * 8)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(clean_file, tasks, chunksize=chunksize)
+
+def is_skipped_dir(path):
+    # .obsidian, .trash 같은 숨김 폴더는 노트가 아님
+    return os.path.basename(path).startswith('.')
+
+def clean_vault(root=VAULT_ROOT, jobs=1, dry_run=False, sync=True, stream_threshold=note_stream.STREAM_THRESHOLD):
+    print(f"[*] Cleaning hashtags in {root}{' (dry run)' if dry_run else ''}...")
+    if jobs > 1:
+        print(f"[*] Parallel mode: {jobs} processes.")
+    start_time = time.time()
+
+    tasks = [(path, dry_run, sync, stream_threshold) for path, _ in vault_index.scan_markdown(root, skip_dir=is_skipped_dir)]
+
+    writer = AtomicWriter(sync=sync)
+    counts = {'skipped': 0, 'unchanged': 0, 'changed': 0, 'error': 0}
+    total_bytes = 0
+    changed_lines = 0
+    escaped_tags = 0
+    for path, status, size, summary, error in iter_cleaned(tasks, jobs):
+        counts[status] += 1
+        total_bytes += size
+        if status == 'error':
+            print(f"[!] Error processing {path}: {error}")
+            continue
+        if status != 'changed':
+            continue
+
+        lines, escaped, sample = summary
+        changed_lines += lines
+        escaped_tags += escaped
+        if dry_run:
+            print(f"[~] {path}: {lines} lines, {escaped} tags escaped")
+            for old, new in sample:
+                print(f"    - {old.strip()}")
+                print(f"    + {new.strip()}")
+        else:
+            writer.mark_written(path)
+    writer.commit()
+
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"\n[+] {'Dry run' if dry_run else 'Cleaning'} Finished!")
+    print(f"    - Files: {len(tasks)} (changed {counts['changed']}, unchanged {counts['unchanged']}, "
+          f"skipped by pre-check {counts['skipped']}, errors {counts['error']})")
+    print(f"    - {'Would change' if dry_run else 'Changed'}: {changed_lines} lines, {escaped_tags} tags escaped")
+    print(f"    - Time Elapsed: {elapsed:.2f}s ({len(tasks) / elapsed:.0f} files/s, "
+          f"{total_bytes / elapsed / (1024 * 1024):.1f} MB/s)")
+
+def demo():
     # 검증을 위한 샘플 테스트용 코드
     sample_text = """
 # 제목입니다
@@ -72,8 +209,29 @@ if __name__ == "__main__":
 #raw 태그는 유지되어야 합니다.
 하지만 #오염된태그 는 지워져야(이스케이프) 합니다.
 URL: [링크](https://example.com/#heading) 무시해야 함.
+`#inline` 코드와 아래 코드 블록도 무시해야 함.
+```c
+#include <stdio.h>
+```
     """
     print("--- Original ---")
     print(sample_text)
     print("--- Cleaned ---")
     print(clean_inline_hashtags(sample_text))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vault 전체의 문장 내 해시태그 정제 (허용 리스트 외 이스케이프)")
+    parser.add_argument("root", nargs="?", default=VAULT_ROOT, help="정제할 Vault 폴더")
+    parser.add_argument("--jobs", type=int, default=1, help="병렬 처리 프로세스 수 (0 = CPU 코어 수)")
+    parser.add_argument("--dry-run", action="store_true", help="파일을 바꾸지 않고 바뀔 내용만 요약")
+    parser.add_argument("--no-fsync", action="store_true", help="fsync 생략 (원자적 교체만 보장)")
+    parser.add_argument("--stream-mb", type=float, default=note_stream.STREAM_THRESHOLD / (1024 * 1024),
+                        help="이보다 큰 노트(MB)는 메모리에 올리지 않고 스트리밍으로 정제 (0 = 항상 스트리밍)")
+    parser.add_argument("--demo", action="store_true", help="샘플 텍스트로 정제 결과만 출력")
+    args = parser.parse_args()
+    if args.demo:
+        demo()
+    else:
+        clean_vault(args.root, jobs=args.jobs if args.jobs > 0 else (os.cpu_count() or 1),
+                    dry_run=args.dry_run, sync=not args.no_fsync,
+                    stream_threshold=int(args.stream_mb * 1024 * 1024))
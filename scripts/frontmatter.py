@@ -0,0 +1,155 @@
+import re
+
+# 노트 맨 앞의 YAML 블록 (--- ... ---)
+FRONTMATTER_PATTERN = re.compile(r'\A---[ \t]*\n(.*?)\n---[ \t]*(?:\n|\Z)', re.DOTALL)
+# 비어 있는 블록 (---\n---)
+EMPTY_FRONTMATTER_PATTERN = re.compile(r'\A---[ \t]*\n---[ \t]*(?:\n|\Z)')
+# 최상위 키 줄 (들여쓰기 없음, 주석/리스트 아님)
+KEY_PATTERN = re.compile(r'^(?P<key>[^\s#\-:][^:]*?)[ \t]*:(?:[ \t]+|$)')
+
+# 두 블록에 모두 있으면 합집합으로 병합하는 리스트형 키
+LIST_KEYS = ('tags', 'aliases')
+
+def split_frontmatter(content):
+    """
+    (frontmatter 안쪽 텍스트 또는 None, 본문) 으로 나눕니다.
+    본문은 닫는 '---' 줄 바로 다음부터입니다.
+    빈 블록을 먼저 봅니다. (---\n---\n 뒤 본문의 첫 '---' 구분선까지를 frontmatter 로 읽지 않도록,
+    첫 '---' 줄에서 닫는 split_frontmatter_stream 과 같은 결과)
+    """
+    m = EMPTY_FRONTMATTER_PATTERN.match(content)
+    if m:
+        return "", content[m.end():]
+    m = FRONTMATTER_PATTERN.match(content)
+    if m:
+        return m.group(1), content[m.end():]
+    return None, content
+
+def read_frontmatter(content):
+    """노트 맨 앞의 YAML 블록에서 단순 'key: value' 항목만 읽습니다."""
+    block, _ = split_frontmatter(content)
+    if not block:
+        return {}
+    fields = {}
+    for line in block.split('\n'):
+        key, sep, value = line.partition(':')
+        if sep and key and not key.startswith((' ', '\t', '-')):
+            fields[key.strip().lower()] = value.strip().strip('"\'')
+    return fields
+
+def parse_entries(block):
+    """
+    frontmatter 안쪽 텍스트를 [(key, [줄...]), ...] 로 나눕니다. (순서 보존, 원문 줄 그대로)
+    들여쓴 줄, '- 항목' 줄, 주석은 바로 앞 키에 붙고, 첫 키 이전의 줄은 key=None 항목이 됩니다.
+    """
+    entries = []
+    for line in block.split('\n') if block else []:
+        m = KEY_PATTERN.match(line)
+        if m:
+            entries.append((m.group('key').strip(), [line]))
+        elif entries:
+            entries[-1][1].append(line)
+        else:
+            entries.append((None, [line]))
+    return entries
+
+def list_items(lines):
+    """리스트형 키의 값을 항목 목록으로 ('tags: [a, b]', 'tags: a, b', 블록 리스트 모두 지원)"""
+    _, _, value = lines[0].partition(':')
+    value = value.strip()
+    items = []
+    if value.startswith('[') and value.endswith(']'):
+        items = value[1:-1].split(',')
+    elif value:
+        items = value.split(',')
+    for line in lines[1:]:
+        stripped = line.strip()
+        if stripped.startswith('- '):
+            items.append(stripped[2:])
+    return [item.strip().strip('"\'') for item in items if item.strip().strip('"\'')]
+
+def _item_key(item):
+    return item.lstrip('#').lower()
+
+def _render_list(key, old_lines, items):
+    # 기존 블록 리스트 형태면 그대로 '- 항목' 을 이어 붙이고, 아니면 인라인 [a, b] 로
+    if len(old_lines) > 1 and any(line.strip().startswith('- ') for line in old_lines[1:]):
+        indent = next(line[:len(line) - len(line.lstrip())] for line in old_lines[1:] if line.strip().startswith('- '))
+        return [f"{key}:"] + [f"{indent}- {item}" for item in items]
+    return [f"{key}: [{', '.join(items)}]"]
+
+def normalize_block(text):
+    """AI 가 돌려준 frontmatter 문자열에서 ```yaml 펜스와 '---' 줄을 벗겨 안쪽 텍스트만 남깁니다."""
+    text = (text or "").strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ""
+        text = text.rstrip()
+        if text.endswith('```'):
+            text = text[:-3]
+    text = text.strip()
+    if text.startswith('---'):
+        text = text[3:].lstrip(' \t')
+        text = text[1:] if text.startswith('\n') else text
+    if text.endswith('---'):
+        text = text[:-3]
+    return text.strip('\n')
+
+def merge_blocks(existing, incoming):
+    """
+    기존 frontmatter(안쪽 텍스트)에 새 키를 결정적으로 병합합니다.
+    키는 대소문자를 무시하고 비교하며, 둘 다 있으면 기존 키의 표기를 유지합니다. (Tags: 와 tags:)
+    - 기존에 없는 키: 새 블록의 순서대로 뒤에 추가
+    - 둘 다 있는 리스트형 키(tags, aliases): 기존 순서 뒤에 새 항목만 추가 (대소문자, '#' 무시)
+    - 둘 다 있는 그 밖의 키: 기존 값 유지 (사용자가 고친 값을 덮어쓰지 않음)
+    바뀐 것이 없으면 existing 을 그대로 돌려줍니다.
+    """
+    entries = parse_entries(existing)
+    positions = {}
+    for i, (key, _) in enumerate(entries):
+        if key is not None:
+            positions.setdefault(key.lower(), i)
+    changed = False
+    for key, lines in parse_entries(incoming):
+        if key is None:
+            continue
+        if key.lower() not in positions:
+            positions[key.lower()] = len(entries)
+            entries.append((key, lines))
+            changed = True
+        elif key.lower() in LIST_KEYS:
+            position = positions[key.lower()]
+            key, old_lines = entries[position]
+            old_items = list_items(old_lines)
+            seen = {_item_key(item) for item in old_items}
+            new_items = []
+            for item in list_items(lines):
+                if _item_key(item) not in seen:
+                    seen.add(_item_key(item))
+                    new_items.append(item)
+            if new_items:
+                entries[position] = (key, _render_list(key, old_lines, old_items + new_items))
+                changed = True
+    if not changed:
+        return existing
+    return "\n".join(line for _, lines in entries for line in lines)
+
+def merge_frontmatter(content, ai_frontmatter, rewrite_body=None):
+    """
+    노트 content 에 AI frontmatter 를 병합한 전체 노트를 돌려줍니다.
+    기존 블록이 있으면 그 자리에서 병합하고 (두 번째 블록을 앞에 붙이지 않음),
+    없으면 새 블록을 맨 앞에 붙입니다.
+    rewrite_body(body) 가 주어지면 본문에만 적용합니다. (YAML 안의 '#' 는 태그 정제 대상이 아님)
+    병합/정제 결과가 같으면 content 객체를 그대로 돌려주므로,
+    호출자는 'result is content' 로 다시 쓸 필요가 없음을 알 수 있습니다.
+    """
+    incoming = normalize_block(ai_frontmatter)
+    existing, body = split_frontmatter(content)
+    new_body = rewrite_body(body) if rewrite_body is not None else body
+    if existing is None:
+        return f"---\n{incoming}\n---\n\n{new_body}" if incoming else f"---\n---\n\n{new_body}"
+    merged = merge_blocks(existing, incoming)
+    if merged is existing:
+        if new_body == body:
+            return content
+        return content[:len(content) - len(body)] + new_body
+    return f"---\n{merged}\n---\n{new_body}"
@@ -0,0 +1,322 @@
+import os
+import re
+import math
+import time
+import array
+import heapq
+import random
+import sqlite3
+import argparse
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from frontmatter import split_frontmatter
+from classification_cache import content_hash
+from markdown_rewrite import rewrite_markdown
+from rule_classifier import make_frontmatter
+from ollama_client import get_client
+import vault_index
+
+# Configuration
+VAULT_ROOT = "Obsidian_Vault"
+OLLAMA_URL = "http://localhost:11434/api/generate"
+EMBED_MODEL = "nomic-embed-text"
+EMBED_CACHE = ".cache/embeddings.sqlite"
+EMBED_CHARS = 2000      # 임베딩에 넣을 본문 앞부분 글자 수 (임베딩 모델 컨텍스트 제한)
+EMBED_BATCH = 32        # /api/embed 1회 요청에 넣을 노트 수
+K = 7                   # 투표에 참여할 이웃 수
+MIN_AGREEMENT = 0.6     # 이웃 유사도 가중 투표에서 1위 폴더가 차지해야 하는 비율
+# 가장 가까운 이웃의 코사인 유사도가 이보다 낮으면 생성 모델로 넘김 (백엔드마다 분포가 다름)
+MIN_SIMILARITY = {"tfidf": 0.3, "embed": 0.75}
+MAX_QUERY_TERMS = 32    # TF-IDF 질의에서 가중치 상위 단어만 사용 (긴 노트의 질의 비용 제한)
+MAX_POSTINGS = 256      # 단어별로 가중치가 큰 노트만 남김 (흔한 단어의 posting 길이 제한)
+
+WORD_PATTERN = re.compile(r'\w+')
+HANGUL_PATTERN = re.compile(r'[가-힣]')
+
+def is_skipped_dir(path):
+    # 숨김 폴더, 분류 전인 Inbox, 첨부파일 폴더는 학습 데이터가 아님
+    name = os.path.basename(path)
+    return name.startswith('.') or name in ('00_Inbox', 'Files')
+
+def note_text(content):
+    """비교용 본문 (NFC, frontmatter 제외 - AI 가 붙인 para_folder 가 정답을 흘리지 않도록)"""
+    _, body = split_frontmatter(unicodedata.normalize('NFC', content))
+    return body
+
+def terms(text):
+    """
+    TF-IDF 용어 목록: 소문자 단어 + 한글 단어의 글자 bigram.
+    ('프로젝트를' 과 '프로젝트' 처럼 조사가 붙은 형태도 bigram 으로 겹치게)
+    """
+    result = []
+    for word in WORD_PATTERN.findall(text.lower()):
+        if len(word) < 2 or word.isdigit():
+            continue
+        result.append(word)
+        if len(word) > 2 and HANGUL_PATTERN.match(word):
+            result.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return result
+
+class TfidfIndex:
+    """
+    희소 TF-IDF 벡터 + 역색인 (순수 Python, 추가 의존성 없음).
+    query() 는 질의 단어의 posting 만 더하므로 노트 수가 아니라 겹치는 단어 수에 비례합니다.
+    posting 은 단어별로 가중치 상위 MAX_POSTINGS 개만 남기는 근사 검색입니다.
+    (그 단어가 중요한 노트는 남으므로 이웃 투표에는 거의 영향이 없음)
+    """
+    name = "tfidf"
+
+    def __init__(self):
+        self.postings = {}
+        self.idf = {}
+        self.size = 0
+
+    def fit(self, texts):
+        docs = [Counter(terms(text)) for text in texts]
+        self.size = len(docs)
+        df = Counter()
+        for tf in docs:
+            df.update(tf.keys())
+        # 모든 노트에 나오는 단어는 가중치 0 (불용어 목록 없이 흔한 단어가 자연히 빠짐)
+        self.idf = {term: math.log((1 + self.size) / (1 + n)) for term, n in df.items() if n < self.size}
+        postings = defaultdict(list)
+        for doc_id, tf in enumerate(docs):
+            vector = self._weights(tf)
+            for term, weight in vector.items():
+                postings[term].append((doc_id, weight))
+        self.postings = {term: heapq.nlargest(MAX_POSTINGS, entries, key=lambda entry: entry[1])
+                         if len(entries) > MAX_POSTINGS else entries
+                         for term, entries in postings.items()}
+        return self
+
+    def _weights(self, tf):
+        # sublinear tf x idf, L2 정규화
+        vector = {term: (1 + math.log(n)) * self.idf[term] for term, n in tf.items() if term in self.idf}
+        norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+        return {term: w / norm for term, w in vector.items()}
+
+    def query(self, text, k=K):
+        """[(노트 번호, 코사인 유사도)] 상위 k 개"""
+        vector = self._weights(Counter(terms(text)))
+        top_terms = heapq.nlargest(MAX_QUERY_TERMS, vector.items(), key=lambda item: item[1])
+        scores = defaultdict(float)
+        for term, weight in top_terms:
+            for doc_id, doc_weight in self.postings.get(term, ()):
+                scores[doc_id] += weight * doc_weight
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+class EmbeddingIndex:
+    """
+    Ollama 임베딩 모델 (/api/embed) 벡터를 NumPy 행렬로 두고 행렬 곱 한 번으로 k-NN.
+    임베딩은 (본문 해시, 모델) 로 SQLite 에 캐시하므로 다음 실행에서는 새 노트만 임베딩합니다.
+    numpy 가 필요합니다. (tfidf 백엔드는 필요 없음)
+    """
+    name = "embed"
+
+    def __init__(self, model=EMBED_MODEL, url=OLLAMA_URL, cache_path=EMBED_CACHE):
+        import numpy
+        self.np = numpy
+        self.model = model
+        self.client = get_client(url)
+        self.matrix = None
+        self._lock = threading.Lock()
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (hash TEXT, model TEXT, vector BLOB, "
+                           "PRIMARY KEY (hash, model))")
+        self._conn.commit()
+
+    def _embed_texts(self, texts):
+        """임베딩 목록 (캐시 우선, 없는 것만 EMBED_BATCH 개씩 요청). 실패한 항목은 None"""
+        keys = [content_hash(text[:EMBED_CHARS]) for text in texts]
+        vectors = [None] * len(texts)
+        missing = []
+        with self._lock:
+            for i, key in enumerate(keys):
+                row = self._conn.execute("SELECT vector FROM embeddings WHERE hash=? AND model=?",
+                                         (key, self.model)).fetchone()
+                if row:
+                    vectors[i] = array.array('f', row[0])
+                else:
+                    missing.append(i)
+        for start in range(0, len(missing), EMBED_BATCH):
+            batch = missing[start:start + EMBED_BATCH]
+            result = self.client.embed(self.model, [texts[i][:EMBED_CHARS] for i in batch])
+            if result is None:
+                continue
+            with self._lock:
+                for i, vector in zip(batch, result):
+                    vectors[i] = array.array('f', vector)
+                    self._conn.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                                       (keys[i], self.model, vectors[i].tobytes()))
+                self._conn.commit()
+        return vectors
+
+    def _normalized(self, rows):
+        matrix = self.np.asarray(rows, dtype=self.np.float32)
+        norms = self.np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def fit(self, texts):
+        vectors = self._embed_texts(texts)
+        self.ids = [i for i, vector in enumerate(vectors) if vector is not None]
+        if len(self.ids) < len(texts):
+            print(f"[!] Embedding failed for {len(texts) - len(self.ids)} notes (left out of the index)")
+        self.matrix = self._normalized([vectors[i] for i in self.ids]) if self.ids else None
+        return self
+
+    def query(self, text, k=K):
+        if self.matrix is None:
+            return []
+        vector = self._embed_texts([text])[0]
+        if vector is None:
+            return []
+        sims = self.matrix @ self._normalized([vector])[0]
+        k = min(k, len(sims))
+        top = self.np.argpartition(-sims, k - 1)[:k]
+        return sorted(((self.ids[i], float(sims[i])) for i in top), key=lambda item: -item[1])
+
+class KnnClassifier:
+    """
+    이미 Vault 에 정리된 노트를 정답 예시로 삼는 k-NN 폴더 분류기.
+    가장 가까운 이웃 K 개의 폴더를 유사도 가중 투표로 고르고,
+    가장 가까운 이웃이 충분히 비슷하지 않거나 (MIN_SIMILARITY) 표가 갈리면 (MIN_AGREEMENT)
+    None 을 돌려 생성 모델로 넘깁니다. (RuleClassifier 와 같은 ai_data 형태, 여러 스레드에서 호출해도 안전)
+    """
+    def __init__(self, root=VAULT_ROOT, backend="tfidf", k=K, min_similarity=None, min_agreement=MIN_AGREEMENT,
+                 embed_model=EMBED_MODEL, url=OLLAMA_URL):
+        self.root = root
+        self.backend = backend
+        self.k = k
+        self.min_similarity = MIN_SIMILARITY[backend] if min_similarity is None else min_similarity
+        self.min_agreement = min_agreement
+        if backend == "embed":
+            self.index = EmbeddingIndex(embed_model, url)
+        else:
+            self.index = TfidfIndex()
+        self.paths = []
+        self.labels = []
+        self.hits = Counter()
+        self._lock = threading.Lock()
+
+    def fit(self):
+        """Vault 의 정리된 노트 (Inbox 제외) 를 읽어 색인합니다. 폴더가 곧 정답 라벨입니다."""
+        start = time.time()
+        texts = []
+        for path, _ in vault_index.scan_markdown(self.root, skip_dir=is_skipped_dir):
+            folder = os.path.relpath(os.path.dirname(path), self.root)
+            if folder == '.':
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = note_text(f.read())
+            except (OSError, UnicodeDecodeError):
+                continue
+            if not text.strip():
+                continue
+            self.paths.append(path)
+            self.labels.append(unicodedata.normalize('NFC', folder).replace(os.sep, '/'))
+            texts.append(text)
+        self.index.fit(texts)
+        print(f"[*] k-NN classifier ({self.backend}): {len(self.labels)} filed notes, "
+              f"{len(set(self.labels))} folders ({time.time() - start:.2f}s)")
+        return self
+
+    def neighbours(self, content, exclude=None):
+        """[(Vault 노트 경로, 폴더, 유사도)] 가까운 순"""
+        hits = self.index.query(note_text(content), self.k + (1 if exclude is not None else 0))
+        result = [(self.paths[i], self.labels[i], score) for i, score in hits if self.paths[i] != exclude]
+        return result[:self.k]
+
+    def predict(self, content, exclude=None):
+        """(폴더, 가장 가까운 이웃 유사도, 1위 폴더 득표율) 또는 None (이웃이 없음)"""
+        neighbours = self.neighbours(content, exclude)
+        if not neighbours:
+            return None
+        votes = Counter()
+        for _, folder, score in neighbours:
+            votes[folder] += score
+        folder, weight = votes.most_common(1)[0]
+        total = sum(votes.values()) or 1.0
+        return folder, neighbours[0][2], weight / total
+
+    def classify(self, content, filename=None, exclude=None):
+        """ai_data 형태의 dict (suggested_folder, yaml_frontmatter, classified_by) 또는 None"""
+        prediction = self.predict(content, exclude)
+        confident = (prediction is not None and prediction[1] >= self.min_similarity
+                     and prediction[2] >= self.min_agreement)
+        with self._lock:
+            self.hits['knn' if confident else 'llm'] += 1
+        if not confident:
+            return None
+        folder, similarity, agreement = prediction
+        found_tags = set()
+        if '#' in content:
+            rewrite_markdown(content, escape_tags=False, found_tags=found_tags)
+        return {
+            "suggested_folder": folder,
+            "yaml_frontmatter": make_frontmatter(found_tags),  # 노트에는 태그만 (폴더/분류기는 이 dict 로만)
+            "classified_by": f"knn/{self.backend}",
+            "similarity": round(similarity, 3),
+            "agreement": round(agreement, 3),
+        }
+
+    def report(self):
+        with self._lock:
+            hits = dict(self.hits)
+        total = sum(hits.values())
+        if total:
+            print(f"    - k-NN fast-path ({self.backend}): {hits.get('knn', 0)}/{total} resolved without LLM")
+
+def evaluate(classifier, sample=500, seed=0):
+    """
+    Leave-one-out 평가: 정리된 노트를 자기 자신을 뺀 이웃으로 분류해
+    확신 비율(coverage), 확신한 경우의 정확도, 노트당 분류 시간을 출력합니다.
+    """
+    indices = list(range(len(classifier.paths)))
+    random.Random(seed).shuffle(indices)
+    indices = indices[:sample]
+    confident = correct = 0
+    elapsed = 0.0
+    for i in indices:
+        path = classifier.paths[i]
+        with open(path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        start = time.perf_counter()
+        result = classifier.classify(content, exclude=path)
+        elapsed += time.perf_counter() - start
+        if result is not None:
+            confident += 1
+            correct += result["suggested_folder"] == classifier.labels[i]
+    n = max(1, len(indices))
+    print(f"[*] Leave-one-out on {len(indices)} notes: coverage {confident / n:.1%}, "
+          f"accuracy {correct / max(1, confident):.1%}, {elapsed / n * 1000:.2f} ms/note")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="정리된 Vault 노트 기반 k-NN 폴더 분류기")
+    parser.add_argument("notes", nargs="*", help="분류해 볼 노트 파일")
+    parser.add_argument("--root", default=VAULT_ROOT, help="Vault 폴더")
+    parser.add_argument("--backend", choices=("tfidf", "embed"), default="tfidf", help="tfidf (CPU) 또는 embed (Ollama 임베딩 + numpy)")
+    parser.add_argument("--embed-model", default=EMBED_MODEL, help="Ollama 임베딩 모델 이름")
+    parser.add_argument("--evaluate", type=int, metavar="N", help="정리된 노트 N 개로 leave-one-out 정확도 측정")
+    args = parser.parse_args()
+
+    knn = KnnClassifier(args.root, args.backend, embed_model=args.embed_model).fit()
+    for note in args.notes:
+        with open(note, 'r', encoding='utf-8') as f:
+            content = f.read()
+        prediction = knn.predict(content)
+        if prediction is None:
+            print(f"[!] {note}: no neighbours")
+            continue
+        folder, similarity, agreement = prediction
+        decided = similarity >= knn.min_similarity and agreement >= knn.min_agreement
+        print(f"[{'+' if decided else '~'}] {note} -> {folder} (similarity {similarity:.2f}, agreement {agreement:.0%})"
+              f"{'' if decided else ' - would ask the LLM'}")
+    if args.evaluate:
+        evaluate(knn, args.evaluate)
@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import posixpath
+import unicodedata
+from frontmatter import split_frontmatter, parse_entries, list_items, LIST_KEYS
+import vault_index
+
+# Configuration
+VAULT_ROOT = "Obsidian_Vault"
+INDEX_PATH = ".cache/link_index.sqlite"
+COMMIT_EVERY = 200
+
+# 본문에서 태그/링크를 한 번의 스캔으로 추출 (markdown_rewrite 와 같은 규칙으로 코드는 건너뜀)
+#   fence/code : 코드 블록, 인라인 코드                    -> 무시
+#   wiki       : [[노트]], [[폴더/노트#헤더|별칭]], ![[임베드]]
+#   image      : ![alt](상대 경로)
+#   url        : http(s)/ftp URL (#fragment 를 태그로 보지 않음) -> 무시
+#   tag        : 해시태그 (이스케이프된 \#tag 는 제외)
+LINK_PATTERN = re.compile(r"""
+    (?P<fence>^[ ]{0,3}(?P<fmark>`{3,}|~{3,})[^\n]*
+        (?:\n(?s:.*?)^[ ]{0,3}(?P=fmark)[`~]*[ \t]*$|(?s:.*)))
+  | (?P<code>(?P<ticks>`+)[^\n]*?(?P=ticks))
+  | (?P<wiki>(?P<embed>!)?\[\[(?P<wtarget>[^\]\|\#\n]*)(?:\#[^\]\|\n]*)?(?:\|[^\]\n]*)?\]\])
+  | (?P<image>!\[[^\]\n]*\]\((?P<src><[^>\n]+>|[^)\s]+)(?:[ \t]+"[^"\n]*")?\))
+  | (?P<url>(?:https?|ftp)://[^\s<>()]+)
+  | (?P<tag>(?<![\w\\&])\#(?P<name>[a-zA-Z0-9_가-힣]+))
+""", re.MULTILINE | re.VERBOSE)
+
+def normalize_path(path):
+    """색인 키: NFC, '/' 구분자"""
+    return unicodedata.normalize('NFC', path).replace(os.sep, '/')
+
+def note_name(path):
+    """위키 링크 매칭용 노트 이름 (확장자 없는 파일명, 소문자)"""
+    return posixpath.splitext(posixpath.basename(path))[0].lower()
+
+def extract_note(content, rel_path):
+    """
+    노트 1개에서 색인할 정보를 뽑습니다. (파일 I/O 없음, 프로세스 풀 워커에서도 사용)
+    rel_path: Vault 기준 상대 경로 ('/' 구분)
+    반환: {"tags": [(tag, source)], "links": [(kind, target)], "frontmatter": {...}}
+      kind: 'wiki'(노트 링크, target=노트 이름) | 'image'(target=Vault 기준 경로) | 'attachment'(![[파일]], target=파일명)
+    """
+    block, body = split_frontmatter(content)
+    fields = {}
+    tags = set()
+    for key, lines in parse_entries(block):
+        if key is None:
+            continue
+        if key.lower() in LIST_KEYS:
+            fields[key] = list_items(lines)
+            if key.lower() == 'tags':
+                tags.update((item.lstrip('#').lower(), 'frontmatter') for item in fields[key])
+        else:
+            fields[key] = lines[0].partition(':')[2].strip().strip('"\'')
+
+    links = set()
+    note_dir = posixpath.dirname(rel_path)
+    if '#' in body or '[' in body:
+        for m in LINK_PATTERN.finditer(body):
+            kind = m.lastgroup
+            if kind == 'tag':
+                tags.add((m.group('name').lower(), 'inline'))
+            elif kind == 'wiki':
+                target = m.group('wtarget').strip()
+                if not target:
+                    continue
+                ext = posixpath.splitext(target)[1].lower()
+                if m.group('embed') and ext and ext != '.md':
+                    links.add(('attachment', posixpath.basename(target).lower()))
+                else:
+                    links.add(('wiki', note_name(target)))
+            elif kind == 'image':
+                src = m.group('src').strip('<>')
+                if '://' in src:
+                    continue
+                links.add(('image', posixpath.normpath(posixpath.join(note_dir, src))))
+    return {"tags": sorted(tags), "links": sorted(links), "frontmatter": fields}
+
+class LinkIndex:
+    """
+    Vault 의 태그/링크 영구 색인 (SQLite).
+    - 태그 -> 노트, 노트 -> 나가는 [[링크]]/이미지 참조, 노트별 frontmatter 필드
+    - 마이그레이션 스크립트와 ai_noteguard 가 노트를 쓸 때마다 update_note 로 갱신하므로
+      태그 조회, 고아 노트/깨진 링크 보고에 Vault 전체를 다시 읽을 필요가 없습니다.
+    여러 스레드에서 같이 써도 안전합니다.
+    """
+    def __init__(self, path=INDEX_PATH, root=VAULT_ROOT):
+        self.path = path
+        self.root = root
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        index_dir = os.path.dirname(path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notes (
+                path TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                mtime_ns INTEGER,
+                size INTEGER,
+                frontmatter TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_notes_name ON notes(name);
+            CREATE TABLE IF NOT EXISTS tags (
+                tag TEXT NOT NULL,
+                path TEXT NOT NULL,
+                source TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tags_tag ON tags(tag);
+            CREATE INDEX IF NOT EXISTS idx_tags_path ON tags(path);
+            CREATE TABLE IF NOT EXISTS links (
+                path TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                target TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_links_path ON links(path);
+            CREATE INDEX IF NOT EXISTS idx_links_target ON links(kind, target);
+        """)
+        self._conn.commit()
+
+    def rel_path(self, path):
+        """파일 경로 -> 색인 키 (Vault 기준 상대 경로)"""
+        return normalize_path(os.path.relpath(path, self.root))
+
+    def update_note(self, path, content=None, st=None, extracted=None):
+        """
+        노트 1개의 색인을 갱신합니다. path 는 Vault 안의 파일 경로.
+        이미 뽑아 둔 정보(extracted) 나 본문(content) 이 있으면 파일을 다시 읽지 않습니다.
+        """
+        rel = self.rel_path(path)
+        if extracted is None:
+            if content is None:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+            extracted = extract_note(content, rel)
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                st = None
+        with self._lock:
+            self._delete(rel)
+            self._conn.execute(
+                "INSERT INTO notes VALUES (?, ?, ?, ?, ?)",
+                (rel, note_name(rel), st.st_mtime_ns if st else None, st.st_size if st else None,
+                 json.dumps(extracted["frontmatter"], ensure_ascii=False))
+            )
+            self._conn.executemany("INSERT INTO tags VALUES (?, ?, ?)",
+                                   [(tag, rel, source) for tag, source in extracted["tags"]])
+            self._conn.executemany("INSERT INTO links VALUES (?, ?, ?)",
+                                   [(rel, kind, target) for kind, target in extracted["links"]])
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def remove_note(self, path):
+        with self._lock:
+            self._delete(self.rel_path(path))
+
+    def _delete(self, rel):
+        for table in ("notes", "tags", "links"):
+            self._conn.execute(f"DELETE FROM {table} WHERE path=?", (rel,))
+
+    def sync(self, skip_dir=None):
+        """
+        Vault 를 훑어 크기/mtime 이 바뀐 노트만 다시 색인하고, 사라진 노트는 지웁니다.
+        (처음 한 번 또는 외부에서 파일이 바뀌었을 때) 반환: (갱신 수, 삭제 수)
+        """
+        with self._lock:
+            known = {path: (mtime_ns, size) for path, mtime_ns, size
+                     in self._conn.execute("SELECT path, mtime_ns, size FROM notes")}
+        if skip_dir is None:
+            skip_dir = lambda path: os.path.basename(path).startswith('.')
+        seen = set()
+        updated = 0
+        for path, st in vault_index.scan_markdown(self.root, skip_dir=skip_dir):
+            rel = self.rel_path(path)
+            seen.add(rel)
+            if known.get(rel) != (st.st_mtime_ns, st.st_size):
+                self.update_note(path, st=st)
+                updated += 1
+        removed = [rel for rel in known if rel not in seen]
+        with self._lock:
+            for rel in removed:
+                self._delete(rel)
+        self.commit()
+        return updated, len(removed)
+
+    # --- 조회 ---
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def notes_with_tag(self, tag):
+        return [row[0] for row in self._query(
+            "SELECT DISTINCT path FROM tags WHERE tag=? ORDER BY path", (tag.lstrip('#').lower(),))]
+
+    def tag_counts(self):
+        return self._query("SELECT tag, COUNT(DISTINCT path) AS n FROM tags GROUP BY tag ORDER BY n DESC, tag")
+
+    def outgoing(self, path):
+        return self._query("SELECT kind, target FROM links WHERE path=? ORDER BY kind, target",
+                           (self.rel_path(path),))
+
+    def backlinks(self, name):
+        """노트 이름(또는 경로)을 [[링크]] 하는 노트 목록"""
+        return [row[0] for row in self._query(
+            "SELECT DISTINCT path FROM links WHERE kind='wiki' AND target=? ORDER BY path", (note_name(name),))]
+
+    def frontmatter(self, path):
+        rows = self._query("SELECT frontmatter FROM notes WHERE path=?", (self.rel_path(path),))
+        return json.loads(rows[0][0]) if rows else None
+
+    def orphans(self):
+        """다른 노트에서 [[링크]] 되지 않는 노트"""
+        return [row[0] for row in self._query("""
+            SELECT path FROM notes
+            WHERE NOT EXISTS (
+                SELECT 1 FROM links l WHERE l.kind = 'wiki' AND l.target = notes.name AND l.path != notes.path
+            )
+            ORDER BY path
+        """)]
+
+    def broken_links(self, check_images=True):
+        """(노트, 종류, 대상) 목록: 없는 노트를 가리키는 [[링크]], 없는 파일을 가리키는 이미지"""
+        broken = self._query("""
+            SELECT l.path, l.kind, l.target FROM links l
+            LEFT JOIN notes n ON n.name = l.target
+            WHERE l.kind = 'wiki' AND n.path IS NULL
+            ORDER BY l.path
+        """)
+        if check_images:
+            images = self._query("SELECT path, kind, target FROM links WHERE kind='image' ORDER BY path")
+            exists = {}
+            for path, kind, target in images:
+                if target not in exists:
+                    exists[target] = not target.startswith('../') and os.path.exists(os.path.join(self.root, target))
+                if not exists[target]:
+                    broken.append((path, kind, target))
+        return broken
+
+    def __len__(self):
+        return self._query("SELECT COUNT(*) FROM notes")[0][0]
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_default_index(root=VAULT_ROOT):
+    """프로세스 전체에서 공유하는 색인 (ai_noteguard 워커 스레드용)"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = LinkIndex(INDEX_PATH, root)
+        return _default_index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vault 태그/링크 색인 조회")
+    parser.add_argument("--root", default=VAULT_ROOT, help="Vault 폴더")
+    parser.add_argument("--db", default=INDEX_PATH, help="색인 파일 경로")
+    parser.add_argument("--sync", action="store_true", help="Vault 를 훑어 바뀐 노트만 다시 색인")
+    parser.add_argument("--tag", help="이 태그가 달린 노트 목록")
+    parser.add_argument("--tags", action="store_true", help="태그별 노트 수")
+    parser.add_argument("--backlinks", metavar="NOTE", help="이 노트를 링크하는 노트 목록")
+    parser.add_argument("--orphans", action="store_true", help="어디서도 링크되지 않는 노트")
+    parser.add_argument("--broken", action="store_true", help="깨진 [[링크]] / 이미지 참조")
+    args = parser.parse_args()
+
+    index = LinkIndex(args.db, args.root)
+    start = time.perf_counter()
+    if args.sync:
+        updated, removed = index.sync()
+        print(f"[*] Synced {args.root}: {updated} notes updated, {removed} removed ({len(index)} indexed)")
+    if args.tag:
+        for path in index.notes_with_tag(args.tag):
+            print(path)
+    if args.tags:
+        for tag, count in index.tag_counts():
+            print(f"{count:>6}  #{tag}")
+    if args.backlinks:
+        for path in index.backlinks(args.backlinks):
+            print(path)
+    if args.orphans:
+        for path in index.orphans():
+            print(path)
+    if args.broken:
+        for path, kind, target in index.broken_links():
+            print(f"{path} -> [{kind}] {target}")
+    print(f"[*] Done in {(time.perf_counter() - start) * 1000:.1f} ms")
+    index.close()
@@ -0,0 +1,102 @@
+import re
+import unicodedata
+from urllib.parse import quote, unquote
+
+# 허용된 태그 리스트 (Obsidian에서 태그로 유지할 것들)
+ALLOWED_TAGS = frozenset({
+    'raw', 'code', 'distilled', 'final', 'vp', 'family',
+    'reference', 'checklist', 'it', 'distill', 'unreal', 'disguise'
+})
+
+# 한 번의 스캔으로 처리할 패턴들. 왼쪽부터 매칭되며, 앞쪽 대안이 우선합니다.
+#   fence  : ``` / ~~~ 코드 블록 (닫히지 않으면 문서 끝까지) -> 그대로 유지
+#   header : Markdown 헤더 줄 (# 제목)                     -> 그대로 유지
+#   code   : 인라인 코드 `...`                              -> 그대로 유지
+#   image  : ![alt](Files/...)                              -> 폴더 깊이에 맞게 경로 보정
+#            (이미 ../Files/ 로 보정된 링크는 prefix 그룹에 담기며 그대로 유지)
+#   link   : 링크 대상 ](...)  (#anchor 보호)               -> 그대로 유지 (Files/ 첨부 이름 치환만)
+#   url    : http(s)/ftp URL  (#fragment 보호)              -> 그대로 유지
+#   tag    : 해시태그                                       -> 허용 리스트 외 이스케이프
+# 이미 이스케이프된 \#tag 와 HTML 엔티티 &#123; 는 태그로 보지 않습니다.
+REWRITE_PATTERN = re.compile(r"""
+    (?P<fence>^[ ]{0,3}(?P<fmark>`{3,}|~{3,})[^\n]*
+        (?:\n(?s:.*?)^[ ]{0,3}(?P=fmark)[`~]*[ \t]*$|(?s:.*)))
+  | (?P<header>^\#{1,6}[^\S\n][^\n]*)
+  | (?P<code>(?P<ticks>`+)[^\n]*?(?P=ticks))
+  | (?P<image>!\[(?P<alt>[^\]\n]*)\]\((?P<prefix>(?:\.\./)*)Files/(?P<src>[^)\n]*)\))
+  | (?P<link>\]\([^)\n]*\))
+  | (?P<url>(?:https?|ftp)://[^\s<>()]+)
+  | (?P<tag>(?<![\w\\&])\#(?P<name>[a-zA-Z0-9_가-힣]+))
+""", re.MULTILINE | re.VERBOSE)
+
+# 일반 링크 중 첨부파일을 가리키는 것: ](../Files/doc.pdf)
+FILES_LINK_PATTERN = re.compile(r'\]\((?P<prefix>(?:\.\./)*)Files/(?P<src>[^)\n]*)\)')
+
+def map_attachment(src, image_map):
+    """
+    첨부 이름 치환 (attachment_store 의 링크 치환표). 없는 이름은 그대로.
+    URL 인코딩된 링크(Files/my%20image.png)는 디코딩해 찾고 인코딩된 형태로 돌려줍니다.
+    """
+    name = image_map.get(src)
+    if name is None:
+        name = image_map.get(unicodedata.normalize('NFC', unquote(src)))
+    if name is None:
+        return src
+    if '%' in src:
+        return quote(name, safe="/")
+    if ' ' in name and ' ' not in src:
+        return name.replace(' ', '%20')  # 공백 없는 링크가 공백 있는 이름으로 바뀌면 링크가 깨지므로
+    return name
+
+def rewrite_markdown(content, allowed_tags=ALLOWED_TAGS, image_prefix=None, escape_tags=True, found_tags=None,
+                     image_map=None):
+    """
+    해시태그 정제와 이미지 경로 보정을 한 번의 스캔으로 수행합니다.
+    - allowed_tags 에 없는 해시태그는 \\# 형태로 이스케이프 (소문자 비교)
+    - image_prefix 가 주어지면 ![..](Files/..) -> ![..](<prefix>Files/..)
+    - escape_tags=False 이면 이미지 경로만 보정
+    - found_tags(set)가 주어지면 스캔 중 발견한 태그명(소문자)을 모아 둠 (색인용)
+    - image_map({원래 이름: 대표 이름})이 주어지면 Files/ 를 가리키는 이미지/링크의 첨부 이름을 치환
+    코드 블록, 인라인 코드, 링크 대상, URL, 헤더 줄은 건드리지 않습니다.
+    """
+    # 바꿀 대상이 아예 없으면 스캔 생략
+    has_tags = (escape_tags or found_tags is not None) and '#' in content
+    if not has_tags and ((image_prefix is None and not image_map) or 'Files/' not in content):
+        return content
+
+    def replacer(m):
+        kind = m.lastgroup
+        if kind == 'tag':
+            name = m.group('name')
+            tag = name.lower()
+            if found_tags is not None:
+                found_tags.add(tag)
+            if not escape_tags or tag in allowed_tags:
+                return m.group(0)
+            return f"\\#{name}"
+        if kind == 'image' and (image_prefix is not None or image_map):
+            src = map_attachment(m.group('src'), image_map) if image_map else m.group('src')
+            prefix = m.group('prefix') or image_prefix or ''
+            return f"![{m.group('alt')}]({prefix}Files/{src})"
+        if kind == 'link' and image_map:
+            link = FILES_LINK_PATTERN.fullmatch(m.group(0))
+            if link:
+                return f"]({link.group('prefix')}Files/{map_attachment(link.group('src'), image_map)})"
+        return m.group(0)
+
+    return REWRITE_PATTERN.sub(replacer, content)
+
+def clean_inline_hashtags(content, allowed_tags=ALLOWED_TAGS):
+    """문장 내 해시태그 정제 (허용 리스트 외 이스케이프)"""
+    return rewrite_markdown(content, allowed_tags)
+
+def image_prefix_for_depth(depth):
+    """폴더 깊이만큼 ../ 를 붙인 접두어 (depth 0 -> '')"""
+    return "../" * depth
+
+def image_prefix_for_folder(target_folder):
+    """
+    legacy 에이전트(Editor/Inspector)의 이미지 접두어: Vault 기준 대상 폴더의 '/' 개수만큼 ../
+    (예: '01_Projects' -> '', '01_Projects/MyProject' -> '../')
+    """
+    return image_prefix_for_depth(target_folder.replace('\\', '/').strip('/').count('/'))
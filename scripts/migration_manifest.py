@@ -0,0 +1,148 @@
+import os
+import json
+import threading
+
+# 노트별 진행 상태 (순서대로 진행)
+PENDING = "pending"        # 발견만 됨
+CLASSIFIED = "classified"  # AI 분류 완료 (결과 저장됨, 아직 쓰기 전)
+WRITTEN = "written"        # Vault에 기록 완료
+VERIFIED = "verified"      # 검수(Inspector)까지 완료
+
+DONE_STATES = {WRITTEN, VERIFIED}
+
+class MigrationManifest:
+    """
+    마이그레이션 체크포인트 (JSONL, append-only).
+    상태가 바뀔 때마다 해당 소스 경로의 전체 레코드를 한 줄 추가하고,
+    로드 시에는 경로별 마지막 줄이 최종 상태가 됩니다.
+    프로세스가 중간에 죽어도 마지막으로 flush된 줄까지는 보존됩니다.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.records = {}  # source_path -> record (발견 순서 유지)
+        self._lock = threading.Lock()
+
+        manifest_dir = os.path.dirname(path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+
+        line_count = self._load()
+        # 같은 경로의 갱신 줄이 많이 쌓였으면 한 번 압축
+        if line_count > 2 * max(1, len(self.records)):
+            self._compact()
+        self._fh = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return 0
+        line_count = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line_count += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 크래시로 잘린 마지막 줄은 무시
+                    continue
+                self.records[record["path"]] = record
+        return line_count
+
+    def _compact(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.records.values():
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def paths(self):
+        """기록된 소스 경로 목록 (최초 발견 순서)"""
+        return list(self.records)
+
+    def get(self, source_path):
+        with self._lock:
+            record = self.records.get(source_path)
+            return dict(record) if record else None
+
+    def is_done(self, source_path, verify_target=False):
+        """
+        기록/검수까지 끝난 경로인지. verify_target=True 이면 기록한 대상 파일이
+        그대로 있는지(target_intact)도 확인합니다.
+        """
+        record = self.records.get(source_path)
+        if record is None or record["state"] not in DONE_STATES:
+            return False
+        return not verify_target or target_intact(record)
+
+    def add_pending(self, source_paths):
+        """새로 발견한 경로들을 pending으로 등록 (이미 있는 경로는 건드리지 않음). 새로 등록한 수를 돌려줍니다."""
+        added = 0
+        with self._lock:
+            for source_path in source_paths:
+                if source_path not in self.records:
+                    self._append({"path": source_path, "state": PENDING})
+                    added += 1
+            self._fh.flush()
+        return added
+
+    def mark(self, source_path, state, **fields):
+        """경로의 상태를 갱신하고 즉시 flush 합니다."""
+        with self._lock:
+            record = dict(self.records.get(source_path, {"path": source_path}))
+            record.update(fields)
+            record["state"] = state
+            self._append(record)
+            self._fh.flush()
+
+    def _append(self, record):
+        self.records[record["path"]] = record
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def counts(self):
+        result = {}
+        for record in self.records.values():
+            result[record["state"]] = result.get(record["state"], 0) + 1
+        return result
+
+    def close(self):
+        with self._lock:
+            self._fh.close()
+
+def source_fingerprint(source_path):
+    """재개 시 소스 변경 여부 판단용 (mtime_ns, size)"""
+    st = os.stat(source_path)
+    return st.st_mtime_ns, st.st_size
+
+def target_fields(target_path):
+    """WRITTEN 레코드에 남길 대상 파일 정보 (재개 시 target_intact 로 확인)"""
+    mtime_ns, size = source_fingerprint(target_path)
+    return {"target": target_path, "target_mtime_ns": mtime_ns, "target_size": size}
+
+def target_intact(record):
+    """
+    기록한 대상 파일이 아직 있고 크기/mtime 이 기록 당시와 같은지.
+    대상이 없는 레코드는 그대로 믿고, 크기/mtime 이 없는 이전 형식 레코드는 존재 여부만 봅니다.
+    """
+    target = record.get("target")
+    if not target:
+        return True
+    try:
+        mtime_ns, size = source_fingerprint(target)
+    except OSError:
+        return False
+    if "target_size" not in record:
+        return True
+    return record.get("target_mtime_ns") == mtime_ns and record["target_size"] == size
+
+def reusable_classification(record, mtime_ns, size):
+    """
+    이전 실행에서 분류까지 끝난 레코드이고 소스가 그대로라면 저장된 AI 결과를 돌려줍니다.
+    (기록 후 대상 파일이 사라져 다시 처리하는 경우에도 분류는 재사용)
+    """
+    if not record or record["state"] == PENDING:
+        return None
+    if record.get("mtime_ns") != mtime_ns or record.get("size") != size:
+        return None
+    return record.get("ai_data")
@@ -0,0 +1,355 @@
+import os
+import re
+import time
+import array
+import sqlite3
+import argparse
+import hashlib
+import threading
+import unicodedata
+from frontmatter import split_frontmatter, parse_entries
+import vault_index
+
+# Configuration
+VAULT_ROOT = "Obsidian_Vault"
+INDEX_PATH = ".cache/duplicate_index.sqlite"
+COMMIT_EVERY = 200
+SHINGLE_WORDS = 3       # 단어 3개 단위 shingle
+NUM_PERM = 64           # MinHash 서명 길이
+BANDS = 16              # LSH 밴드 수 (밴드당 NUM_PERM // BANDS 개 값)
+THRESHOLD = 0.8         # 이 이상 (추정 Jaccard 유사도) 이면 거의 같은 노트로 묶음
+INDEX_VERSION = 2       # 색인 형식 (digest 계산 방식이 바뀌면 올림 - 이전 색인은 버리고 다시 만듦)
+# 거의 같은 노트에서 재사용할 frontmatter 키 (분류 결과만; 제목/날짜/별칭은 노트마다 다름)
+CLASSIFICATION_KEYS = ('tags', 'para_folder', 'para', 'category')
+
+BIN_BITS = (NUM_PERM - 1).bit_length()
+ROWS = NUM_PERM // BANDS
+EMPTY = (1 << 64) - 1
+WORD_PATTERN = re.compile(r'\w+')
+
+def note_words(content):
+    """
+    비교용 단어 목록. frontmatter 는 빼고 (AI 가 붙인 요약/태그는 노트마다 다름),
+    NFC + 소문자 + 단어만 남깁니다. (\\#태그 이스케이프, 마크다운 기호, 줄바꿈 차이 무시)
+    """
+    _, body = split_frontmatter(unicodedata.normalize('NFC', content))
+    return WORD_PATTERN.findall(body.lower())
+
+def _hash64(text):
+    # 프로세스마다 달라지는 hash() 대신 고정 해시 (서명을 색인에 저장하므로)
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+def signature(words):
+    """
+    One Permutation MinHash: shingle 해시의 하위 비트로 NUM_PERM 개 구간을 고르고 구간별 최솟값을 남깁니다.
+    (해시 함수 NUM_PERM 개를 돌리는 대신 shingle 당 해시 1번)
+    빈 구간은 오른쪽으로 가장 가까운 구간의 값을 빌려 채웁니다. (rotation densification)
+    """
+    if len(words) < SHINGLE_WORDS:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    mins = [EMPTY] * NUM_PERM
+    mask = NUM_PERM - 1
+    for shingle in shingles:
+        h = _hash64(shingle)
+        b = h & mask
+        v = h >> BIN_BITS
+        if v < mins[b]:
+            mins[b] = v
+    filled = list(mins)
+    for i in range(NUM_PERM):
+        if mins[i] != EMPTY:
+            continue
+        for step in range(1, NUM_PERM):
+            value = mins[(i + step) % NUM_PERM]
+            if value != EMPTY:
+                # 빌려온 거리를 상위 비트에 더해 원래 값과 겹치지 않게 (값은 64 - BIN_BITS 비트)
+                filled[i] = value + (step << (64 - BIN_BITS))
+                break
+    return tuple(filled)
+
+def content_digest(content):
+    """완전 중복 판정용 digest: NFC 로 맞춘 노트 전체 (frontmatter, 마크다운, 대소문자 모두 포함)"""
+    return hashlib.blake2b(unicodedata.normalize('NFC', content).encode('utf-8'), digest_size=16).hexdigest()
+
+def fingerprint(content):
+    """(노트 전체 digest, 본문 단어 MinHash 서명). 단어가 하나도 없으면 None"""
+    words = note_words(content)
+    if not words:
+        return None
+    return content_digest(content), signature(words)
+
+def similarity(sig_a, sig_b):
+    """서명이 일치하는 구간 비율 = Jaccard 유사도 추정치"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERM
+
+def band_keys(sig):
+    """LSH 밴드별 키 [(밴드 번호, 키)]. 한 밴드라도 키가 같으면 비교 후보입니다. (색인에 저장하므로 고정 해시)"""
+    keys = []
+    for band in range(BANDS):
+        data = array.array('Q', sig[band * ROWS:(band + 1) * ROWS]).tobytes()
+        keys.append((band, int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True)))
+    return keys
+
+def _group(entries, threshold):
+    """
+    [(key, digest, 서명), ...] 을 입력 순서대로 묶습니다. (union-find)
+    같은 LSH 버킷에 먼저 들어온 노트와만 비교하므로 비교 횟수는 노트 수 x BANDS 이하입니다.
+    반환: {key: (대표 key, 유사도, 완전 중복 여부)} - 대표가 아닌 항목만
+    """
+    parent = {}
+    order = {}
+    sigs = {}
+    digests = {}
+    by_digest = {}
+    buckets = {}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    def union(a, b):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            # 입력 순서가 앞선 쪽이 대표
+            if order[ra] > order[rb]:
+                ra, rb = rb, ra
+            parent[rb] = ra
+
+    for key, digest, sig in entries:
+        parent[key] = key
+        order[key] = len(order)
+        sigs[key] = sig
+        digests[key] = digest
+        if digest in by_digest:
+            # 완전 중복은 서명 비교 없이 바로
+            union(by_digest[digest], key)
+            continue
+        by_digest[digest] = key
+        for band_key in band_keys(sig):
+            head = buckets.setdefault(band_key, key)
+            if head != key and find(head) != find(key) and similarity(sigs[head], sig) >= threshold:
+                union(head, key)
+
+    result = {}
+    for key in order:
+        rep = find(key)
+        if rep != key:
+            exact = digests[key] == digests[rep]
+            result[key] = (rep, 1.0 if exact else round(similarity(sigs[rep], sigs[key]), 3), exact)
+    return result
+
+def group_duplicates(items, threshold=THRESHOLD):
+    """
+    [(key, content), ...] 를 중복 그룹으로 묶습니다. (LSH 로 후보만 비교하므로 대략 선형 시간)
+    반환: {key: (대표 key, 유사도, 완전 중복 여부)} - 대표가 아닌 항목만 들어 있습니다.
+    대표는 그룹에서 입력 순서상 가장 앞의 항목이고, 단어가 없는 (빈) 노트는 묶지 않습니다.
+    """
+    def entries():
+        for key, content in items:
+            fp = fingerprint(content)
+            if fp is not None:
+                yield (key,) + fp
+    return _group(entries(), threshold)
+
+def classification_frontmatter(content):
+    """content 맨 앞의 frontmatter 에서 분류 항목(CLASSIFICATION_KEYS)만 남긴 YAML 블록 (요약/제목 등은 노트마다 다름)"""
+    block, _ = split_frontmatter(content)
+    lines = [line for key, entry in parse_entries(block)
+             if key is not None and key.lower() in CLASSIFICATION_KEYS for line in entry]
+    return "\n".join(["---"] + lines + ["---"]) + "\n"
+
+def classification_of(path, root=VAULT_ROOT):
+    """
+    Vault 에 이미 있는 노트의 위치와 분류 항목(CLASSIFICATION_KEYS)을 AI 분류 결과 형식으로 돌려줍니다.
+    (거의 같은 노트가 들어왔을 때 AI 호출 없이 같은 분류를 재사용)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    folder = os.path.relpath(os.path.dirname(path), root).replace(os.sep, '/')
+    return {
+        "suggested_folder": "00_Inbox" if folder == "." else folder,
+        "yaml_frontmatter": classification_frontmatter(content),
+    }
+
+class DuplicateIndex:
+    """
+    Vault 노트의 MinHash 서명 색인 (SQLite). ai_noteguard 가 새 노트를 분류하기 전에
+    Vault 에 같은/거의 같은 노트가 있는지 LSH 밴드로 찾는 데 씁니다.
+    여러 스레드에서 같이 써도 안전합니다.
+    """
+    def __init__(self, path=INDEX_PATH, root=VAULT_ROOT):
+        self.path = path
+        self.root = root
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        index_dir = os.path.dirname(path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            # 이전 형식의 digest 는 비교할 수 없으므로 버리고 sync 에서 다시 색인
+            self._conn.executescript("DROP TABLE IF EXISTS notes; DROP TABLE IF EXISTS bands;")
+            self._conn.execute(f"PRAGMA user_version={INDEX_VERSION}")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS notes (
+                path TEXT PRIMARY KEY,
+                digest TEXT,
+                sig BLOB,
+                mtime_ns INTEGER,
+                size INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS bands (band INTEGER, key INTEGER, path TEXT);
+            CREATE INDEX IF NOT EXISTS bands_key ON bands(band, key);
+            CREATE INDEX IF NOT EXISTS bands_path ON bands(path);
+            CREATE INDEX IF NOT EXISTS notes_digest ON notes(digest);
+        """)
+        self._conn.commit()
+
+    def rel_path(self, path):
+        return unicodedata.normalize('NFC', os.path.relpath(path, self.root)).replace(os.sep, '/')
+
+    def _delete(self, rel):
+        self._conn.execute("DELETE FROM notes WHERE path=?", (rel,))
+        self._conn.execute("DELETE FROM bands WHERE path=?", (rel,))
+
+    def update_note(self, path, content=None, st=None):
+        rel = self.rel_path(path)
+        if content is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        if st is None:
+            st = os.stat(path)
+        fp = fingerprint(content)
+        with self._lock:
+            self._delete(rel)
+            if fp is None:
+                # 빈 노트는 비교 대상이 아니지만 sync 가 다시 읽지 않도록 기록
+                self._conn.execute("INSERT INTO notes VALUES (?, NULL, NULL, ?, ?)", (rel, st.st_mtime_ns, st.st_size))
+            else:
+                digest, sig = fp
+                self._conn.execute("INSERT INTO notes VALUES (?, ?, ?, ?, ?)",
+                                   (rel, digest, array.array('Q', sig).tobytes(), st.st_mtime_ns, st.st_size))
+                self._conn.executemany("INSERT INTO bands VALUES (?, ?, ?)",
+                                       [(band, key, rel) for band, key in band_keys(sig)])
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def remove_note(self, path):
+        with self._lock:
+            self._delete(self.rel_path(path))
+
+    def find(self, content, threshold=THRESHOLD, exclude_dir=None):
+        """
+        content 와 같거나 가장 비슷한 Vault 노트를 찾습니다.
+        exclude_dir 안의 노트(예: 아직 분류 전인 Inbox)와 이미 사라진 파일은 후보에서 뺍니다.
+        반환: (Vault 노트 경로, 유사도, 완전 중복 여부) 또는 None
+        """
+        fp = fingerprint(content)
+        if fp is None:
+            return None
+        digest, sig = fp
+        prefix = self.rel_path(exclude_dir) + '/' if exclude_dir else None
+
+        def usable(rel):
+            return (prefix is None or not rel.startswith(prefix)) and os.path.exists(os.path.join(self.root, rel))
+
+        with self._lock:
+            for (rel,) in self._conn.execute("SELECT path FROM notes WHERE digest=? ORDER BY path", (digest,)).fetchall():
+                if usable(rel):
+                    return os.path.join(self.root, rel), 1.0, True
+            candidates = set()
+            for band, key in band_keys(sig):
+                candidates.update(rel for (rel,) in self._conn.execute(
+                    "SELECT path FROM bands WHERE band=? AND key=?", (band, key)))
+            scored = []
+            for rel in candidates:
+                blob = self._conn.execute("SELECT sig FROM notes WHERE path=?", (rel,)).fetchone()[0]
+                scored.append((similarity(sig, array.array('Q', blob)), rel))
+        for score, rel in sorted(scored, key=lambda item: (-item[0], item[1])):
+            if score < threshold:
+                break
+            if usable(rel):
+                return os.path.join(self.root, rel), score, False
+        return None
+
+    def sync(self, skip_dir=None):
+        """Vault 를 훑어 크기/mtime 이 바뀐 노트만 다시 색인하고 사라진 노트는 지웁니다. 반환: (갱신 수, 삭제 수)"""
+        with self._lock:
+            known = {path: (mtime_ns, size) for path, mtime_ns, size
+                     in self._conn.execute("SELECT path, mtime_ns, size FROM notes")}
+        if skip_dir is None:
+            skip_dir = lambda path: os.path.basename(path).startswith('.')
+        seen = set()
+        updated = 0
+        for path, st in vault_index.scan_markdown(self.root, skip_dir=skip_dir):
+            rel = self.rel_path(path)
+            seen.add(rel)
+            if known.get(rel) != (st.st_mtime_ns, st.st_size):
+                self.update_note(path, st=st)
+                updated += 1
+        removed = [rel for rel in known if rel not in seen]
+        with self._lock:
+            for rel in removed:
+                self._delete(rel)
+        self.commit()
+        return updated, len(removed)
+
+    def groups(self, threshold=THRESHOLD):
+        """색인된 Vault 노트의 중복 그룹 [(대표, [(노트, 유사도), ...]), ...]"""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, digest, sig FROM notes WHERE sig IS NOT NULL ORDER BY path").fetchall()
+        duplicates = _group(((path, digest, tuple(array.array('Q', blob))) for path, digest, blob in rows), threshold)
+        members = {}
+        for path, (rep, score, _) in duplicates.items():
+            members.setdefault(rep, []).append((path, score))
+        return sorted(members.items())
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_default_index(root=VAULT_ROOT):
+    """프로세스 전체에서 공유하는 색인 (ai_noteguard 워커 스레드용)"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = DuplicateIndex(INDEX_PATH, root)
+        return _default_index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vault 의 중복/거의 같은 노트 찾기 (MinHash + LSH)")
+    parser.add_argument("--root", default=VAULT_ROOT, help="Vault 폴더")
+    parser.add_argument("--db", default=INDEX_PATH, help="색인 파일 경로")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="거의 같은 노트로 볼 유사도 (0~1)")
+    args = parser.parse_args()
+
+    index = DuplicateIndex(args.db, args.root)
+    start = time.perf_counter()
+    updated, removed = index.sync()
+    print(f"[*] Synced {args.root}: {updated} notes updated, {removed} removed ({time.perf_counter() - start:.2f}s)")
+    start = time.perf_counter()
+    groups = index.groups(args.threshold)
+    for rep, members in groups:
+        print(f"[=] {rep}")
+        for path, score in members:
+            print(f"    {'identical' if score == 1.0 else f'{score:.2f}':>9}  {path}")
+    print(f"[*] {len(groups)} duplicate groups, {sum(len(m) for _, m in groups)} redundant notes "
+          f"({(time.perf_counter() - start) * 1000:.0f} ms)")
+    index.close()
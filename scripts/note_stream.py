@@ -0,0 +1,164 @@
+import re
+import itertools
+from markdown_rewrite import rewrite_markdown
+from frontmatter import normalize_block, merge_blocks
+
+# Configuration
+STREAM_THRESHOLD = 8 * 1024 * 1024   # 이보다 큰 노트(바이트)는 통째로 읽지 않고 스트리밍으로 변환
+CHUNK_CHARS = 256 * 1024             # 한 번에 변환할 최대 글자 수 (스트리밍 모드 메모리 사용량의 상한)
+INDEX_HEAD_CHARS = 1024 * 1024       # 스트리밍으로 쓴 노트에서 색인(태그/링크, 전문 검색)에 넣을 앞부분
+MAX_FRONTMATTER_LINES = 1000         # 여는 '---' 뒤 이 줄 수 안에 닫는 줄이 없으면 frontmatter 가 아님
+
+# markdown_rewrite.REWRITE_PATTERN 의 fence 와 같은 규칙 (줄 단위로 판정)
+FENCE_OPEN_PATTERN = re.compile(r'[ ]{0,3}(`{3,}|~{3,})')
+# frontmatter.FRONTMATTER_PATTERN 의 여는/닫는 줄
+FRONTMATTER_OPEN_PATTERN = re.compile(r'---[ \t]*\n\Z')
+FRONTMATTER_CLOSE_PATTERN = re.compile(r'---[ \t]*\n?\Z')
+
+def is_large(size, threshold=STREAM_THRESHOLD):
+    """크기(바이트)가 threshold 를 넘으면 스트리밍 모드. threshold=None 이면 항상 메모리에서."""
+    return threshold is not None and size > threshold
+
+def iter_pieces(f, chunk_chars=CHUNK_CHARS):
+    """
+    텍스트 파일 f 에서 (조각, 줄 시작 여부) 를 yield 합니다.
+    보통은 한 줄이 한 조각이고, chunk_chars 보다 긴 줄은 마지막 공백 바로 뒤에서 나눕니다.
+    (태그/URL 같은 토큰은 공백을 포함하지 않으므로 나뉜 자리에서 잘리지 않음)
+    단, 공백이 들어갈 수 있는 인라인 코드(`a #b`)나 이미지 alt(![a b](...))는 그 자리에서 나뉠 수 있습니다.
+    그러면 나뉜 뒤쪽 조각은 앞의 문맥 없이 변환됩니다. (아래 iter_blocks 참고)
+    """
+    carry = ''
+    line_start = True
+    while True:
+        raw = f.readline(chunk_chars)
+        piece = carry + raw
+        carry = ''
+        if not piece:
+            return
+        if len(raw) == chunk_chars and not raw.endswith('\n'):
+            # 줄이 더 이어짐
+            cut = max(piece.rfind(' '), piece.rfind('\t')) + 1
+            if cut > 0:
+                piece, carry = piece[:cut], piece[cut:]
+            yield piece, line_start
+            line_start = False
+        else:
+            yield piece, line_start
+            line_start = True
+
+def observe(pieces, callback):
+    """조각을 그대로 흘려보내며 각 조각의 텍스트로 callback 을 호출합니다. (해시 계산 등)"""
+    for piece in pieces:
+        callback(piece[0])
+        yield piece
+
+def iter_blocks(pieces, chunk_chars=CHUNK_CHARS):
+    """
+    iter_pieces 의 조각을 (텍스트, 종류) 로 묶어 yield 합니다.
+      'text' : 코드 블록 밖의 줄들 (chunk_chars 정도까지 모음)
+      'tail' : chunk_chars 보다 긴 줄의 이어지는 조각 (줄 중간에서 시작)
+      'code' : 코드 블록 줄 (여는/닫는 줄 포함) - 변환/검사 대상 아님
+    코드 블록 상태만 줄 단위로 추적합니다. 나머지 패턴은 모두 한 줄 안에서 끝나므로
+    'text' 묶음에 REWRITE_PATTERN 을 적용한 결과는 노트 전체에 적용한 결과와 같습니다.
+    chunk_chars 보다 긴 줄('text' 다음의 'tail' 조각들)에는 이것이 보장되지 않습니다.
+    나뉜 자리에 걸친 인라인 코드나 이미지 링크는 rewrite_markdown 과 다르게 변환될 수 있습니다.
+    (예: 인라인 코드 안의 #태그가 이스케이프되거나, 이미지 경로가 바뀌지 않음)
+    """
+    block = []
+    size = 0
+    fence = None
+    for piece, line_start in pieces:
+        if fence is not None:
+            if line_start and fence.match(piece):
+                fence = None
+            yield piece, 'code'
+            continue
+        opener = FENCE_OPEN_PATTERN.match(piece) if line_start else None
+        if opener is None and line_start:
+            block.append(piece)
+            size += len(piece)
+            if size >= chunk_chars:
+                yield ''.join(block), 'text'
+                block = []
+                size = 0
+            continue
+        if block:
+            yield ''.join(block), 'text'
+            block = []
+            size = 0
+        if opener is not None:
+            fence = re.compile(r'[ ]{0,3}' + re.escape(opener.group(1)) + r'[`~]*[ \t]*\n?\Z')
+            yield piece, 'code'
+        else:
+            yield piece, 'tail'
+    if block:
+        yield ''.join(block), 'text'
+
+def rewrite_stream(pieces, chunk_chars=CHUNK_CHARS, **options):
+    """rewrite_markdown 의 스트리밍 버전. 변환된 텍스트 조각을 yield 합니다. (options: rewrite_markdown 인자)"""
+    for text, kind in iter_blocks(pieces, chunk_chars):
+        if kind == 'text':
+            yield rewrite_markdown(text, **options)
+        elif kind == 'tail':
+            # 줄 중간에서 시작하는 조각: 탭을 붙여 줄 맨 앞 규칙(헤더/코드 블록)이 적용되지 않게
+            yield rewrite_markdown('\t' + text, **options)[1:]
+        else:
+            yield text
+
+def split_frontmatter_stream(pieces):
+    """
+    frontmatter.split_frontmatter 의 스트리밍 버전.
+    (frontmatter 안쪽 텍스트 또는 None, 원래 frontmatter 부분 텍스트, 본문 조각 iterator) 를 돌려줍니다.
+    """
+    pieces = iter(pieces)
+    first = next(pieces, None)
+    if first is None or not (first[1] and FRONTMATTER_OPEN_PATTERN.match(first[0])):
+        return None, '', itertools.chain([first] if first else [], pieces)
+    head = [first]
+    for piece in pieces:
+        head.append(piece)
+        if piece[1] and FRONTMATTER_CLOSE_PATTERN.match(piece[0]):
+            inner = ''.join(text for text, _ in head[1:-1])
+            return inner[:-1] if inner.endswith('\n') else inner, ''.join(text for text, _ in head), pieces
+        if len(head) > MAX_FRONTMATTER_LINES:
+            break
+    return None, '', itertools.chain(head, pieces)
+
+def merge_frontmatter_stream(pieces, ai_frontmatter, chunk_chars=CHUNK_CHARS, **options):
+    """
+    frontmatter.merge_frontmatter 의 스트리밍 버전.
+    병합한 frontmatter 를 먼저, 이어서 rewrite_markdown(options) 으로 변환한 본문 조각을 yield 합니다.
+    """
+    incoming = normalize_block(ai_frontmatter)
+    existing, head, body = split_frontmatter_stream(pieces)
+    if existing is None:
+        yield f"---\n{incoming}\n---\n\n" if incoming else "---\n---\n\n"
+    else:
+        merged = merge_blocks(existing, incoming)
+        yield head if merged is existing else f"---\n{merged}\n---\n"
+    yield from rewrite_stream(body, chunk_chars, **options)
+
+class HeadSample:
+    """
+    흘려보내는 텍스트 조각의 앞부분 limit 자만 모아 둡니다.
+    스트리밍으로 쓴 큰 노트는 본문 전체 대신 이 앞부분으로 색인합니다.
+    """
+    def __init__(self, limit=INDEX_HEAD_CHARS):
+        self.limit = limit
+        self._parts = []
+        self._size = 0
+
+    def tee(self, chunks):
+        for chunk in chunks:
+            if self._size < self.limit:
+                part = chunk[:self.limit - self._size]
+                self._parts.append(part)
+                self._size += len(part)
+            yield chunk
+
+    @property
+    def text(self):
+        text = ''.join(self._parts)
+        if self._size >= self.limit and '\n' in text:
+            text = text[:text.rfind('\n') + 1]  # 잘린 마지막 줄은 버림
+        return text
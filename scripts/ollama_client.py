@@ -0,0 +1,164 @@
+import json
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+# Configuration
+OLLAMA_URL = "http://localhost:11434/api/generate"
+EMBED_PATH = "/api/embed"
+CONNECT_TIMEOUT = 5       # 연결 수립 제한 (초)
+REQUEST_TIMEOUT = 60      # 요청 1건 전체 제한 (초), 스트리밍 중 토큰 사이 대기에도 적용
+MAX_RETRIES = 3           # 연결 실패/타임아웃/5xx 재시도 횟수
+BACKOFF_BASE = 0.5        # 재시도 대기 기본값 (초), 지수 증가 + jitter
+MAX_CONCURRENCY = 4       # 같은 서버로 동시에 보낼 수 있는 최대 요청 수
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class _RetryableStatus(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+class JsonCompletion:
+    """
+    스트리밍으로 들어오는 텍스트에서 최상위 JSON 객체가 닫히는 지점을 찾습니다.
+    문자열 안의 괄호와 이스케이프는 무시합니다.
+    """
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.started = False
+        self.length = 0
+
+    def feed(self, text):
+        """text 를 이어 붙였을 때 객체가 닫히면 누적 문자열 기준 끝 위치를, 아니면 -1 을 돌려줍니다."""
+        for i, ch in enumerate(text):
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in '{[':
+                self.depth += 1
+                self.started = True
+            elif ch in '}]':
+                self.depth -= 1
+                if self.started and self.depth == 0:
+                    end = self.length + i + 1
+                    self.length += len(text)
+                    return end
+        self.length += len(text)
+        return -1
+
+class OllamaClient:
+    """
+    Ollama /api/generate 용 공유 클라이언트.
+    - keep-alive 세션 재사용 (요청마다 새 연결을 만들지 않음)
+    - 요청별 타임아웃, 지수 백오프 + jitter 재시도
+    - 스트리밍으로 토큰을 받다가 JSON 객체가 닫히는 즉시 응답을 끊어 생성 시간 절약
+    - 세마포어로 동시 요청 수 제한 (로컬 모델 서버 과부하 방지)
+    """
+    def __init__(self, url=OLLAMA_URL, max_concurrency=MAX_CONCURRENCY, timeout=REQUEST_TIMEOUT,
+                 retries=MAX_RETRIES, stream=True):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.stream = stream
+        self._limiter = threading.BoundedSemaphore(max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def generate_json(self, model, prompt):
+        """모델 응답을 JSON(dict)으로 파싱해 돌려줍니다. 실패 시 None."""
+        return self._with_retries(self._request, model, prompt)
+
+    def embed(self, model, texts):
+        """텍스트 목록의 임베딩 벡터 목록 (같은 서버의 /api/embed). 실패 시 None."""
+        return self._with_retries(self._embed_request, model, texts)
+
+    def _with_retries(self, request, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                with self._limiter:
+                    return request(*args)
+            except (requests.ConnectionError, requests.Timeout, _RetryableStatus) as e:
+                if attempt == self.retries:
+                    print(f"[!] Ollama Error: {e} (gave up after {attempt + 1} attempts)")
+                    return None
+                time.sleep(BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random()))
+            except (ValueError, KeyError) as e:
+                print(f"[!] Ollama Error: invalid JSON response - {e}")
+                return None
+            except requests.RequestException as e:
+                print(f"[!] Ollama Error: {e}")
+                return None
+        return None
+
+    def _request(self, model, prompt):
+        payload = {"model": model, "prompt": prompt, "format": "json", "stream": self.stream}
+        deadline = time.monotonic() + self.timeout
+        response = self.session.post(self.url, json=payload, stream=self.stream,
+                                     timeout=(CONNECT_TIMEOUT, self.timeout))
+        with response:
+            if response.status_code in RETRY_STATUS:
+                raise _RetryableStatus(response.status_code)
+            if response.status_code != 200:
+                raise requests.HTTPError(f"HTTP {response.status_code}")
+            if not self.stream:
+                return json.loads(response.json()['response'])
+            return self._consume_stream(response, deadline)
+
+    def _embed_request(self, model, texts):
+        url = self.url.rsplit('/api/', 1)[0] + EMBED_PATH
+        response = self.session.post(url, json={"model": model, "input": texts},
+                                     timeout=(CONNECT_TIMEOUT, self.timeout))
+        with response:
+            if response.status_code in RETRY_STATUS:
+                raise _RetryableStatus(response.status_code)
+            if response.status_code != 200:
+                raise requests.HTTPError(f"HTTP {response.status_code}")
+            embeddings = response.json()['embeddings']
+            if len(embeddings) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+            return embeddings
+
+    def _consume_stream(self, response, deadline):
+        chunks = []
+        completion = JsonCompletion()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            if time.monotonic() > deadline:
+                raise requests.Timeout(f"no complete JSON within {self.timeout}s")
+            event = json.loads(line)
+            token = event.get('response', '')
+            chunks.append(token)
+            end = completion.feed(token)
+            if end >= 0:
+                # 객체가 닫히면 나머지 생성은 기다리지 않고 연결을 끊음
+                return json.loads(''.join(chunks)[:end])
+            if event.get('done'):
+                break
+        return json.loads(''.join(chunks))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_client(url=OLLAMA_URL, max_concurrency=MAX_CONCURRENCY):
+    """
+    같은 서버 URL 을 쓰는 모든 호출자가 세션과 동시성 제한을 공유하도록 URL 별 인스턴스를 돌려줍니다.
+    max_concurrency 는 해당 URL 로 처음 호출될 때만 적용됩니다.
+    """
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = OllamaClient(url, max_concurrency=max_concurrency)
+        return _clients[url]
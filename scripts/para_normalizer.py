@@ -0,0 +1,157 @@
+import re
+import random
+import argparse
+from functools import lru_cache
+
+# PARA 표준 폴더 (번호 순)
+PARA_FOLDERS = ('00_Inbox', '01_Projects', '02_Areas', '03_Resources', '04_Archives')
+
+# 우선순위: 명시적 번호가 있는 경우 -> 키워드만 있는 경우
+# (?:...) : non-capturing group, 모두 대소문자 무시
+MAPPING_RULES = [
+    (r'^0?0_?(?:Inbox|인박스)', '00_Inbox'),
+    (r'^0?1_?(?:Projects?|프로젝트)', '01_Projects'),
+    (r'^0?2_?(?:Areas?|영역)', '02_Areas'),
+    (r'^0?3_?(?:Resources?|자료)', '03_Resources'),
+    (r'^0?4_?(?:Archives?|보관)|99_?Archive', '04_Archives'),
+    # 번호 없이 키워드만 시작하는 경우
+    (r'^Projects?', '01_Projects'),
+    (r'^Areas?', '02_Areas'),
+    (r'^Resources?', '03_Resources'),
+    (r'^Archives?', '04_Archives'),
+]
+
+# 규칙 순서가 결과를 좌우하므로 (앞 규칙이 우선) 개별 패턴은 순서대로 적용하되,
+# 어느 규칙에도 걸리지 않는 입력은 합친 패턴 한 번으로 걸러냅니다.
+_COMPILED_RULES = [(re.compile(pattern, re.IGNORECASE), target) for pattern, target in MAPPING_RULES]
+_ANY_RULE = re.compile('|'.join(f'(?:{pattern})' for pattern, _ in MAPPING_RULES), re.IGNORECASE)
+
+# 번호 없이 키워드가 중간에 있는 경우
+_KEYWORD_RULES = [
+    (kw.lower(), re.compile(r'^' + kw + r's?', re.IGNORECASE), target)
+    for kw, target in [
+        ('Project', '01_Projects'),
+        ('Area', '02_Areas'),
+        ('Resource', '03_Resources'),
+        ('Archive', '04_Archives'),
+    ]
+]
+_NUMBERED = re.compile(r'^\d+_')
+_PARA_SET = frozenset(PARA_FOLDERS)
+
+@lru_cache(maxsize=4096)
+def standardize_folder(raw_folder):
+    """
+    AI가 제안한 폴더명을 PARA 표준 경로로 정규화합니다.
+    AI는 비슷한 폴더명을 반복해서 돌려주므로 결과를 LRU 캐시에 보관합니다.
+    """
+    raw_folder = raw_folder or "00_Inbox"
+
+    suggested_folder = raw_folder
+    if _ANY_RULE.search(raw_folder):
+        for pattern, target in _COMPILED_RULES:
+            if pattern.search(raw_folder):
+                # 매칭된 '부분'만 표준 이름으로 교체 (경로 나머지는 보존)
+                suggested_folder = pattern.sub(target, raw_folder, count=1)
+                break
+
+    # 만약 매칭되는 게 전혀 없다면 (단순 키워드가 중간에 있거나 앞에 번호가 없는 경우)
+    if suggested_folder == raw_folder and not _NUMBERED.match(raw_folder):
+        lowered = raw_folder.lower()
+        for kw, pattern, target in _KEYWORD_RULES:
+            if kw in lowered:
+                # 이미 키워드로 시작하면 (예: 'Projects/...' -> '01_Projects/...')
+                if pattern.search(raw_folder):
+                    suggested_folder = pattern.sub(target, raw_folder, count=1)
+                # 중간에 키워드가 있는 경우 그냥 앞에 붙임 (단, 중복 방지)
+                elif not raw_folder.startswith(target):
+                    suggested_folder = target + "/" + raw_folder.lstrip("/")
+                break
+
+    # 최종 보정: "02_Areas/02_Areas", "01_Projects/Projects" 같은 중복 병합
+    new_parts = []
+    for p in suggested_folder.replace("\\", "/").split('/'):
+        p = p.strip()
+        if not p:
+            continue
+        if new_parts:
+            last = new_parts[-1]
+            if p.lower() == last.lower():
+                continue
+            if last in _PARA_SET and p.lower() in last.lower():
+                continue
+        new_parts.append(p)
+    return "/".join(new_parts)
+
+# --- 검증용: 정규화 모듈 도입 전 LibrarianAgent.get_standardized_path 구현 ---
+
+def _reference_standardize(ai_suggested_folder):
+    raw_folder = ai_suggested_folder or "00_Inbox"
+    suggested_folder = raw_folder
+    for pattern, target in MAPPING_RULES:
+        if re.search(pattern, raw_folder, re.IGNORECASE):
+            suggested_folder = re.sub(pattern, target, raw_folder, count=1, flags=re.IGNORECASE)
+            break
+    if suggested_folder == raw_folder and not re.match(r'^\d+_', raw_folder):
+        for kw, target in [('Project', '01_Projects'), ('Area', '02_Areas'),
+                           ('Resource', '03_Resources'), ('Archive', '04_Archives')]:
+            if kw.lower() in raw_folder.lower():
+                pattern = r'^' + kw + r's?'
+                if re.search(pattern, raw_folder, re.IGNORECASE):
+                    suggested_folder = re.sub(pattern, target, raw_folder, count=1, flags=re.IGNORECASE)
+                else:
+                    if not raw_folder.startswith(target):
+                        suggested_folder = target + "/" + raw_folder.lstrip("/")
+                break
+    parts = suggested_folder.replace("\\", "/").split('/')
+    new_parts = []
+    for p in parts:
+        p = p.strip()
+        if not p: continue
+        if not new_parts or p.lower() != new_parts[-1].lower():
+            is_duplicate = False
+            for _, standard in MAPPING_RULES[:5]:
+                if p.lower() in standard.lower() and new_parts and new_parts[-1] == standard:
+                    is_duplicate = True
+                    break
+            if not is_duplicate:
+                new_parts.append(p)
+    return "/".join(new_parts)
+
+# 무작위 입력 생성용 조각 (번호, 구분자, 키워드의 대소문자/단복수/한글 변형, 일반 단어)
+_FRAGMENTS = [
+    "", "0", "00", "01", "1", "02", "2", "03", "04", "4", "99", "_", " ", "-",
+    "Inbox", "inbox", "인박스", "Project", "Projects", "PROJECTS", "project", "프로젝트",
+    "Area", "Areas", "areas", "영역", "Resource", "Resources", "resources", "자료",
+    "Archive", "Archives", "archive", "보관", "01_Projects", "02_Areas", "03_Resources",
+    "04_Archives", "00_Inbox", "/", "/", "//", "\\", "s", "x", "Proj", "DS15", "메모", "Misc",
+]
+
+def _random_folder(rng):
+    return "".join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(0, 8)))
+
+def self_check(cases=20000, seed=0):
+    """무작위 입력에 대해 기존 구현과 결과가 같은지, 출력 경로에 빈 구간이 없는지 확인합니다."""
+    rng = random.Random(seed)
+    inputs = [None, "", "/", "Projects", "01_Project/01_Projects/x", "Foo/99_Archive"]
+    inputs += [_random_folder(rng) for _ in range(cases)]
+    failures = 0
+    for raw in inputs:
+        expected = _reference_standardize(raw)
+        actual = standardize_folder(raw)
+        if actual != expected or (actual and "" in actual.split("/")):
+            failures += 1
+            if failures <= 10:
+                print(f"[!] Mismatch for {raw!r}: expected {expected!r}, got {actual!r}")
+    print(f"[*] Checked {len(inputs)} inputs, {failures} mismatches. Cache: {standardize_folder.cache_info()}")
+    return failures == 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PARA 폴더명 정규화")
+    parser.add_argument("folders", nargs="*", help="정규화할 폴더명")
+    parser.add_argument("--selfcheck", type=int, metavar="N", help="무작위 입력 N개로 기존 구현과 비교")
+    args = parser.parse_args()
+    if args.selfcheck:
+        raise SystemExit(0 if self_check(args.selfcheck) else 1)
+    for folder in args.folders:
+        print(f"{folder} -> {standardize_folder(folder)}")
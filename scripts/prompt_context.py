@@ -0,0 +1,85 @@
+import os
+import re
+from markdown_rewrite import rewrite_markdown
+
+# Configuration
+# skills/note-classification.md: 분류에는 앞부분 500자 정도면 충분.
+# 요약/frontmatter 생성 품질을 위해 기본값은 조금 여유 있게 둡니다.
+HEAD_CHARS = 1000
+MAX_HEADINGS = 30
+MAX_TAGS = 30
+
+# 코드 블록 안의 '# 주석' 줄은 헤더로 보지 않음
+HEADING_PATTERN = re.compile(
+    r"(?P<fence>^[ ]{0,3}(?P<fmark>`{3,}|~{3,})[^\n]*(?:\n(?s:.*?)^[ ]{0,3}(?P=fmark)[`~]*[ \t]*$|(?s:.*)))"
+    r"|(?P<heading>^#{1,6}[ \t]+[^\n]+)",
+    re.MULTILINE
+)
+
+def estimate_tokens(text):
+    """
+    토큰 수 대략 추정 (로그용).
+    영문/숫자는 약 4자당 1토큰, 한글 등 비ASCII는 약 1.5자당 1토큰으로 계산합니다.
+    (한글은 UTF-8 3바이트이므로 바이트 수 차이로 비ASCII 글자 수를 근사)
+    """
+    non_ascii = (len(text.encode('utf-8')) - len(text)) // 2
+    return int((len(text) - non_ascii) / 4 + non_ascii / 1.5) + 1
+
+def extract_headings(content, limit=MAX_HEADINGS):
+    headings = []
+    for m in HEADING_PATTERN.finditer(content):
+        if m.lastgroup == 'heading':
+            headings.append(m.group('heading').strip())
+            if len(headings) >= limit:
+                break
+    return headings
+
+class ContextBuilder:
+    """
+    LLM 프롬프트에 넣을 노트 본문을 일정 크기 이하로 만듭니다.
+    짧은 노트는 그대로, 긴 노트는 (파일명 + 태그 목록 + 헤더 목차 + 앞부분 head_chars 자)로 요약합니다.
+    """
+    def __init__(self, head_chars=HEAD_CHARS, max_headings=MAX_HEADINGS, max_tags=MAX_TAGS):
+        self.head_chars = head_chars
+        self.max_headings = max_headings
+        self.max_tags = max_tags
+
+    @property
+    def signature(self):
+        """캐시 키에 포함할 설정 서명 (설정이 바뀌면 다른 프롬프트로 취급)"""
+        return f"\n<!-- context: head={self.head_chars} headings={self.max_headings} tags={self.max_tags} -->"
+
+    def build(self, content, filename=None):
+        if len(content) <= self.head_chars:
+            return content
+
+        parts = []
+        if filename:
+            parts.append(f"Filename: {os.path.splitext(filename)[0]}")
+
+        found_tags = set()
+        rewrite_markdown(content, escape_tags=False, found_tags=found_tags)
+        if found_tags:
+            tags = sorted(found_tags)[:self.max_tags]
+            parts.append("Tags: " + ", ".join(f"#{tag}" for tag in tags))
+
+        headings = extract_headings(content, self.max_headings)
+        if headings:
+            parts.append("Outline:\n" + "\n".join(headings))
+
+        parts.append(f"Beginning of note:\n{content[:self.head_chars]}")
+        parts.append(f"(... {len(content) - self.head_chars} more characters omitted)")
+        return "\n\n".join(parts)
+
+    def build_prompt(self, prompt_template, content, filename=None, stats=None):
+        """
+        프롬프트를 만들고, stats(dict)가 주어지면 추정 토큰 수를 기록합니다.
+        prompt_tokens: 실제로 보내는 프롬프트, note_tokens: 노트 전체를 넣었을 때의 본문
+        """
+        note_context = self.build(content, filename)
+        prompt = prompt_template.replace("{{note_content}}", note_context)
+        if stats is not None:
+            stats["prompt_tokens"] = estimate_tokens(prompt)
+            stats["note_tokens"] = estimate_tokens(content)
+            stats["truncated"] = note_context is not content
+        return prompt
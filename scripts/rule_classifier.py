@@ -0,0 +1,129 @@
+import re
+import threading
+from collections import Counter
+from markdown_rewrite import ALLOWED_TAGS, rewrite_markdown
+from frontmatter import read_frontmatter, split_frontmatter, parse_entries, list_items
+from para_normalizer import PARA_FOLDERS, standardize_folder
+
+# Priority 1 (skills/note-classification.md): 파일명에 프로젝트 코드가 있으면 01_Projects
+FILENAME_KEYWORDS = {
+    'DS15': '01_Projects/DS15',
+    'PMDS': '01_Projects/PMDS',
+}
+
+# 기존 frontmatter 에서 폴더로 인정할 키 (이 파이프라인이 쓰는 키만, 사용자의 folder:/para: 같은 일반 키는 제외)
+FRONTMATTER_KEYS = ('suggested_folder', 'para_folder')
+
+# 소스(UpNote 노트북) 폴더명이 이미 PARA 형태인 경우 (예: '01 Projects', 'Areas', '자료')
+PARA_FOLDER_PATTERN = re.compile(
+    r'^(?:(?:0?[0-4]|99)[_\s]?)?(?P<category>Projects?|Areas?|Resources?|Archives?|Inbox|프로젝트|영역|자료|보관|인박스)$',
+    re.IGNORECASE
+)
+PARA_CANONICAL = {
+    'project': '01_Projects', 'projects': '01_Projects', '프로젝트': '01_Projects',
+    'area': '02_Areas', 'areas': '02_Areas', '영역': '02_Areas',
+    'resource': '03_Resources', 'resources': '03_Resources', '자료': '03_Resources',
+    'archive': '04_Archives', 'archives': '04_Archives', '보관': '04_Archives',
+    'inbox': '00_Inbox', '인박스': '00_Inbox',
+}
+
+# 허용 태그 중 폴더를 확정할 수 있는 것 (frontmatter 의 tags 에 있을 때만; 본문에 한 번 언급된 태그는 근거가 약해 AI 로 넘김)
+# 서로 다른 폴더를 가리키는 태그가 섞여도 AI 로 넘김
+TAG_FOLDERS = {
+    'family': '02_Areas/Family',
+    'unreal': '03_Resources/Unreal',
+    'disguise': '03_Resources/Disguise',
+}
+
+def make_frontmatter(tags):
+    # 노트에는 태그만 병합 (폴더와 분류 규칙은 ai_data 의 suggested_folder/classified_by 로만 전달)
+    kept = sorted(tag for tag in tags if tag in ALLOWED_TAGS)
+    lines = ["---"]
+    if kept:
+        lines.append(f"tags: [{', '.join(kept)}]")
+    lines.append("---")
+    return "\n".join(lines)
+
+def frontmatter_folder(value):
+    """frontmatter 의 폴더 값 -> 정규화한 PARA 경로. '..' 가 있거나 PARA 루트 아래가 아니면 None"""
+    if any(part.strip() in ('.', '..') for part in value.replace('\\', '/').split('/')):
+        return None
+    folder = standardize_folder(value)
+    return folder if folder.split('/')[0] in PARA_FOLDERS else None
+
+def frontmatter_tags(content):
+    """frontmatter 의 tags 항목 (소문자, '#' 제거)"""
+    block, _ = split_frontmatter(content)
+    for key, lines in parse_entries(block):
+        if key is not None and key.lower() == 'tags':
+            return {item.lstrip('#').lower() for item in list_items(lines)}
+    return set()
+
+class RuleClassifier:
+    """
+    LLM 호출 전에 확실한 경우만 규칙으로 분류하는 빠른 경로.
+    우선순위: 파일명 키워드 -> 기존 frontmatter -> 소스 폴더명 -> frontmatter 의 허용 태그.
+    애매하면 None 을 돌려주고, 호출자는 AI 분석으로 넘어갑니다.
+    규칙별 적중 횟수는 report() 로 출력합니다. (여러 스레드에서 호출해도 안전)
+    """
+    def __init__(self, filename_keywords=FILENAME_KEYWORDS, tag_folders=TAG_FOLDERS):
+        self.filename_keywords = {k.upper(): v for k, v in filename_keywords.items()}
+        self.tag_folders = tag_folders
+        self.hits = Counter()
+        self._lock = threading.Lock()
+
+    def classify(self, content, filename=None, source_dir=None):
+        """ai_data 형태의 dict (suggested_folder, yaml_frontmatter, classified_by) 또는 None"""
+        rule, folder = self._match(content, filename, source_dir)
+        with self._lock:
+            self.hits[rule or 'llm'] += 1
+        if rule is None:
+            return None
+        # 태그 수집은 규칙이 맞은 노트만 (대부분은 AI 로 넘어가고 거기서 다시 변환됨)
+        found_tags = set()
+        if '#' in content:
+            rewrite_markdown(content, escape_tags=False, found_tags=found_tags)
+        return {
+            "suggested_folder": folder,
+            "yaml_frontmatter": make_frontmatter(found_tags),
+            "classified_by": f"rule/{rule}",
+        }
+
+    def _match(self, content, filename, source_dir):
+        if filename:
+            upper = filename.upper()
+            folders = {folder for kw, folder in self.filename_keywords.items() if kw in upper}
+            if len(folders) == 1:
+                return 'filename_keyword', folders.pop()
+
+        if content.startswith('---'):
+            fields = read_frontmatter(content)
+            for key in FRONTMATTER_KEYS:
+                folder = frontmatter_folder(fields[key]) if fields.get(key) else None
+                if folder:
+                    return 'frontmatter', folder
+
+        if source_dir and source_dir != '.':
+            top, _, rest = source_dir.replace('\\', '/').partition('/')
+            m = PARA_FOLDER_PATTERN.match(top.strip())
+            if m:
+                canonical = PARA_CANONICAL[m.group('category').lower()]
+                return 'source_folder', f"{canonical}/{rest}" if rest else canonical
+
+        if self.tag_folders and content.startswith('---'):
+            folders = {self.tag_folders[tag] for tag in frontmatter_tags(content) if tag in self.tag_folders}
+            if len(folders) == 1:
+                return 'tag', folders.pop()
+
+        return None, None
+
+    def report(self):
+        with self._lock:
+            hits = dict(self.hits)
+        total = sum(hits.values())
+        if not total:
+            return
+        resolved = total - hits.get('llm', 0)
+        print(f"    - Rule fast-path: {resolved}/{total} resolved without LLM")
+        for rule, count in sorted(hits.items(), key=lambda item: -item[1]):
+            print(f"        {rule}: {count}")
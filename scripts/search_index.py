@@ -0,0 +1,217 @@
+import os
+import re
+import time
+import sqlite3
+import argparse
+import threading
+import posixpath
+import unicodedata
+from frontmatter import split_frontmatter, read_frontmatter
+import vault_index
+
+# Configuration
+VAULT_ROOT = "Obsidian_Vault"
+INDEX_PATH = ".cache/search_index.sqlite"
+COMMIT_EVERY = 200
+TITLE_WEIGHT = 5.0      # bm25 가중치: 제목 일치를 본문보다 우선
+# 스니펫 길이 (토큰 수: trigram 은 거의 글자 수, unicode61 은 단어 수)
+SNIPPET_TOKENS = {"fts_tri": 48, "fts_word": 12}
+
+# 두 가지 FTS5 색인을 같은 본문 테이블(docs) 위에 둡니다.
+#   fts_tri  : trigram 토크나이저 - 띄어쓰기 없는 한국어 합성어/조사 안쪽까지 부분 문자열로 검색 (3글자 이상)
+#   fts_word : unicode61 토크나이저 - 2글자 이하 검색어를 단어 접두어로 검색 ('회의' -> '회의에서')
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    mtime_ns INTEGER,
+    size INTEGER
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts_tri USING fts5(
+    title, body, content='docs', content_rowid='id', tokenize='trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS fts_word USING fts5(
+    title, body, content='docs', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+    INSERT INTO fts_tri(rowid, title, body) VALUES (new.id, new.title, new.body);
+    INSERT INTO fts_word(rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+    INSERT INTO fts_tri(fts_tri, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+    INSERT INTO fts_word(fts_word, rowid, title, body) VALUES ('delete', old.id, old.title, old.body);
+END;
+"""
+
+MIN_TRIGRAM = 3
+
+def normalize_text(text):
+    """맥에서 온 NFD(자소 분리) 텍스트도 같은 토큰이 되도록 NFC 로 통일"""
+    return unicodedata.normalize('NFC', text)
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def build_queries(query):
+    """
+    검색어를 (trigram MATCH 식, 단어 접두어 MATCH 식) 으로 나눕니다. (모든 검색어 AND)
+    3글자 이상은 trigram 부분 문자열, 그보다 짧은 검색어는 단어 접두어로 찾습니다.
+    """
+    terms = [t for t in re.split(r'\s+', normalize_text(query).strip().strip('"')) if t]
+    long_terms = [_quote(t) for t in terms if len(t) >= MIN_TRIGRAM]
+    short_terms = [_quote(t) + '*' for t in terms if len(t) < MIN_TRIGRAM]
+    return " AND ".join(long_terms) or None, " AND ".join(short_terms) or None
+
+class SearchIndex:
+    """
+    Vault 전문 검색 색인 (SQLite FTS5).
+    마이그레이션 스크립트와 ai_noteguard 가 노트를 쓸 때마다 update_note 로 갱신하고,
+    search() 는 bm25 순위와 일치 부분 스니펫을 돌려줍니다.
+    여러 스레드에서 같이 써도 안전합니다.
+    """
+    def __init__(self, path=INDEX_PATH, root=VAULT_ROOT):
+        self.path = path
+        self.root = root
+        self._lock = threading.Lock()
+        self._pending = 0
+
+        index_dir = os.path.dirname(path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def rel_path(self, path):
+        return normalize_text(os.path.relpath(path, self.root)).replace(os.sep, '/')
+
+    def update_note(self, path, content=None, st=None):
+        """노트 1개를 (다시) 색인합니다. content 가 있으면 파일을 다시 읽지 않습니다."""
+        rel = self.rel_path(path)
+        if content is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+        if st is None:
+            st = os.stat(path)
+        content = normalize_text(content)
+        _, body = split_frontmatter(content)
+        title = read_frontmatter(content).get('title') or posixpath.splitext(posixpath.basename(rel))[0]
+        with self._lock:
+            self._conn.execute("DELETE FROM docs WHERE path=?", (rel,))
+            self._conn.execute(
+                "INSERT INTO docs (path, title, body, mtime_ns, size) VALUES (?, ?, ?, ?, ?)",
+                (rel, title, body, st.st_mtime_ns, st.st_size)
+            )
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def remove_note(self, path):
+        with self._lock:
+            self._conn.execute("DELETE FROM docs WHERE path=?", (self.rel_path(path),))
+
+    def sync(self, skip_dir=None):
+        """Vault 를 훑어 크기/mtime 이 바뀐 노트만 다시 색인하고 사라진 노트는 지웁니다. 반환: (갱신 수, 삭제 수)"""
+        with self._lock:
+            known = {path: (mtime_ns, size) for path, mtime_ns, size
+                     in self._conn.execute("SELECT path, mtime_ns, size FROM docs")}
+        if skip_dir is None:
+            skip_dir = lambda path: os.path.basename(path).startswith('.')
+        seen = set()
+        updated = 0
+        for path, st in vault_index.scan_markdown(self.root, skip_dir=skip_dir):
+            rel = self.rel_path(path)
+            seen.add(rel)
+            if known.get(rel) != (st.st_mtime_ns, st.st_size):
+                self.update_note(path, st=st)
+                updated += 1
+        removed = [rel for rel in known if rel not in seen]
+        with self._lock:
+            self._conn.executemany("DELETE FROM docs WHERE path=?", [(rel,) for rel in removed])
+        self.commit()
+        return updated, len(removed)
+
+    def search(self, query, limit=10):
+        """[{path, title, snippet, score}] (점수가 낮을수록 관련도 높음, bm25)"""
+        tri_query, word_query = build_queries(query)
+        if tri_query is None and word_query is None:
+            return []
+        # 스니펫/순위는 검색어가 있는 색인 기준 (긴 검색어 우선)
+        table = "fts_tri" if tri_query else "fts_word"
+        sql = (f"SELECT d.path, d.title, snippet({table}, 1, '[', ']', '…', {SNIPPET_TOKENS[table]}), "
+               f"bm25({table}, {TITLE_WEIGHT}, 1.0) AS score "
+               f"FROM {table} JOIN docs d ON d.id = {table}.rowid WHERE {table} MATCH ?")
+        params = [tri_query or word_query]
+        if tri_query and word_query:
+            sql += " AND d.id IN (SELECT rowid FROM fts_word WHERE fts_word MATCH ?)"
+            params.append(word_query)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{"path": path, "title": title, "snippet": snippet.replace('\n', ' '), "score": round(score, 3)}
+                for path, title, snippet, score in rows]
+
+    def optimize(self):
+        """FTS 세그먼트 병합 (대량 색인 후 검색 속도 개선)"""
+        with self._lock:
+            self._conn.execute("INSERT INTO fts_tri(fts_tri) VALUES ('optimize')")
+            self._conn.execute("INSERT INTO fts_word(fts_word) VALUES ('optimize')")
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+_default_index = None
+_default_lock = threading.Lock()
+
+def get_default_index(root=VAULT_ROOT):
+    """프로세스 전체에서 공유하는 색인 (ai_noteguard 워커 스레드용)"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = SearchIndex(INDEX_PATH, root)
+        return _default_index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vault 전문 검색")
+    parser.add_argument("query", nargs="*", help="검색어 (여러 개면 모두 포함하는 노트)")
+    parser.add_argument("--root", default=VAULT_ROOT, help="Vault 폴더")
+    parser.add_argument("--db", default=INDEX_PATH, help="색인 파일 경로")
+    parser.add_argument("--sync", action="store_true", help="Vault 를 훑어 바뀐 노트만 다시 색인")
+    parser.add_argument("--optimize", action="store_true", help="색인 세그먼트 병합")
+    parser.add_argument("--limit", type=int, default=10, help="최대 결과 수")
+    args = parser.parse_args()
+
+    index = SearchIndex(args.db, args.root)
+    if args.sync:
+        start = time.perf_counter()
+        updated, removed = index.sync()
+        print(f"[*] Synced {args.root}: {updated} notes updated, {removed} removed "
+              f"({len(index)} indexed, {time.perf_counter() - start:.2f}s)")
+    if args.optimize:
+        index.optimize()
+    if args.query:
+        start = time.perf_counter()
+        results = index.search(" ".join(args.query), limit=args.limit)
+        elapsed = (time.perf_counter() - start) * 1000
+        for i, result in enumerate(results, 1):
+            print(f"{i:>3}. {result['path']}  ({result['score']})")
+            print(f"     {result['snippet']}")
+        print(f"[*] {len(results)} results in {elapsed:.1f} ms")
+    index.close()
@@ -0,0 +1,109 @@
+import os
+import gzip
+import json
+import time
+import queue
+import atexit
+import threading
+
+# Configuration
+FLUSH_EVERY = 100       # 이벤트가 이만큼 쌓이면 바로 기록
+FLUSH_INTERVAL = 1.0    # 그렇지 않아도 이 주기(초)마다 기록
+
+_CLOSE = object()
+
+class SessionLogger:
+    """
+    JSONL 세션 로그를 배치로 기록하는 로거.
+    파일 핸들을 하나만 열어 두고, 백그라운드 스레드가 flush_every 건 또는 flush_interval 초마다
+    모아서 쓰고 flush 합니다. (이벤트마다 open/append/close 하지 않음)
+    - compress=True 이면 gzip(.jsonl.gz)으로 기록합니다. flush 된 구간까지는 zcat 으로 읽을 수 있습니다.
+    - sync=True 이면 배치마다 os.fsync 까지 수행합니다. (전원 차단 대비)
+    - 예외/Ctrl+C 로 종료될 때는 atexit 에서 close() 가 남은 이벤트를 모두 기록합니다.
+      프로세스가 강제 종료되면 마지막 flush 주기 안의 이벤트만 잃습니다.
+    """
+    def __init__(self, path, flush_every=FLUSH_EVERY, flush_interval=FLUSH_INTERVAL, compress=False, sync=False):
+        if compress and not path.endswith('.gz'):
+            path += '.gz'
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.sync = sync
+        self.written = 0
+
+        log_dir = os.path.dirname(path)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        if compress:
+            self._fh = gzip.open(path, 'at', encoding='utf-8')
+        else:
+            self._fh = open(path, 'a', encoding='utf-8')
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._writer_loop, name="session-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, event):
+        """이벤트(dict) 한 건을 기록 대기열에 넣습니다. 직렬화는 호출 시점에 합니다."""
+        if self._closed:
+            raise ValueError("SessionLogger is closed")
+        self._queue.put(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def flush(self):
+        """지금까지 넣은 이벤트가 모두 파일에 기록될 때까지 기다립니다."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(_CLOSE)
+        self._thread.join()
+        self._fh.close()
+
+    def _writer_loop(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, str):
+                batch.append(item)
+                if len(batch) < self.flush_every:
+                    continue
+            elif item is None and not batch:
+                deadline = time.monotonic() + self.flush_interval
+                continue
+
+            self._write(batch)
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            if item is _CLOSE:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _write(self, batch):
+        try:
+            if batch:
+                self._fh.write("".join(batch))
+                self.written += len(batch)
+            self._fh.flush()
+            if self.sync:
+                os.fsync(self._fh.fileno())
+        except OSError as e:
+            # 로그 기록 실패로 마이그레이션을 멈추지는 않음 (한 번만 경고)
+            if self._error is None:
+                print(f"[!] Session log write failed ({self.path}): {e}")
+            self._error = e
@@ -0,0 +1,116 @@
+import os
+import json
+import sqlite3
+
+# 커밋 주기 (update 호출 수 기준)
+COMMIT_EVERY = 200
+
+def scan_markdown(root, skip_dir=None):
+    """
+    os.scandir 기반 재귀 탐색으로 (.md 경로, stat 결과)를 yield 합니다.
+    os.walk 와 같은 순서(현재 폴더의 파일 -> 하위 폴더)로 돌며,
+    DirEntry 의 stat 결과를 그대로 넘겨 별도 stat/open 호출이 필요 없습니다.
+    skip_dir(path) 가 True 인 폴더는 통째로 건너뜁니다.
+    """
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        subdirs = []
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if skip_dir is None or not skip_dir(entry.path):
+                        subdirs.append(entry.path)
+                elif entry.name.endswith('.md') and entry.is_file():
+                    yield entry.path, entry.stat()
+        stack.extend(reversed(subdirs))
+
+def signature(st):
+    """변경 감지용 서명 (inode, size, mtime_ns)"""
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+class VaultIndex:
+    """
+    마이그레이션 대상 파일의 영구 색인 (SQLite).
+    경로별로 inode/size/mtime_ns 서명과 본문 해시, 감지된 태그, PARA 폴더, 기록 위치를 보관하여
+    다음 실행에서 바뀐 파일만 다시 처리할 수 있게 합니다.
+    """
+    def __init__(self, path):
+        self.path = path
+        index_dir = os.path.dirname(path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                inode INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT,
+                tags TEXT,
+                para_folder TEXT,
+                target TEXT
+            )
+        """)
+        self._conn.commit()
+        # 변경 감지는 메모리에서 (파일당 쿼리 없음)
+        self._signatures = {
+            path: (inode, size, mtime_ns)
+            for path, inode, size, mtime_ns in self._conn.execute("SELECT path, inode, size, mtime_ns FROM files")
+        }
+        self._pending = 0
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def is_known(self, path):
+        return path in self._signatures
+
+    def is_changed(self, path, st):
+        """색인에 없거나 서명이 달라졌으면 True"""
+        return self._signatures.get(path) != signature(st)
+
+    def update(self, path, st, content_hash=None, tags=(), para_folder=None, target=None):
+        sig = signature(st)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (path, *sig, content_hash, json.dumps(sorted(tags), ensure_ascii=False), para_folder, target)
+        )
+        self._signatures[path] = sig
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def get(self, path):
+        row = self._conn.execute(
+            "SELECT path, inode, size, mtime_ns, hash, tags, para_folder, target FROM files WHERE path=?", (path,)
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("path", "inode", "size", "mtime_ns", "hash", "tags", "para_folder", "target")
+        record = dict(zip(keys, row))
+        record["tags"] = json.loads(record["tags"] or "[]")
+        return record
+
+    def prune(self, seen_paths):
+        """이번 스캔에서 보이지 않은(삭제된) 경로를 색인에서 지우고 목록을 돌려줍니다."""
+        removed = [path for path in self._signatures if path not in seen_paths]
+        self._conn.executemany("DELETE FROM files WHERE path=?", [(path,) for path in removed])
+        for path in removed:
+            del self._signatures[path]
+        self.commit()
+        return removed
+
+    def commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()